@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
-from typing import Union
-from services.schemas import ToolRequest, ChatRequest, Message, ChatResponse, ToolResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from typing import Union, AsyncIterator, Callable, Awaitable
+from contextlib import aclosing
+from services.schemas import ToolRequest, ChatRequest, Message, ChatResponse, ToolResponse, JobResponse
+from services.jobs import QueueFullError
 from utils.auth import key_check
 from services.logger import setup_logger
+from services.tracing import request_trace
+from services import metrics
 from api.error_utilities import InputValidationError, ErrorResponse
-from api.tool_utilities import load_tool_metadata, execute_tool, finalize_inputs
+from api.tool_utilities import execute_tool_async, finalize_inputs
+import json
 
 logger = setup_logger(__name__)
 router = APIRouter()
@@ -15,19 +20,28 @@ router = APIRouter()
 def read_root():
     return {"Hello": "World"}
 
+@router.get("/metrics")
+def get_metrics(_ = Depends(key_check)):
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @router.post("/submit-tool", response_model=Union[ToolResponse, ErrorResponse])
-async def submit_tool( data: ToolRequest, _ = Depends(key_check)):     
+async def submit_tool( data: ToolRequest, request: Request, _ = Depends(key_check)):     
     try: 
         # Unpack GenericRequest for tool data
         request_data = data.tool_data
         
-        requested_tool = load_tool_metadata(request_data.tool_id)
+        tool_registry = request.app.state.tool_registry
+        requested_tool = tool_registry.get(request_data.tool_id)
+        # Labels the latency recorded by MetricsMiddleware, only known tool ids so the label stays bounded
+        request.state.tool_id = request_data.tool_id
         
-        request_inputs_dict = finalize_inputs(request_data.inputs, requested_tool['inputs'])
+        request_inputs_dict = finalize_inputs(request_data.inputs, requested_tool.validator)
 
-        result = execute_tool(request_data.tool_id, request_inputs_dict)
+        with request_trace(request_data.tool_id) as trace:
+            result = await execute_tool_async(request_data.tool_id, request_inputs_dict, request.app.state.execution_pool, tool_registry)
         
-        return ToolResponse(data=result)
+        # Executors run verbose from the API, see execute_tool_async
+        return ToolResponse(data=result, trace=trace.as_dict() if request_inputs_dict.get("verbose") else None)
     
     except InputValidationError as e:
         logger.error(f"InputValidationError: {e}")
@@ -45,14 +59,15 @@ async def submit_tool( data: ToolRequest, _ = Depends(key_check)):
         )
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat( request: ChatRequest, _ = Depends(key_check) ):
-    from features.Kaichat.core import executor as kaichat_executor
+async def chat( request: ChatRequest, http_request: Request, _ = Depends(key_check) ):
+    from features.Kaichat.core import aexecutor as kaichat_executor
     
     user_name = request.user.fullName
     chat_messages = request.messages
     user_query = chat_messages[-1].payload.text
     
-    response = kaichat_executor(user_name=user_name, user_query=user_query, messages=chat_messages)
+    execution_pool = http_request.app.state.execution_pool
+    response = await execution_pool.run("chat", kaichat_executor, user_name=user_name, user_query=user_query, messages=chat_messages)
     
     formatted_response = Message(
         role="ai",
@@ -60,4 +75,121 @@ async def chat( request: ChatRequest, _ = Depends(key_check) ):
         payload={"text": response}
     )
     
-    return ChatResponse(data=[formatted_response])
\ No newline at end of file
+    return ChatResponse(data=[formatted_response])
+
+def format_sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+async def chat_event_stream(token_stream: AsyncIterator[str], is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[str]:
+    """
+    Relays model tokens as `token` events and finishes with a `message` event holding the ChatResponse.
+    Closing the token stream on disconnect cancels the upstream generation.
+    """
+    tokens = []
+    async with aclosing(token_stream):
+        async for token in token_stream:
+            if await is_disconnected():
+                logger.info("Client disconnected, cancelling chat generation")
+                return
+            tokens.append(token)
+            yield format_sse("token", json.dumps({"text": token}))
+    
+    formatted_response = Message(
+        role="ai",
+        type="text",
+        payload={"text": "".join(tokens)}
+    )
+    
+    yield format_sse("message", ChatResponse(data=[formatted_response]).model_dump_json())
+
+@router.post("/chat/stream")
+async def chat_stream( request: ChatRequest, http_request: Request, _ = Depends(key_check) ):
+    from features.Kaichat.core import astream_executor as kaichat_stream_executor
+    
+    user_name = request.user.fullName
+    chat_messages = request.messages
+    user_query = chat_messages[-1].payload.text
+    
+    execution_pool = http_request.app.state.execution_pool
+    
+    async def event_stream():
+        async with execution_pool.limiter("chat"):
+            token_stream = kaichat_stream_executor(user_name=user_name, user_query=user_query, messages=chat_messages)
+            async for event in chat_event_stream(token_stream, http_request.is_disconnected):
+                yield event
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/jobs", response_model=Union[JobResponse, ErrorResponse], status_code=202)
+async def submit_job( data: ToolRequest, request: Request, _ = Depends(key_check)):
+    try:
+        request_data = data.tool_data
+        
+        # Inputs are validated up front so bad requests fail before they are queued
+        requested_tool = request.app.state.tool_registry.get(request_data.tool_id)
+        request.state.tool_id = request_data.tool_id
+        
+        request_inputs_dict = finalize_inputs(request_data.inputs, requested_tool.validator)
+        
+        job = request.app.state.job_queue.submit(request_data.tool_id, request_inputs_dict)
+        
+        return JobResponse(**job)
+    
+    except InputValidationError as e:
+        logger.error(f"InputValidationError: {e}")
+        
+        return JSONResponse(
+            status_code=400,
+            content=jsonable_encoder(ErrorResponse(status=400, message=e.message))
+        )
+    
+    except QueueFullError as e:
+        logger.error(f"QueueFullError: {e}")
+        return JSONResponse(
+            status_code=503,
+            content=jsonable_encoder(ErrorResponse(status=503, message=e.message))
+        )
+    
+    except HTTPException as e:
+        logger.error(f"HTTPException: {e}")
+        return JSONResponse(
+            status_code=e.status_code,
+            content=jsonable_encoder(ErrorResponse(status=e.status_code, message=e.detail))
+        )
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job( job_id: str, request: Request, _ = Depends(key_check)):
+    job_store = request.app.state.job_queue.store
+    job = job_store.get(job_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    events = job_store.events(job_id)
+    job["progress"] = events[-1] if events else None
+    
+    return JobResponse(**job)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events( job_id: str, request: Request, _ = Depends(key_check)):
+    job_queue = request.app.state.job_queue
+    
+    if job_queue.store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # Server-Sent Events when the client asks for them, newline delimited JSON otherwise
+    use_sse = "text/event-stream" in request.headers.get("accept", "")
+    
+    async def event_stream():
+        async for event in job_queue.stream_events(job_id):
+            if use_sse:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            else:
+                yield json.dumps(event) + "\n"
+    
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
@@ -0,0 +1,130 @@
+import json
+import os
+import pickle
+import stat
+import time
+import zlib
+
+import pytest
+from langchain_core.documents import Document
+from services import cache as cache_module
+from services.cache import LRUCache, SQLiteCache, TieredCache, MISSING
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is MISSING
+
+def test_lru_cache_byte_budget():
+    document = [Document(page_content="x" * 1000)]
+    size = cache_module.value_size(document)
+    cache = LRUCache(max_items=64, max_bytes=size * 3)
+    for i in range(5):
+        cache.set(str(i), document)
+
+    assert len(cache) == 3 and cache.total_bytes == size * 3
+    assert cache.get("0") is MISSING and cache.get("4") == document
+    assert cache.stats.evictions == 2
+
+    # Replacing an entry releases its old size, one larger than the whole budget is not kept
+    cache.set("4", [])
+    assert cache.total_bytes == size * 2 + cache_module.value_size([])
+    cache.set("big", [Document(page_content="x" * 10000)])
+    assert cache.get("big") is MISSING and len(cache) == 3
+
+def test_sqlite_cache_round_trip_and_byte_budget(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_bytes=4096)
+    cache.set("small", {"value": [1, 2, 3]})
+    assert cache.get("small") == {"value": [1, 2, 3]}
+
+    for i in range(20):
+        cache.set(f"blob-{i}", bytes(range(256)) * 4 + str(i).encode())
+    assert cache.total_bytes() <= 4096
+    assert cache.get("blob-19") is not MISSING
+    assert cache.stats.evictions > 0
+    cache.close()
+
+def test_sqlite_cache_persists_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path).set("key", "value")
+    assert SQLiteCache(path).get("key") == "value"
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    cache = TieredCache("test", LRUCache(), SQLiteCache(str(tmp_path / "cache.sqlite3")))
+    cache.set("key", "value")
+    cache.memory.clear()
+
+    assert cache.get("key") == "value"
+    assert cache.memory.get("key") == "value"
+    assert cache.get("missing") is MISSING
+
+    stats = cache.stats_dict()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["disk"]["hits"] == 1
+
+def test_sqlite_cache_stores_json_not_pickle(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    value = [("page", {"page_number": 1}), b"\x00\xff", Document(page_content="text", metadata={"source": "pdf"}),
+             {"__tuple__": "a dict that looks like a tag"}, {"nested": (1, [2.5, None, True])}]
+    cache.set("key", value)
+    assert cache.get("key") == value
+
+    blob = cache._conn.execute("SELECT value FROM cache WHERE key = 'key'").fetchone()[0]
+    assert json.loads(zlib.decompress(blob))[0] == {"__tuple__": ["page", {"page_number": 1}]}
+
+    with pytest.raises(TypeError):
+        cache.set("object", object())
+
+def test_pickled_entries_are_never_loaded(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    marker = tmp_path / "ran"
+    payload = zlib.compress(pickle.dumps(Exploit(str(marker))))
+    with cache._conn:
+        cache._conn.execute("INSERT INTO cache VALUES ('key', ?, ?, 0, 0)", (payload, len(payload)))
+
+    assert cache.get("key") is MISSING
+    assert not marker.exists()
+
+class Exploit:
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, "w"))
+
+def test_cache_directory_is_private(tmp_path):
+    SQLiteCache(str(tmp_path / "private" / "cache.sqlite3"))
+    assert stat.S_IMODE(os.stat(tmp_path / "private").st_mode) == 0o700
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        SQLiteCache(str(shared / "cache.sqlite3"))
+
+def test_disk_tier_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "_caches", {})
+    monkeypatch.setattr(cache_module, "CACHE_DIR", "")
+    assert cache_module.get_cache("memory-only").disk is None
+    # Without a disk tier the byte budget applies to memory
+    assert cache_module.get_cache("memory-bounded", max_bytes=1024).memory.max_bytes == 1024
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    monkeypatch.setattr(cache_module, "CACHE_DIR", str(shared))
+    # A directory others can write to is not used, the cache falls back to memory
+    assert cache_module.get_cache("refused").disk is None
@@ -0,0 +1,70 @@
+import asyncio
+import json
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake import FakeStreamingListLLM
+from main import app
+from services.models import StaticModelProvider, override_model_provider
+from api.router import chat_event_stream
+
+chat_payload = {
+    "user": {"id": "1", "fullName": "Test User", "email": "test@example.com"},
+    "type": "chat",
+    "messages": [
+        {"role": "human", "type": "text", "payload": {"text": "How do I teach fractions?"}}
+    ]
+}
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_chat_stream_sends_tokens_then_chat_response():
+    provider = StaticModelProvider(llm=FakeStreamingListLLM(responses=["Use pizza slices"]))
+
+    with override_model_provider(provider), TestClient(app) as client:
+        response = client.post("/chat/stream", json=chat_payload, headers={"api-key": "dev"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Use pizza slices"
+
+    event, final = events[-1]
+    assert event == "message"
+    assert final["data"][0]["role"] == "ai"
+    assert final["data"][0]["payload"]["text"] == "Use pizza slices"
+
+def test_chat_stream_requires_api_key():
+    with TestClient(app) as client:
+        response = client.post("/chat/stream", json=chat_payload, headers={"api-key": "wrong"})
+    assert response.status_code == 401
+
+def test_disconnect_closes_upstream_generation():
+    state = {"produced": 0, "closed": False}
+
+    async def token_stream():
+        try:
+            for token in ["a", "b", "c", "d"]:
+                state["produced"] += 1
+                yield token
+        finally:
+            state["closed"] = True
+
+    async def is_disconnected():
+        return state["produced"] >= 2
+
+    async def collect():
+        return [event async for event in chat_event_stream(token_stream(), is_disconnected)]
+
+    events = asyncio.run(collect())
+
+    assert len(events) == 1
+    assert events[0].startswith("event: token")
+    assert state["closed"]
+    assert state["produced"] == 2
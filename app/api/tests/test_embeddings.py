@@ -0,0 +1,66 @@
+import numpy as np
+from langchain_core.embeddings import FakeEmbeddings
+from services.embeddings import CachedEmbeddings, EmbeddingStore
+
+class CountingEmbeddings(FakeEmbeddings):
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0, 2.0, 3.0] for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 1.0, 2.0, 3.0]
+
+def make_cache(tmp_path, **kwargs):
+    backend = CountingEmbeddings(size=4, calls=[])
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"), **kwargs)
+    return CachedEmbeddings("test-model", store, embeddings=backend, batch_size=2), backend
+
+def test_only_missing_chunks_are_embedded(tmp_path):
+    cache, backend = make_cache(tmp_path)
+
+    first = cache.embed_documents(["a", "bb", "a"])
+    assert backend.calls == [["a", "bb"]]
+
+    second = cache.embed_documents(["bb", "ccc", "a"])
+    assert backend.calls[1:] == [["ccc"]]
+
+    assert first[0] == first[2] == second[2] == [1.0, 1.0, 2.0, 3.0]
+    assert second[1] == [3.0, 1.0, 2.0, 3.0]
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 4
+
+def test_misses_are_sent_in_batches(tmp_path):
+    cache, backend = make_cache(tmp_path)
+    cache.embed_documents(["a", "b", "c", "d", "e"])
+    assert [len(batch) for batch in backend.calls] == [2, 2, 1]
+
+def test_vectors_persist_as_float16(tmp_path):
+    cache, backend = make_cache(tmp_path, dtype="float16")
+    cache.embed_documents(["hello"])
+
+    reopened = CachedEmbeddings("test-model", EmbeddingStore(cache.store.path), embeddings=backend)
+    assert reopened.embed_documents(["hello"]) == [[5.0, 1.0, 2.0, 3.0]]
+    assert len(backend.calls) == 1
+    assert cache.store.total_bytes == 4 * np.dtype("float16").itemsize
+
+def test_model_name_is_part_of_the_key(tmp_path):
+    cache, backend = make_cache(tmp_path)
+    other = CachedEmbeddings("other-model", cache.store, embeddings=backend)
+    cache.embed_query("topic")
+    other.embed_query("topic")
+    assert len(backend.calls) == 2
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    cache, backend = make_cache(tmp_path, max_bytes=3 * 16)
+    cache.embed_documents(["a", "b", "c"])
+    cache.embed_documents(["a"])
+    cache.embed_documents(["d"])
+
+    assert cache.store.total_bytes <= 3 * 16
+    assert cache.store.evictions == 1
+    kept = cache.store.get_many([cache.key(t) for t in "abcd"])
+    assert cache.key("a") in kept and cache.key("d") in kept
+    assert len(kept) == 3
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+from fastapi import HTTPException
+import contextvars
+from services import execution
+from services.execution import ExecutionPool, prefetch
+from api.tool_utilities import execute_tool_async
+
+def test_from_tools_config_reads_limits():
+    config = {
+        "0": {"path": "features.quizzify.core", "metadata_file": "metadata.json", "max_concurrency": 1},
+        "1": {"path": "features.dynamo.core", "metadata_file": "metadata.json"}
+    }
+    pool = ExecutionPool.from_tools_config(config)
+    try:
+        assert pool.limit_for("0") == 1
+        assert pool.limit_for("1") == 2
+        assert pool.limit_for("chat") == 8
+    finally:
+        pool.shutdown()
+
+def test_sync_executor_does_not_block_event_loop():
+    pool = ExecutionPool(limits={"slow": 1})
+
+    def slow_executor():
+        time.sleep(0.3)
+        return threading.current_thread().name
+
+    async def scenario():
+        ticks = 0
+        task = asyncio.create_task(pool.run("slow", slow_executor))
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks, await task
+
+    try:
+        ticks, thread_name = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert ticks > 10
+    assert thread_name.startswith("tool-executor")
+
+def test_concurrency_limit_is_enforced_per_key():
+    pool = ExecutionPool(limits={"0": 2, "chat": 4})
+    active = {"0": 0, "chat": 0}
+    peak = {"0": 0, "chat": 0}
+    lock = threading.Lock()
+
+    def make_executor(key):
+        def executor():
+            with lock:
+                active[key] += 1
+                peak[key] = max(peak[key], active[key])
+            time.sleep(0.05)
+            with lock:
+                active[key] -= 1
+        return executor
+
+    async def scenario():
+        await asyncio.gather(
+            *[pool.run("0", make_executor("0")) for _ in range(6)],
+            *[pool.run("chat", make_executor("chat")) for _ in range(6)]
+        )
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert peak["0"] == 2
+    assert peak["chat"] == 4
+
+def test_async_executor_is_awaited_directly():
+    pool = ExecutionPool()
+
+    async def aexecutor(value):
+        await asyncio.sleep(0)
+        return threading.current_thread() is threading.main_thread(), value
+
+    try:
+        on_main_thread, value = asyncio.run(pool.run("1", aexecutor, value="result"))
+    finally:
+        pool.shutdown()
+
+    assert on_main_thread
+    assert value == "result"
+
+@patch('api.tool_utilities.get_async_executor_by_name', return_value=None)
+@patch('api.tool_utilities.get_executor_by_name')
+def test_execute_tool_async_success(mock_get_executor, mock_get_async_executor):
+    pool = ExecutionPool()
+    mock_get_executor.return_value = MagicMock(return_value="execution result")
+
+    try:
+        result = asyncio.run(execute_tool_async("0", {}, pool))
+    finally:
+        pool.shutdown()
+
+    assert result == "execution result"
+    mock_get_executor.return_value.assert_called_once_with(verbose=True)
+
+def test_execute_tool_async_unknown_tool():
+    pool = ExecutionPool()
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(execute_tool_async("unknown", {}, pool))
+    finally:
+        pool.shutdown()
+    assert exc_info.value.status_code == 404
+
+def test_prefetch_keeps_order_and_bounds_the_producer():
+    produced = []
+
+    def numbers():
+        for number in range(10):
+            produced.append(number)
+            yield number
+
+    stream = prefetch(numbers(), maxsize=2)
+    assert next(stream) == 0
+    time.sleep(0.2)
+    # One item consumed, two queued and one waiting to be queued
+    assert len(produced) <= 4
+    assert list(stream) == list(range(1, 10))
+
+def test_prefetch_raises_producer_errors():
+    def failing():
+        yield 1
+        raise ValueError("broken")
+
+    stream = prefetch(failing(), maxsize=4)
+    assert next(stream) == 1
+    with pytest.raises(ValueError, match="broken"):
+        next(stream)
+
+def test_prefetch_closes_the_producer_when_stopped_early():
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                yield 1
+        finally:
+            closed.set()
+
+    stream = prefetch(endless(), maxsize=1)
+    assert next(stream) == 1
+    stream.close()
+    assert closed.is_set()
+
+def test_prefetch_runs_in_the_callers_context():
+    variable = contextvars.ContextVar("variable", default=None)
+    variable.set("request")
+    assert list(prefetch((variable.get() for _ in range(2)), maxsize=1)) == ["request", "request"]
+
+def test_closing_chained_prefetches_stops_the_stages_waiting_for_items():
+    release = threading.Event()
+
+    def slow_documents():
+        yield 1
+        # A download or parse that takes long to produce the next item
+        release.wait(10)
+        yield 2
+
+    split_ended = threading.Event()
+
+    def split(documents):
+        try:
+            for document in documents:
+                yield document * 10
+        finally:
+            split_ended.set()
+
+    stop = threading.Event()
+    documents = prefetch(slow_documents(), maxsize=1, stop=stop)
+    chunks = prefetch(split(documents), maxsize=1, stop=stop)
+    assert next(chunks) == 10
+    stop.set()
+    chunks.close()
+    # The split stage stops reading instead of waiting for the next document
+    assert split_ended.wait(0.5)
+    release.set()
+
+def test_prefetch_close_is_bounded_by_the_join_timeout(monkeypatch):
+    monkeypatch.setattr(execution, "PREFETCH_JOIN_TIMEOUT", 0.2)
+    release = threading.Event()
+
+    def blocked():
+        yield 1
+        release.wait(10)
+        yield 2
+
+    stream = prefetch(blocked(), maxsize=1)
+    assert next(stream) == 1
+    time.sleep(0.1)
+    start = time.perf_counter()
+    stream.close()
+    assert time.perf_counter() - start < 1.0
+    release.set()
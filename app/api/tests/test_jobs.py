@@ -0,0 +1,98 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from services.jobs import InMemoryJobStore, SQLiteJobStore, JobQueue, QueueFullError, report_progress
+
+@pytest.fixture(params=["memory", "sqlite"])
+def job_store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    else:
+        store = InMemoryJobStore()
+    yield store
+    store.close()
+
+async def fake_runner(tool_id, inputs):
+    report_progress("downloaded", files=1)
+    await asyncio.sleep(0)
+    report_progress("question", current=1, total=1)
+    return [{"question": inputs["topic"]}]
+
+async def failing_runner(tool_id, inputs):
+    raise ValueError("executor exploded")
+
+def run_job_to_completion(store, runner):
+    async def scenario():
+        queue = JobQueue(store, runner, maxsize=4, workers=1)
+        queue.start()
+        job = queue.submit("0", {"topic": "Math"})
+        events = [event async for event in queue.stream_events(job["job_id"], poll_interval=0.01)]
+        final = store.get(job["job_id"])
+        for worker in queue._workers:
+            worker.cancel()
+        return final, events
+    return asyncio.run(scenario())
+
+def test_job_runs_and_records_progress(job_store):
+    job, events = run_job_to_completion(job_store, fake_runner)
+
+    assert job["status"] == "succeeded"
+    assert job["result"] == [{"question": "Math"}]
+    assert [event["stage"] for event in events] == ["queued", "running", "downloaded", "question", "succeeded"]
+    assert events[3]["current"] == 1 and events[3]["total"] == 1
+
+def test_failed_job_records_error(job_store):
+    job, events = run_job_to_completion(job_store, failing_runner)
+
+    assert job["status"] == "failed"
+    assert "executor exploded" in job["error"]
+    assert events[-1]["stage"] == "failed"
+
+def test_submit_rejects_when_queue_is_full():
+    async def scenario():
+        queue = JobQueue(InMemoryJobStore(), fake_runner, maxsize=1, workers=1)
+        queue._queue = asyncio.Queue(maxsize=1)  # no workers, so nothing drains the queue
+        queue.submit("0", {"topic": "Math"})
+        with pytest.raises(QueueFullError):
+            queue.submit("0", {"topic": "Math"})
+    asyncio.run(scenario())
+
+def test_report_progress_outside_job_is_noop():
+    report_progress("downloaded", files=1)
+
+def test_jobs_endpoints():
+    with TestClient(app) as client:
+        app.state.job_queue.runner = fake_runner
+        headers = {"api-key": "dev"}
+        payload = {
+            "user": {"id": "1", "fullName": "Test User", "email": "test@example.com"},
+            "type": "tool",
+            "tool_data": {"tool_id": 0, "inputs": [
+                {"name": "topic", "value": "Math"},
+                {"name": "num_questions", "value": 1},
+                {"name": "files", "value": [{"url": "https://example.com/test.pdf"}]}
+            ]}
+        }
+
+        response = client.post("/jobs", json=payload, headers=headers)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        with client.stream("GET", f"/jobs/{job_id}/events", headers=headers) as stream:
+            events = [json.loads(line) for line in stream.iter_lines() if line]
+        assert events[-1]["stage"] == "succeeded"
+
+        response = client.get(f"/jobs/{job_id}", headers=headers)
+        assert response.json()["status"] == "succeeded"
+        assert response.json()["result"] == [{"question": "Math"}]
+
+        with client.stream("GET", f"/jobs/{job_id}/events", headers={**headers, "accept": "text/event-stream"}) as stream:
+            body = "".join(stream.iter_text())
+        assert body.startswith("event: progress\ndata: ")
+
+        assert client.get("/jobs/unknown", headers=headers).status_code == 404
+
+        payload["tool_data"]["inputs"] = payload["tool_data"]["inputs"][:1]
+        assert client.post("/jobs", json=payload, headers=headers).status_code == 400
@@ -0,0 +1,163 @@
+import re
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import FakeEmbeddings
+from langchain_core.language_models.fake import FakeListLLM, FakeStreamingListLLM
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation, LLMResult
+
+from main import app
+from services import metrics
+from services.embeddings import CachedEmbeddings, EmbeddingStore
+from services.metrics import Counter, Histogram, MetricsRegistry, ModelCallMetrics, token_usage
+from services.models import ModelRegistry, StaticModelProvider, override_model_provider
+
+SAMPLE = re.compile(r"^(\w+)(\{.*\})? (\S+)$")
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.registry.clear()
+
+def parse(text: str):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, labels, value = SAMPLE.match(line).groups()
+            samples[name + (labels or "")] = float(value)
+    return samples
+
+def test_histogram_and_counter_exposition():
+    registry = MetricsRegistry()
+    latency = registry.register(Histogram("test_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0)))
+    calls = registry.register(Counter("test_calls_total", "Test calls."))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.labels("/chat").observe(value)
+    calls.inc(3)
+
+    text = registry.render()
+    assert "# TYPE kai_test_seconds histogram" in text
+    assert "# TYPE kai_test_calls_total counter" in text
+    samples = parse(text)
+    assert samples['kai_test_seconds_bucket{route="/chat",le="0.1"}'] == 2
+    assert samples['kai_test_seconds_bucket{route="/chat",le="1"}'] == 3
+    assert samples['kai_test_seconds_bucket{route="/chat",le="+Inf"}'] == 4
+    assert samples['kai_test_seconds_count{route="/chat"}'] == 4
+    assert samples['kai_test_seconds_sum{route="/chat"}'] == pytest.approx(2.65)
+    assert samples["kai_test_calls_total"] == 3
+
+    with pytest.raises(ValueError):
+        registry.register(Counter("test_calls_total", "Registered twice."))
+    with pytest.raises(ValueError):
+        latency.labels()
+
+def test_concurrent_updates_are_not_lost():
+    counter = Counter("concurrent_total", "Test.", ("tool_id",))
+
+    def work():
+        for _ in range(10000):
+            counter.labels("0").inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.labels("0").value == 80000
+
+def test_label_values_are_escaped():
+    counter = Counter("escaped_total", "Test.", ("model",))
+    counter.labels('a"b\\c\nd').inc()
+    assert counter.samples() == ['kai_escaped_total{model="a\\"b\\\\c\\nd"} 1']
+
+def test_token_usage_from_each_provider_format():
+    assert token_usage(LLMResult(generations=[], llm_output={"token_usage": {"prompt_tokens": 5, "completion_tokens": 7}})) == (5, 7)
+    vertex = Generation(text="x", generation_info={"usage_metadata": {"prompt_token_count": 3, "candidates_token_count": 4}})
+    assert token_usage(LLMResult(generations=[[vertex], [vertex]])) == (6, 8)
+    chat = ChatGeneration(message=AIMessage(content="x", usage_metadata={"input_tokens": 2, "output_tokens": 9, "total_tokens": 11}))
+    assert token_usage(LLMResult(generations=[[chat]])) == (2, 9)
+    assert token_usage(LLMResult(generations=[[Generation(text="x")]])) == (0, 0)
+
+def test_registry_llm_clients_record_calls():
+    llm = FakeListLLM(responses=["a", "b"])
+    registry = ModelRegistry(StaticModelProvider(llm=llm))
+    assert registry.get_llm("gemini-test").invoke("question") == "a"
+    # A provider handing out the same client again does not attach a second handler
+    ModelRegistry(StaticModelProvider(llm=llm)).get_llm("gemini-test")
+    assert sum(isinstance(handler, ModelCallMetrics) for handler in llm.callbacks) == 1
+
+    llm.invoke("question")
+    samples = parse(metrics.render())
+    assert samples['kai_model_calls_total{kind="llm",model="gemini-test",status="ok"}'] == 2
+    assert samples['kai_model_call_duration_seconds_count{kind="llm",model="gemini-test"}'] == 2
+
+def test_embedding_backend_calls_are_recorded(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    cache = CachedEmbeddings("test-model", store, embeddings=FakeEmbeddings(size=4), batch_size=2)
+    cache.embed_documents(["a", "b", "c"])
+    cache.embed_documents(["a", "b", "c"])
+
+    samples = parse(metrics.render())
+    # Cache hits do not reach the model
+    assert samples['kai_model_calls_total{kind="embeddings",model="test-model",status="ok"}'] == 2
+    assert samples['kai_embedded_texts_total{model="test-model"}'] == 3
+
+def test_cache_hit_ratios(monkeypatch):
+    monkeypatch.setattr(metrics, "cache_stats", lambda: {
+        "parse": {"hits": 3, "misses": 1, "evictions": 0, "hit_ratio": 0.75,
+                  "memory": {"hits": 2, "misses": 2, "evictions": 1, "hit_ratio": 0.5}},
+    })
+    samples = parse(metrics.render())
+    assert samples['kai_cache_hit_ratio{cache="parse",tier="all"}'] == 0.75
+    assert samples['kai_cache_hit_ratio{cache="parse",tier="memory"}'] == 0.5
+    assert samples['kai_cache_evictions_total{cache="parse",tier="memory"}'] == 1
+
+chat_payload = {
+    "user": {"id": "1", "fullName": "Test User", "email": "test@example.com"},
+    "type": "chat",
+    "messages": [
+        {"role": "human", "type": "text", "payload": {"text": "How do I teach fractions?"}}
+    ]
+}
+
+def test_metrics_endpoint_reports_requests_by_route():
+    provider = StaticModelProvider(llm=FakeStreamingListLLM(responses=["Use pizza slices"]))
+    headers = {"api-key": "dev"}
+
+    with override_model_provider(provider), TestClient(app) as client:
+        assert client.post("/chat/stream", json=chat_payload, headers=headers).status_code == 200
+        assert client.get("/jobs/unknown", headers=headers).status_code == 404
+        assert client.get("/metrics", headers={"api-key": "wrong"}).status_code == 401
+        response = client.get("/metrics", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = parse(response.text)
+    assert samples['kai_request_duration_seconds_count{route="/chat/stream",tool_id="",status="200"}'] == 1
+    assert samples['kai_request_duration_seconds_count{route="/jobs/{job_id}",tool_id="",status="404"}'] == 1
+    assert samples['kai_request_duration_seconds_count{route="/metrics",tool_id="",status="401"}'] == 1
+    assert samples['kai_requests_in_flight{route="/chat/stream"}'] == 0
+    # Only the scrape itself is still running
+    assert samples['kai_requests_in_flight{route="/metrics"}'] == 1
+    assert samples['kai_model_calls_total{kind="llm",model="gemini-1.0-pro",status="ok"}'] == 1
+
+def test_tool_requests_are_labelled_with_the_tool_id():
+    async def fake_runner(tool_id, inputs):
+        return [{"question": inputs["topic"]}]
+
+    payload = {
+        "user": {"id": "1", "fullName": "Test User", "email": "test@example.com"},
+        "type": "tool",
+        "tool_data": {"tool_id": 0, "inputs": [
+            {"name": "topic", "value": "Math"},
+            {"name": "num_questions", "value": 1},
+            {"name": "files", "value": [{"url": "https://example.com/test.pdf"}]}
+        ]}
+    }
+    with TestClient(app) as client:
+        app.state.job_queue.runner = fake_runner
+        assert client.post("/jobs", json=payload, headers={"api-key": "dev"}).status_code == 202
+        samples = parse(client.get("/metrics", headers={"api-key": "dev"}).text)
+
+    assert samples['kai_request_duration_seconds_count{route="/jobs",tool_id="0",status="202"}'] == 1
@@ -0,0 +1,48 @@
+import threading
+from langchain_core.language_models.fake import FakeListLLM
+from services.models import ModelRegistry, ModelProvider, StaticModelProvider, get_llm, override_model_provider
+
+class CountingProvider(ModelProvider):
+    def __init__(self):
+        self.created = []
+
+    def create_llm(self, model_name, **kwargs):
+        self.created.append(("llm", model_name))
+        return FakeListLLM(responses=[model_name])
+
+    def create_embeddings(self, model_name, **kwargs):
+        self.created.append(("embeddings", model_name))
+        return object()
+
+def test_clients_are_built_once_per_model():
+    provider = CountingProvider()
+    registry = ModelRegistry(provider)
+
+    assert registry.get_llm("gemini-1.0-pro") is registry.get_llm("gemini-1.0-pro")
+    assert registry.get_llm("gemini-1.5-flash-001") is not registry.get_llm("gemini-1.0-pro")
+    assert registry.get_embeddings("textembedding-gecko") is registry.get_embeddings("textembedding-gecko")
+    assert provider.created == [("llm", "gemini-1.0-pro"), ("llm", "gemini-1.5-flash-001"), ("embeddings", "textembedding-gecko")]
+
+def test_concurrent_first_use_builds_a_single_client():
+    provider = CountingProvider()
+    registry = ModelRegistry(provider)
+    clients = []
+
+    threads = [threading.Thread(target=lambda: clients.append(registry.get_llm("gemini-1.0-pro"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(provider.created) == 1
+    assert all(client is clients[0] for client in clients)
+
+def test_override_model_provider_restores_previous_provider():
+    fake_llm = FakeListLLM(responses=["fake"])
+
+    with override_model_provider(StaticModelProvider(llm=fake_llm)):
+        assert get_llm() is fake_llm
+        assert get_llm("gemini-1.5-flash-001") is fake_llm
+
+    with override_model_provider(CountingProvider()):
+        assert get_llm() is not fake_llm
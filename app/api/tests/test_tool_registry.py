@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+import time
+import pytest
+from fastapi import HTTPException
+from services.tool_registry import ToolRegistry, compile_validator
+from api.error_utilities import InputValidationError
+
+EXECUTOR_SOURCE = """
+def executor(topic, verbose=False):
+    return "{result}:" + topic
+"""
+
+@pytest.fixture
+def tool_package(tmp_path, monkeypatch):
+    package_dir = tmp_path / "registry_fake_tool"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text("")
+    (package_dir / "core.py").write_text(EXECUTOR_SOURCE.format(result="v1"))
+    (package_dir / "metadata.json").write_text(json.dumps({
+        "inputs": [{"label": "Topic", "name": "topic", "type": "text"}]
+    }))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield package_dir
+    for module_name in ("registry_fake_tool", "registry_fake_tool.core"):
+        sys.modules.pop(module_name, None)
+
+def make_config():
+    return {"7": {"path": "registry_fake_tool.core", "metadata_file": "metadata.json"}}
+
+def test_registry_preloads_metadata_executor_and_validator(tool_package):
+    registry = ToolRegistry(make_config()).load()
+
+    tool = registry.get(7)
+    assert tool.metadata["inputs"][0]["name"] == "topic"
+    assert tool.preferred_executor(topic="math") == "v1:math"
+    assert tool.validator({"topic": "math"}) is True
+    with pytest.raises(InputValidationError):
+        tool.validator({"topic": 3})
+
+def test_registry_unknown_tool():
+    registry = ToolRegistry(make_config())
+    with pytest.raises(HTTPException) as exc_info:
+        registry.get("404")
+    assert exc_info.value.status_code == 404
+
+def test_registry_reports_missing_metadata(tool_package):
+    os.remove(tool_package / "metadata.json")
+    registry = ToolRegistry(make_config()).load()
+
+    with pytest.raises(HTTPException) as exc_info:
+        registry.get("7")
+    assert exc_info.value.status_code == 404
+
+def test_registry_reloads_changed_tool_when_enabled(tool_package):
+    registry = ToolRegistry(make_config(), auto_reload=True).load()
+    assert registry.get("7").preferred_executor(topic="math") == "v1:math"
+
+    core_path = tool_package / "core.py"
+    core_path.write_text(EXECUTOR_SOURCE.format(result="v2"))
+    future = time.time() + 5
+    os.utime(core_path, (future, future))
+
+    assert registry.get("7").preferred_executor(topic="math") == "v2:math"
+
+def test_compiled_validator_matches_metadata_rules():
+    validator = compile_validator([
+        {"label": "Topic", "type": "text", "name": "topic"},
+        {"label": "Number of Questions", "type": "number", "name": "num_questions"},
+        {"label": "Files", "type": "file", "name": "files"}
+    ])
+
+    assert validator({"topic": "Math", "num_questions": 2, "files": [{"url": "http://example.com/a.pdf"}], "extra": 1})
+    with pytest.raises(InputValidationError):
+        validator({"topic": "Math", "num_questions": 2})
+    with pytest.raises(InputValidationError):
+        validator({"topic": "Math", "num_questions": "two", "files": []})
+    with pytest.raises(InputValidationError):
+        validator({"topic": "Math", "num_questions": 2, "files": [{"filename": "a.pdf"}]})
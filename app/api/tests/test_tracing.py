@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import tracemalloc
+from io import BytesIO
+
+import pytest
+from langchain_core.documents import Document
+from services import tracing
+from services.execution import prefetch
+from services.tracing import StageAggregate, StageStats, format_trace, measure, request_trace, stage_stats, trace_stage
+
+@pytest.fixture(autouse=True)
+def fresh_aggregate(monkeypatch):
+    monkeypatch.setattr(tracing, "_aggregate", StageAggregate())
+
+def test_measure():
+    assert measure(None) == (0, 0)
+    assert measure([Document(page_content="héllo"), Document(page_content="ab")]) == (2, 8)
+    assert measure([(BytesIO(b"x" * 10), "pdf")]) == (1, 13)
+    assert measure("text") == (1, 4)
+
+def test_stages_are_recorded_in_the_request_trace():
+    with request_trace("0") as trace:
+        with trace_stage("split", [Document(page_content="abcd")]) as stage:
+            stage.output([Document(page_content="ab"), Document(page_content="cd")])
+        # Nested traces share the outer one
+        with request_trace("other") as inner:
+            assert inner is trace
+            with trace_stage("split", [Document(page_content="ef")]):
+                pass
+
+    stages = trace.as_dict()["stages"]
+    assert [stage["name"] for stage in stages] == ["split"]
+    assert stages[0]["calls"] == 2
+    assert (stages[0]["items_in"], stages[0]["bytes_in"]) == (2, 6)
+    assert (stages[0]["items_out"], stages[0]["bytes_out"]) == (2, 4)
+    assert stages[0]["wall_time"] >= stages[0]["cpu_time"] >= 0
+
+    totals = stage_stats()
+    assert totals["0"]["requests"] == 1
+    assert totals["0"]["stages"]["split"]["calls"] == 2
+    assert "other" not in totals
+
+def test_threads_with_a_copied_context_record_into_the_trace():
+    def split(document):
+        with trace_stage("split", document) as stage:
+            stage.output([document])
+            return threading.current_thread().name
+
+    with request_trace("0") as trace:
+        names = list(prefetch((split(Document(page_content="x")) for _ in range(3)), maxsize=1))
+
+    assert threading.current_thread().name not in names
+    assert trace.stages["split"].calls == 3
+
+def test_stages_outside_a_request_are_aggregated_separately():
+    with trace_stage("embed", ["a", "b"]):
+        pass
+    assert stage_stats()[tracing.UNTRACED]["stages"]["embed"]["items_in"] == 2
+
+def test_failed_stages_are_recorded():
+    with request_trace("0") as trace:
+        with pytest.raises(ValueError):
+            with trace_stage("generate"):
+                raise ValueError("broken")
+    assert trace.stages["generate"].calls == 1
+
+def test_nested_stages_keep_their_own_peak():
+    tracemalloc.start()
+    try:
+        with request_trace("0") as trace:
+            with trace_stage("outer"):
+                block = bytearray(2_000_000)
+                del block
+                # The inner stage starts after the outer one's peak and must not erase it
+                with trace_stage("inner"):
+                    small = bytearray(100_000)
+                    del small
+    finally:
+        tracemalloc.stop()
+
+    assert trace.stages["outer"].peak_memory >= 2_000_000
+    assert 100_000 <= trace.stages["inner"].peak_memory < 2_000_000
+
+def test_async_stages_do_not_report_cpu_time():
+    async def stage():
+        with trace_stage("summarize", cpu=False):
+            await asyncio.sleep(0)
+
+    with request_trace("0") as trace:
+        asyncio.run(stage())
+        with trace_stage("summarize"):
+            pass
+
+    stats = trace.as_dict()["stages"][0]
+    # Only the synchronous call measured its CPU time
+    assert stats["calls"] == 2 and stats["cpu_time"] is not None
+    assert StageStats("summarize").cpu_time is None
+    assert "n/a cpu" in format_trace({"stages": [StageStats("summarize").as_dict()]})[0]
@@ -0,0 +1,83 @@
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from services.vectorstore import NumpyVectorStore
+
+class AxisEmbeddings(Embeddings):
+    """Maps known words to fixed vectors so search results are predictable."""
+    vectors = {
+        "apple": [1.0, 0.0, 0.0],
+        "apples": [0.99, 0.1, 0.0],
+        "pear": [0.8, 0.6, 0.0],
+        "car": [0.0, 0.0, 1.0],
+        "fruit": [1.0, 0.05, 0.0],
+    }
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+def build():
+    texts = ["apple", "apples", "pear", "car"]
+    return NumpyVectorStore.from_documents([Document(page_content=t, metadata={"n": i}) for i, t in enumerate(texts)], AxisEmbeddings())
+
+def test_similarity_search_ranks_by_cosine():
+    store = build()
+    assert store.matrix.dtype == np.float32
+    assert store.matrix.shape == (4, 3)
+
+    results = store.similarity_search_with_score("fruit", k=3)
+    assert [doc.page_content for doc, _ in results] == ["apple", "apples", "pear"]
+    assert results[0][0].metadata == {"n": 0}
+    assert results[0][1] > results[1][1] > results[2][1]
+
+def test_mmr_prefers_diverse_results():
+    store = build()
+    assert [doc.page_content for doc in store.similarity_search("fruit", k=2)] == ["apple", "apples"]
+    assert [doc.page_content for doc in store.max_marginal_relevance_search("fruit", k=2, fetch_k=3, lambda_mult=0.3)] == ["apple", "pear"]
+
+def test_retriever_and_delete():
+    store = build()
+    assert [doc.page_content for doc in store.as_retriever(search_kwargs={"k": 1}).invoke("car")] == ["car"]
+
+    store.delete([store.ids[0]])
+    assert [doc.page_content for doc in store.similarity_search("fruit", k=1)] == ["apples"]
+
+    store.delete_collection()
+    assert len(store) == 0
+    assert store.similarity_search("fruit") == []
+    assert store.max_marginal_relevance_search("fruit") == []
+
+def test_k_larger_than_collection():
+    store = build()
+    assert len(store.similarity_search("fruit", k=10)) == 4
+    assert len(store.max_marginal_relevance_search("fruit", k=10, fetch_k=2)) == 4
+
+def test_rag_pipeline_builds_numpy_store():
+    from features.quizzify.tools import RAGpipeline
+
+    pipeline = RAGpipeline(loader=object(), vectorstore_class=NumpyVectorStore, embedding_model=AxisEmbeddings())
+    store = pipeline.create_vectorstore([Document(page_content="apple"), Document(page_content="car")])
+    assert isinstance(store, NumpyVectorStore)
+    assert [doc.page_content for doc in store.similarity_search("car", k=1)] == ["car"]
+
+def test_rag_pipeline_records_a_trace_per_stage():
+    from features.quizzify.tools import RAGpipeline
+    from services.tracing import request_trace
+
+    class Loader:
+        def load(self, files):
+            return [Document(page_content="apple"), Document(page_content="car")]
+
+    pipeline = RAGpipeline(loader=Loader(), vectorstore_class=NumpyVectorStore, embedding_model=AxisEmbeddings())
+    pipeline.compile()
+    with request_trace("0") as trace:
+        pipeline(["https://example.com/fruit.pdf"])
+
+    stages = {stage["name"]: stage for stage in trace.as_dict()["stages"]}
+    assert list(stages) == ["load", "split", "embed"]
+    assert (stages["load"]["items_in"], stages["load"]["items_out"]) == (1, 2)
+    assert (stages["split"]["items_out"], stages["split"]["bytes_out"]) == (2, 8)
+    assert stages["embed"]["items_in"] == 2
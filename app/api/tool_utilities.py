@@ -1,11 +1,10 @@
 import json
 import os
 from services.logger import setup_logger
-from services.tool_registry import ToolFile
-from api.error_utilities import VideoTranscriptError, InputValidationError, ToolExecutorError
-from typing import Dict, Any, List
+from services.tool_registry import ToolFile, compile_validator
+from api.error_utilities import VideoTranscriptError, ToolExecutorError
+from typing import Dict, Any, List, Union, Callable
 from fastapi import HTTPException
-from pydantic import ValidationError
 
 logger = setup_logger(__name__)
 
@@ -24,6 +23,15 @@ def get_executor_by_name(module_path):
         logger.error(f"Failed to import executor from {module_path}: {str(e)}")
         raise ImportError(f"Failed to import module from {module_path}: {str(e)}")
 
+def get_async_executor_by_name(module_path):
+    # Tools may optionally provide an `aexecutor` coroutine built on async chain calls
+    try:
+        module = __import__(module_path, fromlist=['aexecutor'])
+    except Exception as e:
+        logger.error(f"Failed to import executor from {module_path}: {str(e)}")
+        raise ImportError(f"Failed to import module from {module_path}: {str(e)}")
+    return getattr(module, 'aexecutor', None)
+
 def load_tool_metadata(tool_id):
     logger.debug(f"Loading tool metadata for tool_id: {tool_id}")
     tool_config = tools_config.get(str(tool_id))
@@ -52,60 +60,40 @@ def prepare_input_data(input_data) -> Dict[str, Any]:
     return inputs
 
 def validate_inputs(request_data: Dict[str, Any], validate_data: List[Dict[str, str]]) -> bool:
-    validate_inputs = {input_item['name']: input_item['type'] for input_item in validate_data}
-    
-    # Check for missing inputs
-    for validate_input_name, input_type in validate_inputs.items():
-        if validate_input_name not in request_data:
-            error_message = f"Missing input: `{validate_input_name}`"
-            logger.error(error_message)
-            raise InputValidationError(error_message)
-
-    # Validate each input in request data against validate definitions
-    for input_name, input_value in request_data.items():
-        if input_name not in validate_inputs:
-            continue  # Skip validation for extra inputs not defined in validate
-
-        expected_type = validate_inputs[input_name]
-        if expected_type == 'text' and not isinstance(input_value, str):
-            error_message = f"Input `{input_name}` must be a string but got {type(input_value)}"
-            logger.error(error_message)
-            raise InputValidationError(error_message)
-        elif expected_type == 'number' and not isinstance(input_value, (int, float)):
-            error_message = f"Input `{input_name}` must be a number but got {type(input_value)}"
-            logger.error(error_message)
-            raise InputValidationError(error_message)
-        elif expected_type == 'file':
-            # Validate file inputs
-            if not isinstance(input_value, list):
-                error_message = f"Input `{input_name}` must be a list of file dictionaries but got {type(input_value)}"
-                logger.error(error_message)
-                raise InputValidationError(error_message)
-            for file_obj in input_value:
-                if not isinstance(file_obj, dict):
-                    error_message = f"Each item in the input `{input_name}` must be a dictionary representing a file but got {type(file_obj)}"
-                    logger.error(error_message)
-                    raise InputValidationError(error_message)
-                try:
-                    ToolFile.model_validate(file_obj, from_attributes=True)  # This will raise a validation error if the structure is incorrect
-                except ValidationError:
-                    error_message = f"Each item in the input `{input_name}` must be a valid ToolFile where a url is provided"
-                    logger.error(error_message)
-                    raise InputValidationError(error_message)
-
-    return True
+    return compile_validator(validate_data)(request_data)
 
 def convert_files_to_tool_files(inputs: Dict[str, Any]) -> Dict[str, Any]:
     if 'files' in inputs:
         inputs['files'] = [ToolFile(**file_object) for file_object in inputs['files']]
     return inputs
 
-def finalize_inputs(input_data, validate_data: List[Dict[str, str]]) -> Dict[str, Any]:
+def finalize_inputs(input_data, validate_data: Union[List[Dict[str, str]], Callable]) -> Dict[str, Any]:
+    # Accepts either the raw metadata inputs or a validator precompiled by the ToolRegistry
     inputs = prepare_input_data(input_data)
-    validate_inputs(inputs, validate_data)
+    validator = validate_data if callable(validate_data) else compile_validator(validate_data)
+    validator(inputs)
     inputs = convert_files_to_tool_files(inputs)
     return inputs
 
+def handle_tool_exception(e: Exception):
+    if isinstance(e, HTTPException):
+        raise e
+    
+    if isinstance(e, VideoTranscriptError):
+        logger.error(f"Failed to execute tool due to video transcript error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if isinstance(e, ToolExecutorError):
+        logger.error(f"Failed to execute tool due to executor error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if isinstance(e, ImportError):
+        logger.error(f"Failed to execute tool due to import error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.error(f"Encountered error in executing tool: {str(e)}")
+    raise HTTPException(status_code=500, detail=str(e))
+
 def execute_tool(tool_id, request_inputs_dict):
     try:
         tool_config = tools_config.get(str(tool_id))
@@ -118,18 +106,29 @@ def execute_tool(tool_id, request_inputs_dict):
         
         return execute_function(**request_inputs_dict)
     
-    except VideoTranscriptError as e:
-        logger.error(f"Failed to execute tool due to video transcript error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
-    
-    except ToolExecutorError as e:
-        logger.error(f"Failed to execute tool due to executor error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
-    
-    except ImportError as e:
-        logger.error(f"Failed to execute tool due to import error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        handle_tool_exception(e)
+
+async def execute_tool_async(tool_id, request_inputs_dict, execution_pool, tool_registry=None):
+    """
+    Executes a tool through the execution pool so the event loop is never blocked.
+    Async executors are awaited directly, synchronous ones run in the pool's worker threads.
+    When a ToolRegistry is given the executor is taken from it instead of being imported.
+    """
+    try:
+        if tool_registry is not None:
+            execute_function = tool_registry.get(tool_id).preferred_executor
+        else:
+            tool_config = tools_config.get(str(tool_id))
+            
+            if not tool_config:
+                raise HTTPException(status_code=404, detail="Tool executable not found")
+            
+            execute_function = get_async_executor_by_name(tool_config['path']) or get_executor_by_name(tool_config['path'])
+        
+        request_inputs_dict['verbose'] = True
+        
+        return await execution_pool.run(str(tool_id), execute_function, **request_inputs_dict)
     
     except Exception as e:
-        logger.error(f"Encountered error in executing tool: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        handle_tool_exception(e)
@@ -0,0 +1,45 @@
+"""
+Measures the per-request overhead of `key_check`.
+
+Compares a provider lookup on every request (the previous behaviour, with a simulated
+Secret Manager round trip) against the cached secret.
+
+Run from the app directory:
+    python -m benchmarks.bench_auth
+"""
+import time
+from utils.secrets import SecretProvider, CachedSecret
+from utils.auth import configure_api_key, key_check
+
+SIMULATED_ROUND_TRIP = 0.02
+
+class SlowProvider(SecretProvider):
+    def get_secret(self, secret_id):
+        time.sleep(SIMULATED_ROUND_TRIP)
+        return "bench-key"
+
+def timed(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    provider = SlowProvider()
+
+    uncached = timed(lambda: provider.get_secret("backend-access"), 50)
+
+    configure_api_key(provider, ttl=300)
+    key_check(api_key="bench-key")  # warm the cache
+    cached = timed(lambda: key_check(api_key="bench-key"), 100_000)
+
+    expired = CachedSecret(provider, "backend-access", ttl=0)
+    expired.get()
+    stale = timed(expired.get, 10_000)
+
+    print(f"uncached lookup per request:       {uncached * 1e6:10.1f} us")
+    print(f"cached key_check per request:      {cached * 1e6:10.1f} us")
+    print(f"expired secret (background refresh): {stale * 1e6:8.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Peak memory of concurrent quiz requests that each download and parse several large PDFs.
+
+Each mode runs in a fresh child process against a local file server in this process:
+    previous  downloads into BytesIO, and pymupdf gets a copy of the bytes (getvalue), as before
+    memory    SpooledFile with spooling disabled, pymupdf reads a view of the buffer
+    spooled   SpooledFile with the default threshold, large files are memory-mapped from disk
+
+Peak RSS includes the pages of memory-mapped files that were read, which the kernel can drop
+under pressure. Peak anonymous memory, sampled every few milliseconds, is the memory that cannot.
+When the temporary directory is memory-backed, set DOWNLOAD_SPOOL_DIR to a disk.
+
+Run from the app directory:
+    python -m benchmarks.bench_download_memory
+"""
+import functools
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+
+import pymupdf
+
+REQUESTS = 3
+FILES_PER_REQUEST = 3
+IMAGE_SIDE = 1400
+TEXT_PAGES = 40
+
+def large_pdf(seed: int) -> bytes:
+    # A noise image does not compress, so the file stays large
+    generator = random.Random(seed)
+    noise = bytes(generator.getrandbits(8) for _ in range(IMAGE_SIDE * IMAGE_SIDE * 3))
+    document = pymupdf.open()
+    page = document.new_page()
+    page.insert_image(page.rect, pixmap=pymupdf.Pixmap(pymupdf.csRGB, IMAGE_SIDE, IMAGE_SIDE, noise, False))
+    for number in range(TEXT_PAGES):
+        document.new_page().insert_text((72, 72), f"Page {number + 2}: regression fits a line by least squares.")
+    content = document.tobytes(deflate=False)
+    document.close()
+    return content
+
+def serve(files):
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(files[self.path])))
+            self.end_headers()
+
+        def do_GET(self):
+            self.do_HEAD()
+            self.wfile.write(files[self.path])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def rss_anon_kb() -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1])
+    return 0
+
+class PreviousBuffer(BytesIO):
+    # The loaders read through getbuffer(), before they worked on a copy of the bytes
+    def getbuffer(self):
+        return memoryview(self.getvalue())
+
+def child(mode: str, base_url: str):
+    from services.tool_registry import ToolFile
+    from features.quizzify import downloader
+    from features.quizzify.tools import URLLoader
+
+    if mode == "previous":
+        downloader.SpooledFile = PreviousBuffer
+    elif mode == "memory":
+        downloader.SpooledFile = functools.partial(downloader.SpooledFile, max_memory_bytes=sys.maxsize)
+
+    peak_anon = baseline = rss_anon_kb()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak_anon
+        while not done.is_set():
+            peak_anon = max(peak_anon, rss_anon_kb())
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    loader = URLLoader(use_parse_cache=False)
+    requests = [[ToolFile(url=f"{base_url}/r{request}-f{number}.pdf") for number in range(FILES_PER_REQUEST)] for request in range(REQUESTS)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(REQUESTS) as pool:
+        documents = sum(len(docs) for docs in pool.map(loader.load, requests))
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{mode:>9} {documents:>6} {elapsed:7.2f}s {(peak_rss - baseline_rss) / 1024:>12.0f}MB {(peak_anon - baseline) / 1024:>14.0f}MB")
+
+def main():
+    files = {f"/r{request}-f{number}.pdf": large_pdf(request * FILES_PER_REQUEST + number)
+             for request in range(REQUESTS) for number in range(FILES_PER_REQUEST)}
+    size = sum(len(content) for content in files.values())
+    print(f"{REQUESTS} concurrent requests of {FILES_PER_REQUEST} PDFs, {size / 2 ** 20:.0f}MB downloaded in total")
+    print(f"{'mode':>9} {'docs':>6} {'time':>8} {'peak RSS +':>14} {'peak anon +':>16}")
+    server = serve(files)
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        for mode in ("previous", "memory", "spooled"):
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_download_memory", mode, base_url], check=True)
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        child(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,63 @@
+"""
+Regression benchmark for HTMLLoader on large generated pages.
+
+The previous loader parsed with BeautifulSoup's default parser and returned `get_text()` of the
+whole page, scripts, styles and navigation included, as a single document. This compares it with
+the block-split loader on lxml and on html.parser, tracking the parse time, the documents and
+chunks produced and the characters sent to the embedding model.
+
+Run from the app directory:
+    python -m benchmarks.bench_html_loader
+"""
+import time
+from io import BytesIO
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from features.quizzify.tools import HTML_PARSER, HTMLLoader
+
+def generated_page(sections: int) -> bytes:
+    nav = "".join(f'<li><a href="/topic/{n}">Topic {n}</a></li>' for n in range(40))
+    parts = [
+        "<!doctype html><html><head><title>Linear models</title>",
+        "<style>" + ".c { color: #333; margin: 0 }\n" * 200 + "</style>",
+        "<script>" + "window.analytics.push({event: 'view'});\n" * 200 + "</script>",
+        f"</head><body><nav><ul>{nav}</ul></nav><main>",
+    ]
+    for number in range(sections):
+        parts.append(
+            f"<section><h2>Section {number + 1}</h2>"
+            "<p>A regression line <b>minimizes</b> the sum of the <a href='#'>squared residuals</a>.</p>"
+            "<p>The slope measures the change in y for each unit of x, the intercept is the value at zero.</p>"
+            "<ul><li>Ordinary least squares</li><li>Ridge regression</li></ul>"
+            "<script>track('section');</script></section>"
+        )
+    parts.append(f"</main><footer>{nav}</footer></body></html>")
+    return "".join(parts).encode("utf-8")
+
+def previous_loader(files):
+    # Whole-page get_text, as the loader did before
+    return [Document(page_content=BeautifulSoup(file.getvalue(), "html.parser").get_text(), metadata={"source": file_type, "page_number": 1})
+            for file, file_type in files]
+
+def measure(load, content):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    start = time.perf_counter()
+    documents = load([(BytesIO(content), "html")])
+    parse = time.perf_counter() - start
+    chunks = splitter.split_documents(documents)
+    return parse, len(documents), len(chunks), sum(len(chunk.page_content) for chunk in chunks)
+
+def main():
+    loaders = [("previous", previous_loader), ("html.parser", lambda files: HTMLLoader(files, parser="html.parser").load())]
+    if HTML_PARSER == "lxml":
+        loaders.append(("lxml", lambda files: HTMLLoader(files, parser="lxml").load()))
+    print(f"{'size':>8} {'loader':>12} {'parse':>8} {'docs':>6} {'chunks':>7} {'embedded chars':>15}")
+    for sections in (100, 1000, 5000):
+        content = generated_page(sections)
+        for name, load in loaders:
+            parse, documents, chunks, characters = measure(load, content)
+            print(f"{len(content) // 1024:>6}KB {name:>12} {parse:7.2f}s {documents:>6} {chunks:>7} {characters:>15,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Per-request cost of metrics collection.
+
+Times the metric updates on their own, then sends the same requests straight through the ASGI
+interface of two FastAPI apps with the routes of the API, one with MetricsMiddleware and one
+without, so the difference is what the middleware adds to every request, including the extra
+middleware layer Starlette builds for it. Last, the time to render /metrics once every series exists.
+
+Run from the app directory:
+    python -m benchmarks.bench_metrics_overhead
+"""
+import asyncio
+import time
+from fastapi import FastAPI, Request
+from services import metrics
+from services.metrics import MetricsMiddleware
+
+OPERATIONS = 200000
+REQUESTS = 20000
+PATHS = ["/submit-tool", "/chat", "/jobs/0f8e", "/jobs/0f8e/events"]
+
+def per_call(function, repeat: int = OPERATIONS) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/submit-tool")
+    async def submit_tool(request: Request):
+        request.state.tool_id = "0"
+        return {}
+
+    @app.post("/chat")
+    async def chat():
+        return {}
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        return {}
+
+    @app.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str):
+        return {}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+async def send_requests(app: FastAPI, count: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for number in range(count):
+        path = PATHS[number % len(PATHS)]
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+                 "method": "GET" if path.startswith("/jobs") else "POST", "path": path, "raw_path": path.encode(),
+                 "root_path": "", "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)}
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / count
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def middleware_alone(count: int) -> float:
+    # The middleware around an app that does nothing, the routes come from an app of the API
+    middleware = MetricsMiddleware(noop_app)
+    routes_app = build_app(False)
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for number in range(count):
+        path = PATHS[number % len(PATHS)]
+        await middleware({"type": "http", "path": path, "app": routes_app}, None, send)
+    return (time.perf_counter() - start) / count
+
+async def compare_requests():
+    apps = {"without": build_app(False), "with": build_app(True)}
+    for app in apps.values():
+        await send_requests(app, 1000)
+    # Interleaved rounds, the best of each, so drift in the machine's load affects both alike
+    best = {name: float("inf") for name in apps}
+    for _ in range(5):
+        for name, app in apps.items():
+            best[name] = min(best[name], await send_requests(app, REQUESTS // 5))
+    return best
+
+def main():
+    counter = metrics.LOADER_DOCUMENTS.labels("pdf")
+    print(f"{'operation':>36} {'time':>10}")
+    print(f"{'counter.labels(...).inc()':>36} {per_call(lambda: metrics.LOADER_DOCUMENTS.labels('pdf').inc()) * 1e9:8.0f}ns")
+    print(f"{'counter.inc() on a held series':>36} {per_call(counter.inc) * 1e9:8.0f}ns")
+    print(f"{'histogram.labels(...).observe()':>36} {per_call(lambda: metrics.MODEL_LATENCY.labels('llm', 'gemini').observe(0.42)) * 1e9:8.0f}ns")
+    print(f"{'record_model_call()':>36} {per_call(lambda: metrics.record_model_call('llm', 'gemini', 0.42, False, 120, 80)) * 1e9:8.0f}ns")
+
+    best = asyncio.run(compare_requests())
+    print(f"\n{'ASGI request':>36} {'time':>10}")
+    print(f"{'without metrics':>36} {best['without'] * 1e6:8.1f}us")
+    print(f"{'with MetricsMiddleware':>36} {best['with'] * 1e6:8.1f}us")
+    print(f"{'overhead per request':>36} {(best['with'] - best['without']) * 1e6:8.1f}us")
+    print(f"{'of which the middleware itself':>36} {asyncio.run(middleware_alone(REQUESTS)) * 1e6:8.1f}us")
+
+    start = time.perf_counter()
+    text = metrics.render()
+    print(f"\nrender: {len(text.splitlines())} lines in {(time.perf_counter() - start) * 1e3:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measures BytesFilePDFLoader page extraction on a synthetic multi-hundred-page PDF,
+serially on the calling thread against page ranges in the process pool.
+
+The first parallel run includes spawning the pool, later runs reuse it. Spawned workers
+re-import the __main__ module, which here is this benchmark with all of langchain; under
+`uvicorn main:app` they only import the small pdf_extraction module. Gains depend on the
+number of cores, see PARSE_PROCESS_WORKERS.
+
+Run from the app directory:
+    python -m benchmarks.bench_pdf_extraction
+"""
+import os
+import time
+from io import BytesIO
+import pymupdf
+from features.quizzify.tools import BytesFilePDFLoader
+from features.quizzify import pdf_extraction, process_pool
+
+LINES_PER_PAGE = 45
+
+def synthetic_pdf(pages: int) -> bytes:
+    document = pymupdf.open()
+    line = "Regression fits a line through the observed points by least squares. " * 2
+    for number in range(pages):
+        page = document.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), f"Page {number + 1}\n" + "\n".join([line] * LINES_PER_PAGE), fontsize=7)
+    content = document.tobytes()
+    document.close()
+    return content
+
+def timed(content: bytes, parallel: bool):
+    start = time.perf_counter()
+    documents = BytesFilePDFLoader([(BytesIO(content), "pdf")], parallel=parallel).load()
+    return time.perf_counter() - start, len(documents)
+
+def main():
+    print(f"{os.cpu_count()} cores, {pdf_extraction.PDF_PROCESS_WORKERS} workers")
+    print(f"{'pages':>6} {'serial':>10} {'parallel (cold)':>16} {'parallel (warm)':>16}")
+    try:
+        for pages in (100, 300, 600):
+            content = synthetic_pdf(pages)
+            serial, count = timed(content, parallel=False)
+            process_pool.shutdown_process_pool()
+            cold, _ = timed(content, parallel=True)
+            warm, parallel_count = timed(content, parallel=True)
+            assert count == parallel_count == pages
+            print(f"{pages:>6} {serial:9.2f}s {cold:15.2f}s {warm:15.2f}s")
+    finally:
+        process_pool.shutdown_process_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Regression benchmark for PowerPointLoader on generated decks.
+
+The previous loader wrote the text of slides 1..N into the document of slide N. This compares
+it with the per-slide loader and with slides grouped up to the 1000 character chunk size, tracking the chunks
+produced by the quizzify splitter and the characters sent to the embedding model.
+
+Run from the app directory:
+    python -m benchmarks.bench_pptx_loader
+"""
+import time
+from io import BytesIO
+from pptx import Presentation
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from features.quizzify.tools import PowerPointLoader
+
+def generated_deck(slides: int) -> bytes:
+    presentation = Presentation()
+    for number in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {number + 1}: linear models"
+        body = slide.placeholders[1].text_frame
+        body.text = "A regression line minimizes the squared residuals."
+        for point in range(5):
+            body.add_paragraph().text = f"Point {point + 1}: the slope measures the change in y for each unit of x."
+    content = BytesIO()
+    presentation.save(content)
+    return content.getvalue()
+
+def previous_loader(files):
+    # Cumulative text, as the loader built it before
+    documents = []
+    for file, file_type in files:
+        page_content = ""
+        for slide_num, slide in enumerate(Presentation(file).slides, start=1):
+            title = slide.shapes.title.text if slide.shapes.title else ""
+            texts = "".join(run.text for shape in slide.shapes if shape.has_text_frame
+                            for paragraph in shape.text_frame.paragraphs for run in paragraph.runs)
+            page_content += title + texts
+            documents.append(Document(page_content=page_content, metadata={"source": file_type, "page_number": slide_num}))
+    return documents
+
+def measure(load, content):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    start = time.perf_counter()
+    documents = load([(BytesIO(content), "pptx")])
+    parse = time.perf_counter() - start
+    chunks = splitter.split_documents(documents)
+    return parse, len(documents), len(chunks), sum(len(chunk.page_content) for chunk in chunks)
+
+def main():
+    loaders = (
+        ("previous", previous_loader),
+        ("per slide", lambda files: PowerPointLoader(files).load()),
+        ("grouped", lambda files: PowerPointLoader(files, group_chars=1000).load()),
+    )
+    print(f"{'slides':>6} {'loader':>10} {'parse':>8} {'docs':>6} {'chunks':>7} {'embedded chars':>15}")
+    for slides in (20, 100, 300):
+        content = generated_deck(slides)
+        for name, load in loaders:
+            parse, documents, chunks, characters = measure(load, content)
+            print(f"{slides:>6} {name:>10} {parse:7.2f}s {documents:>6} {chunks:>7} {characters:>15,}")
+
+if __name__ == "__main__":
+    main()
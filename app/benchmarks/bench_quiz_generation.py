@@ -0,0 +1,57 @@
+"""
+Measures QuizBuilder wall-clock time against the number of questions.
+
+Uses an LLM that answers after a fixed delay, so the numbers show how many round trips are
+serialized. Every third per question response is invalid to exercise the retry path, and the
+batch mode gets one item short on its first call.
+
+Run from the app directory:
+    python -m benchmarks.bench_quiz_generation
+"""
+import asyncio
+import logging
+import time
+import json
+from features.quizzify.tests.fakes import LatencyLLM, FakeVectorstore, VALID, question
+from features.quizzify.tools import QuizBuilder
+
+LATENCY = 0.2
+RESPONSES = [VALID, VALID, "not json"]
+
+def timed(max_concurrency, num_questions, use_async=False):
+    llm = LatencyLLM(responses=RESPONSES, latency=LATENCY)
+    builder = QuizBuilder(FakeVectorstore(), "math", model=llm, max_concurrency=max_concurrency)
+    start = time.perf_counter()
+    if use_async:
+        questions = asyncio.run(builder.acreate_questions(num_questions))
+    else:
+        questions = builder.create_questions(num_questions)
+    assert len(questions) == num_questions
+    return time.perf_counter() - start, llm.calls
+
+def timed_batch(num_questions):
+    # The first batch call drops one question, the follow-up call fills it in
+    responses = [json.dumps([question(n) for n in range(num_questions - 1)]), json.dumps([question(num_questions)])]
+    llm = LatencyLLM(responses=responses, latency=LATENCY)
+    builder = QuizBuilder(FakeVectorstore(), "math", model=llm, generation_mode="batch")
+    start = time.perf_counter()
+    assert len(builder.create_questions(num_questions)) == num_questions
+    return time.perf_counter() - start, llm.calls
+
+def main():
+    logging.disable(logging.WARNING)
+    print(f"LLM latency {LATENCY * 1000:.0f} ms, one in three responses invalid")
+    print(f"{'questions':>9} {'sequential':>12} {'waves x4':>12} {'waves x8':>12} {'async x8':>12} {'batch':>12}")
+    for num_questions in (1, 3, 5, 10):
+        results = [
+            timed(1, num_questions),
+            timed(4, num_questions),
+            timed(8, num_questions),
+            timed(8, num_questions, use_async=True),
+            timed_batch(num_questions),
+        ]
+        cells = " ".join(f"{elapsed:7.2f}s/{calls:<3}" for elapsed, calls in results)
+        print(f"{num_questions:>9} {cells}")
+
+if __name__ == "__main__":
+    main()
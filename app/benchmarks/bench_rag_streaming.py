@@ -0,0 +1,69 @@
+"""
+Compares the staged RAG pipeline with the streaming one on simulated latencies.
+
+The loader takes DOWNLOAD seconds per file and PARSE seconds per page, the embedding model
+EMBED_CALL seconds per call plus EMBED_TEXT seconds per chunk. The staged pipeline pays the sum
+of the stages, the streaming pipeline should approach the slowest one. Peak memory is traced
+in a separate run, since tracemalloc slows the timed one down.
+
+Run from the app directory:
+    python -m benchmarks.bench_rag_streaming
+"""
+import time
+import tracemalloc
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from services.vectorstore import NumpyVectorStore
+from features.quizzify.tools import RAGpipeline
+
+FILES = 8
+PAGES = 30
+PAGE_CHARS = 3000
+DOWNLOAD = 0.15
+PARSE = 0.005
+EMBED_CALL = 0.05
+EMBED_TEXT = 0.001
+
+class SimulatedLoader:
+    def lazy_load(self, files):
+        text = "Regression fits a line through the observed points by least squares. "
+        for number in range(len(files)):
+            time.sleep(DOWNLOAD)
+            for page in range(PAGES):
+                time.sleep(PARSE)
+                yield Document(page_content=f"File {number} page {page}. " + text * (PAGE_CHARS // len(text)),
+                               metadata={"source": "pdf", "page_number": page + 1})
+
+    def load(self, files):
+        return list(self.lazy_load(files))
+
+class SimulatedEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        time.sleep(EMBED_CALL + EMBED_TEXT * len(texts))
+        return [[float(len(text) % 7), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, 1.0, 0.5]
+
+def run(streaming: bool):
+    pipeline = RAGpipeline(loader=SimulatedLoader(), vectorstore_class=NumpyVectorStore,
+                           embedding_model=SimulatedEmbeddings(), streaming=streaming)
+    pipeline.compile()
+    return pipeline(list(range(FILES)))
+
+def main():
+    load = FILES * (DOWNLOAD + PAGES * PARSE)
+    print(f"{FILES} files of {PAGES} pages, simulated loading {load:.2f}s")
+    print(f"{'pipeline':>10} {'time':>8} {'chunks':>7} {'peak memory':>12}")
+    for name, streaming in (("staged", False), ("streaming", True)):
+        start = time.perf_counter()
+        store = run(streaming)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        run(streaming)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:>10} {elapsed:7.2f}s {len(store):>7} {peak / 2 ** 20:>10.1f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares NumpyVectorStore with Chroma for the short-lived per-request collections of quizzify.
+
+Measures building the collection, a top-4 similarity search, an MMR search and dropping the
+collection, plus the Python heap allocated while building (tracemalloc, so Chroma's native
+allocations are not included) and the process RSS growth when psutil is installed.
+Embeddings are precomputed random vectors so only the store is timed.
+
+Run from the app directory:
+    python -m benchmarks.bench_vectorstore
+"""
+import gc
+import os
+import time
+import tracemalloc
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+from langchain_chroma import Chroma
+from services.vectorstore import NumpyVectorStore
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DIMENSIONS = 768
+QUERIES = 20
+
+class PrecomputedEmbeddings(Embeddings):
+    def __init__(self, texts):
+        rng = np.random.default_rng(0)
+        self.vectors = {text: row.tolist() for text, row in zip(texts, rng.standard_normal((len(texts), DIMENSIONS), dtype=np.float32))}
+        self.query = rng.standard_normal(DIMENSIONS).tolist()
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.query
+
+def rss():
+    return psutil.Process().memory_info().rss if psutil else 0
+
+def measure_memory(store_class, documents, embeddings):
+    # A separate build, tracing would distort the timings
+    gc.collect()
+    rss_before = rss()
+    tracemalloc.start()
+    store = store_class.from_documents(documents, embeddings)
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss_growth = rss() - rss_before
+    store.delete_collection()
+    return heap, rss_growth
+
+def run(store_class, documents, embeddings):
+    heap, rss_growth = measure_memory(store_class, documents, embeddings)
+
+    gc.collect()
+    start = time.perf_counter()
+    store = store_class.from_documents(documents, embeddings)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        store.similarity_search("topic", k=4)
+    query = (time.perf_counter() - start) / QUERIES
+
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        store.max_marginal_relevance_search("topic", k=12, fetch_k=36)
+    mmr = (time.perf_counter() - start) / QUERIES
+
+    start = time.perf_counter()
+    store.delete_collection()
+    teardown = time.perf_counter() - start
+    return build, query, mmr, teardown, heap, rss_growth
+
+def main():
+    print(f"{'chunks':>7} {'store':>6} {'build':>10} {'query':>10} {'mmr':>10} {'teardown':>10} {'heap MB':>8} {'rss MB':>8}")
+    for size in (100, 1_000, 10_000):
+        texts = [f"chunk {n}" for n in range(size)]
+        documents = [Document(page_content=text) for text in texts]
+        embeddings = PrecomputedEmbeddings(texts)
+        for name, store_class in (("chroma", Chroma), ("numpy", NumpyVectorStore)):
+            build, query, mmr, teardown, heap, rss_growth = run(store_class, documents, embeddings)
+            print(f"{size:>7} {name:>6} {build * 1000:8.1f}ms {query * 1000:8.2f}ms {mmr * 1000:8.2f}ms "
+                  f"{teardown * 1000:8.1f}ms {heap / 2**20:8.1f} {rss_growth / 2**20:8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from langchain_google_vertexai import VertexAI
 from langchain.prompts import PromptTemplate
 from services.schemas import ChatMessage, Message
+from services.models import get_llm
 import os
 
 def read_text_file(file_path):
@@ -27,10 +27,9 @@ def build_prompt():
     return prompt
 
 
-def executor(user_name: str, user_query: str, messages: list[Message], k=10):
-    
+def build_chat_context(messages: list[Message], k=10):
     # create a memory list of last k = 3 messages
-    chat_context = [
+    return [
         ChatMessage(
             role=message.role, 
             type=message.type, 
@@ -38,12 +37,36 @@ def executor(user_name: str, user_query: str, messages: list[Message], k=10):
         ) for message in messages[-k:]
     ]
 
+def build_chain():
     prompt = build_prompt()
     
-    llm = VertexAI(model_name="gemini-1.0-pro") 
+    llm = get_llm("gemini-1.0-pro")
     
-    chain =  prompt | llm
+    return prompt | llm
+
+def executor(user_name: str, user_query: str, messages: list[Message], k=10):
+    chat_context = build_chat_context(messages, k=k)
+    
+    chain = build_chain()
     
     response = chain.invoke({"chat_history": chat_context, "user_name": user_name, "user_query": user_query})
     
     return response
+
+async def aexecutor(user_name: str, user_query: str, messages: list[Message], k=10):
+    chat_context = build_chat_context(messages, k=k)
+    
+    chain = build_chain()
+    
+    response = await chain.ainvoke({"chat_history": chat_context, "user_name": user_name, "user_query": user_query})
+    
+    return response
+
+async def astream_executor(user_name: str, user_query: str, messages: list[Message], k=10):
+    """Yields the response text chunk by chunk as the model produces it."""
+    chat_context = build_chat_context(messages, k=k)
+    
+    chain = build_chain()
+    
+    async for chunk in chain.astream({"chat_history": chat_context, "user_name": user_name, "user_query": user_query}):
+        yield chunk
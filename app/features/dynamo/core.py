@@ -1,13 +1,12 @@
-from features.dynamo.tools import summarize_transcript, generate_flashcards
+from features.dynamo.tools import summarize_transcript, generate_flashcards, asummarize_transcript, agenerate_flashcards
+from features.dynamo.tools import get_video_id, flashcards_cache_key, FLASHCARDS_CACHE, CACHE_TTL
+from services.cache import get_cache, MISSING
 from services.logger import setup_logger
 from api.error_utilities import VideoTranscriptError
 
 logger = setup_logger(__name__)
 
-def executor(youtube_url: str, verbose=False):
-    summary = summarize_transcript(youtube_url, verbose=verbose)
-    flashcards = generate_flashcards(summary)
-
+def sanitize_flashcards(flashcards: list) -> list:
     sanitized_flashcards = []
     for flashcard in flashcards:
         if 'concept' in flashcard and 'definition' in flashcard:
@@ -18,4 +17,42 @@ def executor(youtube_url: str, verbose=False):
         else:
             logger.warning(f"Malformed flashcard skipped: {flashcard}")
 
-    return sanitized_flashcards 
\ No newline at end of file
+    return sanitized_flashcards
+
+def get_cached_flashcards(youtube_url: str, verbose=False):
+    cache_key = flashcards_cache_key(get_video_id(youtube_url))
+    flashcards = get_cache(FLASHCARDS_CACHE, disk_ttl=CACHE_TTL).get(cache_key)
+    if flashcards is not MISSING and verbose:
+        logger.info(f"Flashcards cache hit for {youtube_url}")
+    return cache_key, flashcards
+
+def cache_flashcards(cache_key: str, flashcards: list):
+    # An empty result is most likely a bad generation, so it is not worth keeping
+    if flashcards:
+        get_cache(FLASHCARDS_CACHE, disk_ttl=CACHE_TTL).set(cache_key, flashcards)
+
+def executor(youtube_url: str, verbose=False):
+    cache_key, sanitized_flashcards = get_cached_flashcards(youtube_url, verbose=verbose)
+    if sanitized_flashcards is not MISSING:
+        return sanitized_flashcards
+    
+    summary = summarize_transcript(youtube_url, verbose=verbose)
+    flashcards = generate_flashcards(summary)
+
+    sanitized_flashcards = sanitize_flashcards(flashcards)
+    cache_flashcards(cache_key, sanitized_flashcards)
+    
+    return sanitized_flashcards
+
+async def aexecutor(youtube_url: str, verbose=False):
+    cache_key, sanitized_flashcards = get_cached_flashcards(youtube_url, verbose=verbose)
+    if sanitized_flashcards is not MISSING:
+        return sanitized_flashcards
+    
+    summary = await asummarize_transcript(youtube_url, verbose=verbose)
+    flashcards = await agenerate_flashcards(summary)
+
+    sanitized_flashcards = sanitize_flashcards(flashcards)
+    cache_flashcards(cache_key, sanitized_flashcards)
+    
+    return sanitized_flashcards
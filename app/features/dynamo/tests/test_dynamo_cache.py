@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from langchain_core.documents import Document
+from langchain_core.language_models.fake import FakeListLLM
+from services import cache as cache_module
+from services.models import StaticModelProvider, override_model_provider
+from api.error_utilities import VideoTranscriptError
+from features.dynamo.core import executor
+
+VIDEO_URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache_module, "_caches", {})
+
+class FakeSummaryLLM(FakeListLLM):
+    def get_num_tokens(self, text: str) -> int:
+        return len(text.split())
+
+@pytest.fixture
+def fake_llm():
+    llm = FakeSummaryLLM(responses=[
+        "The video explains photosynthesis.",
+        "Photosynthesis turns light into chemical energy.",
+        '[{"concept": "Photosynthesis", "definition": "Turning light into chemical energy"}, {"concept": "missing definition"}]',
+        "unused, keeps the call counter from wrapping around"
+    ])
+    with override_model_provider(StaticModelProvider(llm=llm)):
+        yield llm
+
+@pytest.fixture
+def youtube_loader():
+    loader = MagicMock()
+    loader.load.return_value = [Document(
+        page_content="plants use sunlight to make food",
+        metadata={"source": "abcdefghijk", "length": 120, "title": "Photosynthesis"}
+    )]
+    with patch('features.dynamo.tools.YoutubeLoader.from_youtube_url', return_value=loader):
+        yield loader
+
+def test_repeat_request_is_served_from_cache(fake_llm, youtube_loader):
+    first = executor(VIDEO_URL)
+    calls_after_first = fake_llm.i
+
+    second = executor("https://youtu.be/abcdefghijk")
+
+    assert first == [{"concept": "Photosynthesis", "definition": "Turning light into chemical energy"}]
+    assert second == first
+    assert calls_after_first == 3
+    assert fake_llm.i == calls_after_first
+    assert youtube_loader.load.call_count == 1
+
+    stats = cache_module.cache_stats()
+    assert stats["dynamo_flashcards"]["hits"] == 1
+    assert stats["dynamo_flashcards"]["misses"] == 1
+
+def test_disk_tier_survives_memory_loss(fake_llm, youtube_loader):
+    executor(VIDEO_URL)
+    for cache in cache_module._caches.values():
+        cache.memory.clear()
+
+    executor(VIDEO_URL)
+
+    assert fake_llm.i == 3
+    assert cache_module.cache_stats()["dynamo_flashcards"]["disk"]["hits"] == 1
+
+def test_flashcards_are_regenerated_from_cached_summary(fake_llm, youtube_loader):
+    executor(VIDEO_URL)
+    cache_module.get_cache("dynamo_flashcards").clear()
+    fake_llm.i = 2
+
+    executor(VIDEO_URL)
+
+    # Only the flashcard generation runs again, transcript and summary come from the cache
+    assert youtube_loader.load.call_count == 1
+    assert cache_module.cache_stats()["dynamo_summaries"]["hits"] == 1
+
+def test_invalid_url_raises_transcript_error():
+    with pytest.raises(VideoTranscriptError):
+        executor("https://example.com/not-a-video")
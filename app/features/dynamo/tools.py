@@ -1,20 +1,25 @@
 from langchain_community.document_loaders import YoutubeLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
-from langchain_google_vertexai import VertexAI
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.chains.summarize import load_summarize_chain
 from langchain_core.pydantic_v1 import BaseModel, Field
 from api.error_utilities import VideoTranscriptError
 from fastapi import HTTPException
 from services.logger import setup_logger
+from services.models import get_llm
+from services.jobs import report_progress
+from services.tracing import trace_stage
+from services.cache import get_cache, MISSING
+import asyncio
+import hashlib
 import os
 
 
 logger = setup_logger(__name__)
 
 # AI Model
-model = VertexAI(model="gemini-1.0-pro")
+MODEL_NAME = "gemini-1.0-pro"
 
 
 def read_text_file(file_path):
@@ -27,8 +32,44 @@ def read_text_file(file_path):
     with open(absolute_file_path, 'r') as file:
         return file.read()
 
-# Summarize chain
-def summarize_transcript(youtube_url: str, max_video_length=600, verbose=False) -> str:
+SUMMARY_CHAIN_TYPE = "map_reduce"
+CHUNK_SIZE = 1000
+CACHE_TTL = 7 * 24 * 3600
+
+TRANSCRIPT_CACHE = "dynamo_transcripts"
+SUMMARY_CACHE = "dynamo_summaries"
+FLASHCARDS_CACHE = "dynamo_flashcards"
+
+def version_hash(*parts) -> str:
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+def get_video_id(youtube_url: str) -> str:
+    try:
+        return YoutubeLoader.extract_video_id(youtube_url)
+    except Exception as e:
+        logger.error(f"No such video found at {youtube_url}")
+        raise VideoTranscriptError(f"No video found", youtube_url) from e
+
+def summary_cache_key(video_id: str) -> str:
+    # Cached summaries are invalidated whenever the model or the summarize settings change
+    return f"{video_id}:{version_hash(MODEL_NAME, SUMMARY_CHAIN_TYPE, CHUNK_SIZE)}"
+
+def flashcards_cache_key(video_id: str) -> str:
+    version = version_hash(
+        summary_cache_key(video_id),
+        read_text_file("prompt/dynamo-prompt.txt"),
+        read_text_file("prompt/examples.txt"),
+        Flashcard.schema_json()
+    )
+    return f"{video_id}:{version}"
+
+def fetch_transcript(youtube_url: str, video_id: str, verbose=False) -> list:
+    transcript_cache = get_cache(TRANSCRIPT_CACHE, disk_ttl=CACHE_TTL)
+    docs = transcript_cache.get(video_id)
+    if docs is not MISSING:
+        if verbose: logger.info(f"Transcript cache hit for video {video_id}")
+        return docs
+    
     try:
         loader = YoutubeLoader.from_youtube_url(youtube_url, add_video_info=True)
     except Exception as e:
@@ -37,14 +78,23 @@ def summarize_transcript(youtube_url: str, max_video_length=600, verbose=False)
     
     try:
         docs = loader.load()
-        length = docs[0].metadata["length"]
-        title = docs[0].metadata["title"]
+        docs[0].metadata["length"]
     except Exception as e:
         logger.error(f"Video transcript might be private or unavailable in 'en' or the URL is incorrect.")
         raise VideoTranscriptError(f"No video transcripts available", youtube_url) from e
     
+    transcript_cache.set(video_id, docs)
+    return docs
+
+# Summarize chain
+def load_transcript(youtube_url: str, max_video_length=600, verbose=False) -> list:
+    video_id = get_video_id(youtube_url)
+    docs = fetch_transcript(youtube_url, video_id, verbose=verbose)
+    length = docs[0].metadata["length"]
+    title = docs[0].metadata["title"]
+    
     splitter = RecursiveCharacterTextSplitter(
-        chunk_size = 1000,
+        chunk_size = CHUNK_SIZE,
         chunk_overlap = 0
     )
     
@@ -57,18 +107,70 @@ def summarize_transcript(youtube_url: str, max_video_length=600, verbose=False)
         logger.info(f"Found video with title: {title} and length: {length}")
         logger.info(f"Splitting documents into {len(split_docs)} chunks")
     
-    chain = load_summarize_chain(model, chain_type='map_reduce')
-    response = chain.invoke(split_docs)
+    report_progress("transcript_loaded", chunks=len(split_docs))
+    
+    return split_docs
+
+def get_cached_summary(youtube_url: str, max_video_length: int, verbose=False):
+    video_id = get_video_id(youtube_url)
+    cached = get_cache(SUMMARY_CACHE, disk_ttl=CACHE_TTL).get(summary_cache_key(video_id))
+    if cached is MISSING:
+        return None
+    if cached["length"] > max_video_length:
+        raise VideoTranscriptError(f"Video is {cached['length']} seconds long, please provide a video less than {max_video_length} seconds long", youtube_url)
+    if verbose: logger.info(f"Summary cache hit for video {video_id}")
+    report_progress("summarized", cached=True)
+    return cached["summary"]
+
+def cache_summary(youtube_url: str, split_docs: list, summary: str):
+    video_id = get_video_id(youtube_url)
+    get_cache(SUMMARY_CACHE, disk_ttl=CACHE_TTL).set(
+        summary_cache_key(video_id), {"summary": summary, "length": split_docs[0].metadata["length"]}
+    )
+
+def summarize_transcript(youtube_url: str, max_video_length=600, verbose=False) -> str:
+    summary = get_cached_summary(youtube_url, max_video_length, verbose=verbose)
+    if summary is not None:
+        return summary
+    
+    with trace_stage("transcript", youtube_url) as stage:
+        split_docs = load_transcript(youtube_url, max_video_length=max_video_length, verbose=verbose)
+        stage.output(split_docs)
+    
+    with trace_stage("summarize", split_docs) as stage:
+        chain = load_summarize_chain(get_llm(MODEL_NAME), chain_type=SUMMARY_CHAIN_TYPE)
+        response = chain.invoke(split_docs)
+        stage.output(response['output_text'])
     
     if response and verbose: logger.info("Successfully completed generating summary")
+    report_progress("summarized")
+    cache_summary(youtube_url, split_docs, response['output_text'])
     
     return response['output_text']
 
-def generate_flashcards(summary: str, verbose=False) -> list:
-    # Receive the summary from the map reduce chain and generate flashcards
-    parser = JsonOutputParser(pydantic_object=Flashcard)
+async def asummarize_transcript(youtube_url: str, max_video_length=600, verbose=False) -> str:
+    summary = get_cached_summary(youtube_url, max_video_length, verbose=verbose)
+    if summary is not None:
+        return summary
     
-    if verbose: logger.info(f"Beginning to process summary")
+    # Transcript fetching is blocking network I/O, the map reduce calls run natively async
+    with trace_stage("transcript", youtube_url, cpu=False) as stage:
+        split_docs = await asyncio.to_thread(load_transcript, youtube_url, max_video_length, verbose)
+        stage.output(split_docs)
+    
+    with trace_stage("summarize", split_docs, cpu=False) as stage:
+        chain = load_summarize_chain(get_llm(MODEL_NAME), chain_type=SUMMARY_CHAIN_TYPE)
+        response = await chain.ainvoke(split_docs)
+        stage.output(response['output_text'])
+    
+    if response and verbose: logger.info("Successfully completed generating summary")
+    report_progress("summarized")
+    cache_summary(youtube_url, split_docs, response['output_text'])
+    
+    return response['output_text']
+
+def build_flashcards_chain():
+    parser = JsonOutputParser(pydantic_object=Flashcard)
     
     template = read_text_file("prompt/dynamo-prompt.txt")
     examples = read_text_file("prompt/examples.txt")
@@ -79,14 +181,41 @@ def generate_flashcards(summary: str, verbose=False) -> list:
         partial_variables={"format_instructions": parser.get_format_instructions()}
     )
     
-    cards_chain = cards_prompt | model | parser
+    return cards_prompt | get_llm(MODEL_NAME) | parser, examples
+
+def generate_flashcards(summary: str, verbose=False) -> list:
+    # Receive the summary from the map reduce chain and generate flashcards
+    if verbose: logger.info(f"Beginning to process summary")
+    
+    cards_chain, examples = build_flashcards_chain()
     
     try:
-        response = cards_chain.invoke({"summary": summary, "examples": examples})
+        with trace_stage("flashcards", summary) as stage:
+            response = cards_chain.invoke({"summary": summary, "examples": examples})
+            stage.output(response)
     except Exception as e:
         logger.error(f"Failed to generate flashcards: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate flashcards from LLM")
     
+    report_progress("flashcards_generated", flashcards=len(response))
+    
+    return response
+
+async def agenerate_flashcards(summary: str, verbose=False) -> list:
+    if verbose: logger.info(f"Beginning to process summary")
+    
+    cards_chain, examples = build_flashcards_chain()
+    
+    try:
+        with trace_stage("flashcards", summary, cpu=False) as stage:
+            response = await cards_chain.ainvoke({"summary": summary, "examples": examples})
+            stage.output(response)
+    except Exception as e:
+        logger.error(f"Failed to generate flashcards: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate flashcards from LLM")
+    
+    report_progress("flashcards_generated", flashcards=len(response))
+    
     return response
 
 class Flashcard(BaseModel):
@@ -1,13 +1,18 @@
 from services.tool_registry import ToolFile
 from services.logger import setup_logger
+from services.tracing import trace_stage, current_trace, format_trace
 from features.quizzify.tools import RAGpipeline
-from features.quizzify.tools import QuizBuilder
+from features.quizzify.tools import QuizBuilder, QUIZ_GENERATION_MODES
 from api.error_utilities import LoaderError, ToolExecutorError
 
 logger = setup_logger()
 
-def executor(files: list[ToolFile], topic: str, num_questions: int, verbose=False):
+def executor(files: list[ToolFile], topic: str, num_questions: int, verbose=False, generation_mode: str = None):
     
+    # Optional input, not part of the metadata: "per_question" or "batch"
+    if generation_mode is not None and generation_mode not in QUIZ_GENERATION_MODES:
+        raise ToolExecutorError(f"Generation mode must be one of {', '.join(QUIZ_GENERATION_MODES)}")
+
     try:
         if verbose: logger.debug(f"Files: {files}")
 
@@ -21,7 +26,14 @@ def executor(files: list[ToolFile], topic: str, num_questions: int, verbose=Fals
         db = pipeline(files)
         logger.info("processed the files")
         # Create and return the quiz questions
-        output = QuizBuilder(db, topic, verbose=verbose).create_questions(num_questions)
+        with trace_stage("generate") as stage:
+            output = QuizBuilder(db, topic, verbose=verbose, generation_mode=generation_mode).create_questions(num_questions)
+            stage.output(output)
+        
+        trace = current_trace()
+        if verbose and trace is not None:
+            for line in format_trace(trace.as_dict()):
+                logger.info(line)
     
     except LoaderError as e:
         error_message = e
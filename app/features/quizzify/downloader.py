@@ -0,0 +1,366 @@
+import io
+import mmap
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.logger import setup_logger
+from api.error_utilities import LoaderError
+
+try:
+    import magic
+except ImportError:  # libmagic is a system library and may be missing
+    magic = None
+
+logger = setup_logger(__name__)
+
+MAX_CONCURRENCY = int(os.environ.get("DOWNLOAD_MAX_CONCURRENCY", 4))
+MAX_FILE_BYTES = int(os.environ.get("DOWNLOAD_MAX_FILE_BYTES", 25 * 1024 * 1024))
+MAX_REQUEST_BYTES = int(os.environ.get("DOWNLOAD_MAX_REQUEST_BYTES", 50 * 1024 * 1024))
+CONNECT_TIMEOUT = float(os.environ.get("DOWNLOAD_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("DOWNLOAD_READ_TIMEOUT", 30))
+CHUNK_SIZE = 64 * 1024
+# Downloads larger than this move from memory to an unlinked temporary file in SPOOL_DIR
+SPOOL_MAX_MEMORY_BYTES = int(os.environ.get("DOWNLOAD_SPOOL_MAX_MEMORY_BYTES", 1024 * 1024))
+SPOOL_DIR = os.environ.get("DOWNLOAD_SPOOL_DIR") or None
+SNIFF_BYTES = int(os.environ.get("DOWNLOAD_SNIFF_BYTES", 4096))
+
+MIME_FILE_TYPES = {
+    "application/pdf": "pdf",
+    "application/x-pdf": "pdf",
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "pptx",
+    "application/vnd.ms-powerpoint": "ppt",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "text/html": "html",
+    "application/xhtml+xml": "html",
+    "image/jpeg": "jpeg",
+    "image/png": "png",
+}
+# Sniffed types shared by several formats, the file name decides between them
+AMBIGUOUS_MIME_TYPES = {
+    "application/zip": ("docx", "pptx", "xlsx"),
+    "text/plain": ("csv", "html"),
+}
+# Names of the same format, a link named with one and serving the other is not a mismatch
+EQUIVALENT_FILE_TYPES = {"jpg": "jpeg", "ppt": "pptx"}
+
+DRIVE_DOWNLOAD_URL = "https://docs.google.com/uc?export=download&id="
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Process-wide session so connections are pooled and reused across requests."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(16, MAX_CONCURRENCY * 2))
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def file_type_from_content_disposition(content_disposition: Optional[str]) -> str:
+    if not content_disposition:
+        return ''
+    match = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', content_disposition, re.IGNORECASE)
+    if not match or '.' not in match.group(1):
+        return ''
+    return match.group(1).rsplit('.', 1)[-1].lower()
+
+def file_type_from_url(url: str) -> str:
+    path = urlparse(url).path
+    name = path.rsplit('/', 1)[-1]
+    return name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    for parameter in (content_type or "").split(";")[1:]:
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() == "charset" and value.strip(' "'):
+            return value.strip(' "').lower()
+    return None
+
+def sniff_mime_type(content: bytes) -> Optional[str]:
+    """The MIME type of a file identified from its first bytes, None when libmagic is not available."""
+    if magic is None:
+        return None
+    return magic.from_buffer(content, mime=True)
+
+class ByteBudget:
+    """Bytes still allowed for a whole request, shared by the concurrent downloads of that request."""
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        with self._lock:
+            self.used += size
+            if self.used > self.limit:
+                raise LoaderError(f"Uploaded files exceed the limit of {self.limit} bytes per request")
+
+class SpooledFile(io.BufferedIOBase):
+    """
+    File content kept in memory up to `max_memory_bytes` and in a temporary file on disk beyond.
+
+    Reads like a BytesIO. `getbuffer()` returns a view without copying the content: of the memory
+    buffer, or of a read-only memory map of the temporary file once the content has moved to disk.
+    Views should be released before the file is closed.
+
+    Parameters:
+    max_memory_bytes (int): Size above which the content moves to disk.
+    dir (str): Directory of the temporary file, the system default when None.
+    """
+    def __init__(self, max_memory_bytes: int = SPOOL_MAX_MEMORY_BYTES, dir: Optional[str] = SPOOL_DIR):
+        super().__init__()
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes, dir=dir)
+        self._mmap = None
+        # Charset of the Content-Type header, for loaders that decode text
+        self.charset: Optional[str] = None
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file._rolled
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self._file.write(data)
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return self._file.read(-1 if size is None else size)
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def readinto(self, buffer) -> int:
+        return self._file.readinto(buffer)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def getbuffer(self) -> memoryview:
+        if not self.on_disk:
+            return self._file._file.getbuffer()
+        if self._mmap is None:
+            self._file.flush()
+            if os.fstat(self._file.fileno()).st_size == 0:
+                return memoryview(b"")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def getvalue(self) -> bytes:
+        with self.getbuffer() as buffer:
+            return bytes(buffer)
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A view is still in use, the map is released with the last view
+                logger.warning("Closing a spooled file with a view of its content still in use")
+            self._mmap = None
+        self._file.close()
+        super().close()
+
+class DownloadedFile:
+    def __init__(self, url: str, status_code: int, content: Optional[SpooledFile] = None, file_type: str = '', headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.file_type = file_type
+        self.headers = headers or {}
+
+class FileDownloader:
+    """
+    Downloads files concurrently over a shared, connection-pooled session.
+
+    Bodies are streamed in chunks so the per-file and per-request byte limits abort an oversized
+    download as soon as the limit is crossed, or before the body is read when Content-Length
+    already gives it away.
+
+    When `file_types` is given, every download starts with a pre-flight check: a HEAD request, or
+    a ranged GET of the first SNIFF_BYTES identified by their magic bytes when the headers do not
+    name the format. Files that are too large, of another type, or whose content does not match
+    their name are rejected before their body is downloaded, and the detected type is returned
+    as the file type.
+
+    Parameters:
+    max_concurrency (int): Maximum number of files downloaded at the same time.
+    max_file_bytes (int): Maximum size of a single file.
+    max_request_bytes (int): Maximum combined size of all files of one request.
+    timeout (Tuple[float, float]): Connect and read timeouts in seconds.
+    verify (bool): Whether TLS certificates are verified.
+    file_types (Collection[str]): The accepted file types, None to download any file without a pre-flight check.
+    """
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_file_bytes: int = MAX_FILE_BYTES,
+                 max_request_bytes: int = MAX_REQUEST_BYTES, timeout: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 verify: bool = False, session: Optional[requests.Session] = None, file_types: Optional[Collection[str]] = None):
+        self.max_concurrency = max_concurrency
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.timeout = timeout
+        self.verify = verify
+        self.session = session or get_session()
+        self.file_types = set(file_types) if file_types is not None else None
+
+    def check_length(self, url: str, content_length: Optional[str]):
+        if content_length and content_length.isdigit() and int(content_length) > self.max_file_bytes:
+            raise LoaderError(f"File at {url} is {content_length} bytes, the limit is {self.max_file_bytes} bytes")
+
+    def check_file_type(self, url: str, file_type: str, name_type: str) -> str:
+        if file_type not in self.file_types:
+            raise LoaderError(f"File at {url} is {file_type or 'of an unknown type'}, expected one of: {', '.join(sorted(self.file_types))}")
+        if name_type in self.file_types and EQUIVALENT_FILE_TYPES.get(name_type, name_type) != EQUIVALENT_FILE_TYPES.get(file_type, file_type):
+            raise LoaderError(f"File at {url} is named as {name_type} but its content is {file_type}")
+        return file_type
+
+    def sniffed_file_type(self, url: str, content: bytes, name_type: str) -> str:
+        mime_type = sniff_mime_type(content)
+        if mime_type is None:
+            logger.warning(f"libmagic is not available, trusting the name of {url}")
+            return name_type
+        if mime_type in AMBIGUOUS_MIME_TYPES:
+            return name_type if name_type in AMBIGUOUS_MIME_TYPES[mime_type] else mime_type
+        return MIME_FILE_TYPES.get(mime_type, mime_type)
+
+    def preflight(self, url: str) -> Tuple[int, str]:
+        """
+        Checks the size and type of the file at `url` without downloading its body.
+        Returns the status code and the detected file type, raises LoaderError for a rejected file.
+        """
+        name_type = file_type_from_url(url)
+        try:
+            head = self.session.head(url, verify=self.verify, timeout=self.timeout, allow_redirects=True)
+        except requests.RequestException as e:
+            logger.debug(f"HEAD request for {url} failed: {e}")
+            head = None
+
+        # Servers that refuse HEAD, or sign their URLs for GET only, are sniffed instead
+        if head is not None and head.status_code == 200:
+            self.check_length(url, head.headers.get("Content-Length"))
+            name_type = file_type_from_content_disposition(head.headers.get("Content-Disposition")) or name_type
+            mime_type = head.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if mime_type in MIME_FILE_TYPES:
+                return 200, self.check_file_type(url, MIME_FILE_TYPES[mime_type], name_type)
+            if mime_type.split("/")[0] in ("video", "audio"):
+                return 200, self.check_file_type(url, mime_type, name_type)
+
+        headers = {"Range": f"bytes=0-{SNIFF_BYTES - 1}"}
+        with self.session.get(url, headers=headers, verify=self.verify, stream=True, timeout=self.timeout) as response:
+            if response.status_code not in (200, 206):
+                return response.status_code, ''
+            if response.status_code == 206:
+                self.check_length(url, response.headers.get("Content-Range", "").rsplit("/", 1)[-1])
+            else:
+                # The server ignored the range, only the first bytes are read before the connection is dropped
+                self.check_length(url, response.headers.get("Content-Length"))
+            name_type = file_type_from_content_disposition(response.headers.get("Content-Disposition")) or name_type
+            content = b""
+            for chunk in response.iter_content(chunk_size=SNIFF_BYTES):
+                content += chunk
+                if len(content) >= SNIFF_BYTES:
+                    break
+
+        return 200, self.check_file_type(url, self.sniffed_file_type(url, content[:SNIFF_BYTES], name_type), name_type)
+
+    def download(self, url: str, budget: Optional[ByteBudget] = None) -> DownloadedFile:
+        file_type = ''
+        if self.file_types is not None:
+            status_code, file_type = self.preflight(url)
+            if status_code != 200:
+                return DownloadedFile(url, status_code)
+
+        with self.session.get(url, verify=self.verify, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 200:
+                return DownloadedFile(url, response.status_code, headers=response.headers)
+
+            self.check_length(url, response.headers.get("Content-Length"))
+
+            content = SpooledFile()
+            size = 0
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_file_bytes:
+                        raise LoaderError(f"File at {url} exceeds the limit of {self.max_file_bytes} bytes")
+                    if budget is not None:
+                        budget.consume(len(chunk))
+                    content.write(chunk)
+            except BaseException:
+                content.close()
+                raise
+            content.seek(0)
+            content.charset = charset_from_content_type(response.headers.get("Content-Type"))
+
+            file_type = file_type or file_type_from_content_disposition(response.headers.get("Content-Disposition"))
+            return DownloadedFile(url, response.status_code, content, file_type, response.headers)
+
+    def download_drive_file(self, file_id: str, budget: Optional[ByteBudget] = None) -> DownloadedFile:
+        result = self.download(DRIVE_DOWNLOAD_URL + file_id, budget)
+
+        # Check for confirmation prompt
+        if result.status_code == 302:  # Found a redirect, likely confirmation needed
+            logger.info("Google Drive requires confirmation to download the file.")
+            logger.info("Please visit the provided URL in your browser and allow access.")
+            logger.info(result.headers.get('Location'))  # Print the redirection URL
+
+        return result
+
+    def _download_one(self, target: Tuple[str, Optional[str]], budget: ByteBudget) -> DownloadedFile:
+        url, drive_file_id = target
+        if drive_file_id:
+            return self.download_drive_file(drive_file_id, budget)
+        return self.download(url, budget)
+
+    def iter_downloads(self, targets: List[Tuple[str, Optional[str]]]) -> Iterator[Union[DownloadedFile, Exception]]:
+        """
+        Downloads every (url, drive_file_id) target concurrently and yields the results in the same order,
+        each one as soon as it and the ones before it are done. A failed download is yielded as its
+        exception so one bad file does not fail the others.
+        """
+        if not targets:
+            return
+
+        budget = ByteBudget(self.max_request_bytes)
+
+        def run(target):
+            try:
+                return self._download_one(target, budget)
+            except Exception as e:
+                return e
+
+        pool = ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(targets)), thread_name_prefix="downloader")
+        try:
+            for future in [pool.submit(run, target) for target in targets]:
+                yield future.result()
+        finally:
+            # A consumer that stops early does not start the downloads it will never read
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def download_all(self, targets: List[Tuple[str, Optional[str]]]) -> List[Union[DownloadedFile, Exception]]:
+        """Downloads every target concurrently, see `iter_downloads`, and returns the results in the same order."""
+        return list(self.iter_downloads(targets))
@@ -0,0 +1,48 @@
+from io import BytesIO
+from typing import List, Tuple
+
+import pytesseract
+from PIL import Image
+
+from features.quizzify.process_pool import get_process_pool, PROCESS_WORKERS
+
+# Kept free of langchain and app imports: worker processes are spawned and import only this module
+
+def preprocess_image(image: Image.Image, max_dimension: int = 0, grayscale: bool = True) -> Image.Image:
+    # Tesseract gains little from more than ~300 dpi worth of pixels and reads grayscale as well as color
+    if grayscale and image.mode != "L":
+        image = image.convert("L")
+    if max_dimension and max(image.size) > max_dimension:
+        image = image.copy()
+        image.thumbnail((max_dimension, max_dimension))
+    return image
+
+def ocr_image(data: bytes, max_dimension: int = 0, grayscale: bool = True) -> Tuple[str, float]:
+    """
+    Returns the text of an image and the mean confidence (0-100) of the recognized words.
+    Lines and paragraphs are rebuilt from Tesseract's word boxes.
+    """
+    with Image.open(BytesIO(data)) as image:
+        image = preprocess_image(image, max_dimension, grayscale)
+        words = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+    paragraphs, confidences = {}, []
+    for index, word in enumerate(words["text"]):
+        confidence = float(words["conf"][index])
+        if confidence < 0 or not word.strip():
+            continue
+        confidences.append(confidence)
+        paragraph = paragraphs.setdefault((words["block_num"][index], words["par_num"][index]), {})
+        paragraph.setdefault(words["line_num"][index], []).append(word)
+
+    text = "\n\n".join("\n".join(" ".join(line) for line in lines.values()) for lines in paragraphs.values())
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence
+
+def ocr_images(images: List[bytes], max_dimension: int = 0, grayscale: bool = True, parallel: bool = True) -> List[Tuple[str, float]]:
+    """OCRs every image, in the process pool when there is more than one image and more than one worker, in order."""
+    if not parallel or len(images) < 2 or PROCESS_WORKERS < 2:
+        return [ocr_image(data, max_dimension, grayscale) for data in images]
+    pool = get_process_pool()
+    futures = [pool.submit(ocr_image, data, max_dimension, grayscale) for data in images]
+    return [future.result() for future in futures]
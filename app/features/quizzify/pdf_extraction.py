@@ -0,0 +1,55 @@
+import math
+import os
+from multiprocessing import shared_memory
+from typing import Iterator, List, Tuple
+
+import pymupdf
+
+from features.quizzify.process_pool import get_process_pool, PROCESS_WORKERS as PDF_PROCESS_WORKERS
+
+# Kept free of langchain and app imports: worker processes are spawned and import only this module
+
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 64))
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", 2000))
+MIN_PAGES_PER_TASK = 8
+
+def extract_pages(document: pymupdf.Document, start: int, stop: int) -> List[Tuple[int, str]]:
+    return [(page_id, document.load_page(page_id).get_text()) for page_id in range(start, stop)]
+
+def extract_shared_pages(memory_name: str, size: int, start: int, stop: int) -> List[Tuple[int, str]]:
+    # Runs in a worker: every worker opens the same shared buffer instead of receiving a pickled copy
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        with pymupdf.open(stream=bytes(memory.buf[:size]), filetype="pdf") as document:
+            return extract_pages(document, start, stop)
+    finally:
+        memory.close()
+
+def page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    # A few ranges per worker so one slow range (scans, large tables) does not hold back the rest
+    size = max(MIN_PAGES_PER_TASK, math.ceil(page_count / (workers * 2)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def iter_pages_parallel(buffer: memoryview, page_count: int) -> Iterator[Tuple[int, str]]:
+    """Extracts the pages in the process pool and yields (page index, text) in page order."""
+    memory = shared_memory.SharedMemory(create=True, size=max(len(buffer), 1))
+    try:
+        memory.buf[:len(buffer)] = buffer
+        pool = get_process_pool()
+        futures = [
+            pool.submit(extract_shared_pages, memory.name, len(buffer), start, stop)
+            for start, stop in page_ranges(page_count, PDF_PROCESS_WORKERS)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # A consumer that stops early does not wait for ranges it will never read
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+    finally:
+        memory.close()
+        memory.unlink()
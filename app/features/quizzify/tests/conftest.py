@@ -0,0 +1,99 @@
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+class FileServer:
+    """Local HTTP stand-in that serves registered routes with optional latency."""
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, send_body):
+                server.requests.append((self.command, self.path, dict(self.headers)))
+                route = server.routes.get(self.path.split("?")[0])
+                if route is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, headers, delay, send_length, ranges, head = route
+                if self.command == "HEAD" and not head:
+                    self.send_response(405)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                time.sleep(delay)
+                match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+                if ranges and match:
+                    start, stop = int(match.group(1)), min(int(match.group(2)) + 1, len(body))
+                    total, body = len(body), body[start:stop]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{stop - 1}/{total}")
+                else:
+                    self.send_response(200)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if send_length:
+                    self.send_header("Content-Length", str(len(body)))
+                else:
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                if send_body:
+                    try:
+                        self.wfile.write(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                if not send_length:
+                    self.close_connection = True
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def add(self, path, body: bytes, headers=None, delay=0.0, send_length=True, ranges=True, head=True):
+        self.routes[path] = (body, headers or {}, delay, send_length, ranges, head)
+        return self.url(path)
+
+    def url(self, path):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    from services import cache as cache_module
+    monkeypatch.setattr(cache_module, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache_module, "_caches", {})
+    from services import embeddings as embeddings_module
+    monkeypatch.setattr(embeddings_module, "_cached_embeddings", {})
+    monkeypatch.setattr(cache_module, "_stats_providers", {})
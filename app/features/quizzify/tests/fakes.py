@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.documents import Document
+
+# Stand-ins for the LLM and vectorstore of QuizBuilder, shared by its tests and the quiz generation benchmark
+
+# "#N" is replaced by the call number so every generated question is distinct
+VALID = json.dumps({
+    "question": "What is #N + 1?",
+    "choices": {"A": "1", "B": "2"},
+    "answer": "B",
+    "explanation": "Basic arithmetic"
+})
+
+class LatencyLLM(LLM):
+    """Answers after a fixed delay, cycling through `responses`, and records the peak concurrency and prompts."""
+    responses: List[str] = [VALID]
+    latency: float = 0.05
+    calls: int = 0
+    active: int = 0
+    peak: int = 0
+    prompts: List[str] = []
+    lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lock = threading.Lock()
+        self.prompts = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency"
+
+    def _start(self) -> str:
+        with self.lock:
+            response = self.responses[self.calls % len(self.responses)].replace("#N", str(self.calls))
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        return response
+
+    def _end(self):
+        with self.lock:
+            self.active -= 1
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        self.prompts.append(prompt)
+        response = self._start()
+        try:
+            time.sleep(self.latency)
+            return response
+        finally:
+            self._end()
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        self.prompts.append(prompt)
+        response = self._start()
+        try:
+            await asyncio.sleep(self.latency)
+            return response
+        finally:
+            self._end()
+
+class FakeVectorstore:
+    def __init__(self, chunks=12):
+        self.documents = [Document(page_content=f"Chunk {n} about addition") for n in range(chunks)]
+        self.searches = 0
+        self.deleted = False
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20):
+        self.searches += 1
+        return self.documents[:k]
+
+    def delete_collection(self):
+        self.deleted = True
+
+def question(n):
+    return {"question": f"Question {n}?", "choices": {"A": "1", "B": "2"}, "answer": "B", "explanation": "Because"}
@@ -0,0 +1,71 @@
+import types
+from io import BytesIO
+
+import pytest
+from docx import Document as DocxDocument
+from features.quizzify.tools import DocLoader
+
+def handout():
+    document = DocxDocument()
+    document.add_heading("Handout", 0)
+    document.add_paragraph("Linear regression models a straight line.")
+    document.add_paragraph("")
+    document.add_paragraph("   ")
+    document.add_heading("Least squares", 1)
+    document.add_paragraph("The fitted line minimizes the squared residuals.")
+    table = document.add_table(rows=2, cols=3)
+    for row, values in zip(table.rows, [("x", "y", "residual"), ("1", "2.1", "0.1")]):
+        for cell, value in zip(row.cells, values):
+            cell.text = value
+    document.add_heading("Practice", 1)
+    for number in range(30):
+        document.add_paragraph(f"Exercise {number + 1}: fit a line to the data set and report the slope.")
+    content = BytesIO()
+    document.save(content)
+    content.seek(0)
+    return (content, "docx")
+
+def test_sections_start_at_headings_and_include_tables():
+    documents = DocLoader([handout()]).load()
+
+    assert documents[0].page_content == "Handout\nLinear regression models a straight line."
+    assert documents[0].metadata == {"page_number": 1, "source": "docx", "section": "Handout"}
+    assert documents[1].page_content == "Least squares\nThe fitted line minimizes the squared residuals.\nx | y | residual\n1 | 2.1 | 0.1"
+    assert documents[1].metadata["section"] == "Least squares"
+
+def test_long_sections_are_split_near_the_chunk_size():
+    documents = DocLoader([handout()], chunk_chars=500).load()
+    practice = [doc for doc in documents if doc.metadata["section"] == "Practice"]
+
+    assert len(practice) > 1
+    assert all(len(doc.page_content) <= 500 for doc in practice)
+    assert practice[0].page_content.startswith("Practice\nExercise 1:")
+    assert [doc.metadata["page_number"] for doc in documents] == list(range(1, len(documents) + 1))
+
+def test_line_breaks_count_towards_the_chunk_size():
+    document = DocxDocument()
+    # Ten paragraphs of ten characters: 100 characters of text, 109 once joined by line breaks
+    for number in range(10):
+        document.add_paragraph(f"Line {number:04d}.")
+    content = BytesIO()
+    document.save(content)
+    content.seek(0)
+
+    documents = DocLoader([(content, "docx")], chunk_chars=100).load()
+
+    assert len(documents) == 2
+    assert all(len(doc.page_content) <= 100 for doc in documents)
+
+def test_far_fewer_documents_than_paragraphs():
+    content, _ = handout()
+    paragraphs = len(DocxDocument(content).paragraphs)
+    content.seek(0)
+
+    assert len(DocLoader([(content, "docx")]).load()) * 5 < paragraphs
+
+def test_lazy_load_is_a_generator():
+    assert isinstance(DocLoader([handout()]).lazy_load(), types.GeneratorType)
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError):
+        DocLoader([(BytesIO(b""), "pdf")]).load()
@@ -0,0 +1,184 @@
+import time
+import pytest
+from api.error_utilities import LoaderError
+from services.tool_registry import ToolFile
+from features.quizzify.downloader import FileDownloader, SpooledFile, file_type_from_content_disposition, file_type_from_url
+from features.quizzify.tools import URLLoader
+
+PDF_PATH = "features/quizzify/tests/test.pdf"
+
+def read_pdf():
+    with open(PDF_PATH, "rb") as f:
+        return f.read()
+
+def test_downloads_run_concurrently_and_keep_order(file_server):
+    urls = [file_server.add(f"/file-{i}.txt", f"file {i}".encode(), delay=0.3) for i in range(5)]
+    downloader = FileDownloader(max_concurrency=5)
+
+    start = time.perf_counter()
+    results = downloader.download_all([(url, None) for url in urls])
+    elapsed = time.perf_counter() - start
+
+    assert [result.content.read() for result in results] == [f"file {i}".encode() for i in range(5)]
+    assert elapsed < 0.3 * 3
+
+def test_per_file_limit_uses_content_length(file_server):
+    url = file_server.add("/big.pdf", b"x" * 2048)
+    downloader = FileDownloader(max_file_bytes=1024)
+
+    with pytest.raises(LoaderError):
+        downloader.download(url)
+
+def test_per_file_limit_aborts_streamed_body(file_server):
+    url = file_server.add("/streamed.pdf", b"x" * (512 * 1024), send_length=False)
+    downloader = FileDownloader(max_file_bytes=100 * 1024)
+
+    with pytest.raises(LoaderError):
+        downloader.download(url)
+
+def test_per_request_limit_is_shared_across_files(file_server):
+    urls = [file_server.add(f"/part-{i}.txt", b"y" * 1000) for i in range(3)]
+    downloader = FileDownloader(max_file_bytes=1000, max_request_bytes=2500, max_concurrency=1)
+
+    results = downloader.download_all([(url, None) for url in urls])
+
+    assert results[0].content.getbuffer().nbytes == 1000
+    assert results[1].content.getbuffer().nbytes == 1000
+    assert isinstance(results[2], LoaderError)
+
+def test_read_timeout(file_server):
+    url = file_server.add("/slow.pdf", b"late", delay=1.0)
+    downloader = FileDownloader(timeout=(1, 0.2))
+
+    results = downloader.download_all([(url, None)])
+
+    assert isinstance(results[0], Exception)
+
+def test_missing_file_returns_status(file_server):
+    result = FileDownloader().download(file_server.url("/missing.pdf"))
+    assert result.status_code == 404
+    assert result.content is None
+
+def test_file_type_from_content_disposition():
+    assert file_type_from_content_disposition('attachment; filename="Notes.PDF"') == "pdf"
+    assert file_type_from_content_disposition("attachment; filename=slides.pptx; size=10") == "pptx"
+    assert file_type_from_content_disposition(None) == ""
+
+@pytest.mark.parametrize("size, on_disk", [(100, False), (10 * 1024, True)])
+def test_spooled_file_views(size, on_disk):
+    content = bytes(range(256)) * (size // 256)
+    spooled = SpooledFile(max_memory_bytes=1024)
+    for start in range(0, len(content), 300):
+        spooled.write(content[start:start + 300])
+    spooled.seek(0)
+
+    assert spooled.on_disk == on_disk
+    with spooled.getbuffer() as buffer:
+        assert buffer.nbytes == len(content)
+        assert buffer[:10] == content[:10]
+    assert spooled.read(10) == content[:10]
+    assert spooled.getvalue() == content
+    spooled.close()
+    assert spooled.closed
+
+def test_large_downloads_are_spooled_to_disk(file_server):
+    pdf = read_pdf()
+    small = file_server.add("/small.txt", b"z" * 100)
+    large = file_server.add("/large.pdf", pdf * (2 * 1024 * 1024 // len(pdf) + 1))
+
+    small_file, large_file = FileDownloader().download_all([(small, None), (large, None)])
+
+    assert not small_file.content.on_disk
+    assert large_file.content.on_disk
+    assert large_file.content.getvalue()[:len(pdf)] == pdf
+
+def test_file_type_from_url():
+    assert file_type_from_url("https://example.com/files/Notes.PDF?token=a.b") == "pdf"
+    assert file_type_from_url("https://docs.google.com/uc?export=download&id=1") == ""
+
+MP4 = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * (256 * 1024)
+
+def preflight_downloader(**kwargs):
+    return FileDownloader(file_types={"pdf", "csv", "docx", "html"}, **kwargs)
+
+def full_gets(file_server):
+    return [path for method, path, headers in file_server.requests if method == "GET" and "Range" not in headers]
+
+def test_preflight_rejects_content_type_from_head(file_server):
+    url = file_server.add("/lecture.pdf", MP4, headers={"Content-Type": "video/mp4"})
+
+    with pytest.raises(LoaderError):
+        preflight_downloader().download(url)
+    assert [method for method, _, _ in file_server.requests] == ["HEAD"]
+
+def test_preflight_rejects_size_from_head(file_server):
+    url = file_server.add("/big.pdf", b"%PDF-1.4\n" + b"x" * 2048)
+
+    with pytest.raises(LoaderError):
+        preflight_downloader(max_file_bytes=1024).download(url)
+    assert [method for method, _, _ in file_server.requests] == ["HEAD"]
+
+def test_preflight_sniffs_generic_content_types(file_server):
+    url = file_server.add("/lecture.pdf", MP4, headers={"Content-Type": "application/octet-stream"})
+
+    with pytest.raises(LoaderError, match="video/mp4"):
+        preflight_downloader().download(url)
+    assert full_gets(file_server) == []
+
+def test_preflight_uses_content_range_without_head(file_server):
+    url = file_server.add("/big.pdf", b"%PDF-1.4\n" + b"x" * 2048, head=False)
+
+    with pytest.raises(LoaderError):
+        preflight_downloader(max_file_bytes=1024).download(url)
+    assert full_gets(file_server) == []
+
+def test_preflight_reads_only_the_start_when_ranges_are_ignored(file_server):
+    url = file_server.add("/lecture.pdf", MP4, head=False, ranges=False, send_length=False)
+
+    with pytest.raises(LoaderError):
+        preflight_downloader().download(url)
+    assert len(file_server.requests) == 2
+
+def test_preflight_rejects_content_that_does_not_match_the_name(file_server):
+    url = file_server.add("/notes.pdf", b"<html><body>Sign in</body></html>", headers={"Content-Type": "text/html"})
+
+    with pytest.raises(LoaderError, match="named as pdf"):
+        preflight_downloader().download(url)
+
+def test_preflight_detects_the_type_of_unnamed_files(file_server):
+    pdf_url = file_server.add("/download", read_pdf())
+    csv_url = file_server.add("/export", b"a,b,c\n1,2,3\n4,5,6\n", headers={"Content-Type": "text/plain"})
+    missing_url = file_server.url("/missing.pdf")
+
+    pdf, csv, missing = preflight_downloader().download_all([(pdf_url, None), (csv_url, None), (missing_url, None)])
+
+    assert (pdf.file_type, csv.file_type) == ("pdf", "csv")
+    assert pdf.content.getvalue() == read_pdf()
+    assert missing.status_code == 404
+
+def test_url_loader_parses_downloaded_pdfs(file_server):
+    pdf = read_pdf()
+    files = [ToolFile(url=file_server.add(f"/doc-{i}.pdf", pdf, delay=0.1)) for i in range(3)]
+    files.append(ToolFile(url=file_server.url("/missing.pdf")))
+
+    documents = URLLoader().load(files)
+
+    assert len(documents) > 0
+    assert all(document.metadata["source"] == "pdf" for document in documents)
+
+def test_url_loader_rejects_unsupported_files_before_downloading(file_server):
+    files = [ToolFile(url=file_server.add("/download", read_pdf())), ToolFile(url=file_server.add("/lecture.pdf", MP4))]
+
+    documents = URLLoader().load(files)
+
+    assert len(documents) > 0
+    assert all(document.metadata["source"] == "pdf" for document in documents)
+    assert full_gets(file_server) == ["/download"]
+
+def test_url_loader_decodes_html_with_the_charset_of_the_response(file_server):
+    page = "<html><body><p>Crème brûlée, façade</p></body></html>".encode("cp1252")
+    url = file_server.add("/page.html", page, headers={"Content-Type": "text/html; charset=windows-1252"})
+
+    documents = URLLoader(use_parse_cache=False).load([ToolFile(url=url)])
+
+    assert documents[0].page_content == "Crème brûlée, façade"
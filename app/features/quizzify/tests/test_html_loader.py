@@ -0,0 +1,86 @@
+import types
+from io import BytesIO
+
+import pytest
+from features.quizzify.downloader import charset_from_content_type
+from features.quizzify.tools import HTML_PARSER, HTMLLoader
+
+PAGE = b"""<!doctype html>
+<html><head><title>Linear  regression</title><style>body { color: red }</style>
+<script>var tracking = "do not index";</script></head>
+<body>
+<nav><a href="/">Home</a> | <a href="/about">About</a></nav>
+<header>Site banner</header>
+<main>
+<h1>Least squares</h1>
+<p>The fitted line <b>minimizes</b> the squared residuals.</p>
+<ul><li>Slope</li><li>Intercept</li></ul>
+<table><tr><td>x</td><td>y</td></tr></table>
+<script>alert("inline")</script>
+</main>
+<footer>Copyright</footer>
+</body></html>"""
+
+def html(content=PAGE):
+    return (BytesIO(content), "html")
+
+PARSERS = ["html.parser", pytest.param("lxml", marks=pytest.mark.skipif(HTML_PARSER != "lxml", reason="lxml is not installed"))]
+
+class DownloadedHTML(BytesIO):
+    def __init__(self, content, charset=None):
+        super().__init__(content)
+        self.charset = charset
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_boilerplate_is_removed_and_blocks_kept(parser):
+    documents = HTMLLoader([html()], parser=parser).load()
+
+    assert len(documents) == 1
+    assert documents[0].page_content == "Least squares\nThe fitted line minimizes the squared residuals.\nSlope\nIntercept\nxy"
+    assert documents[0].metadata == {"source": "html", "page_number": 1, "title": "Linear regression"}
+
+def test_long_pages_are_split_at_block_boundaries():
+    paragraphs = b"".join(b"<p>Paragraph %d explains one more property of the regression line.</p>" % n for n in range(60))
+    documents = HTMLLoader([html(b"<html><body>" + paragraphs + b"</body></html>")], chunk_chars=300).load()
+
+    assert len(documents) > 1
+    assert all(len(doc.page_content) <= 300 for doc in documents)
+    assert all(line.startswith("Paragraph ") and line.endswith("line.") for doc in documents for line in doc.page_content.splitlines())
+    assert [doc.metadata["page_number"] for doc in documents] == list(range(1, len(documents) + 1))
+
+def test_input_is_capped():
+    paragraphs = b"".join(b"<p>Block %d</p>" % n for n in range(1000))
+    documents = HTMLLoader([html(b"<html><body>" + paragraphs)], max_bytes=200).load()
+    text = "\n".join(doc.page_content for doc in documents)
+
+    assert "Block 0" in text
+    assert "Block 999" not in text
+
+def test_lazy_load_is_a_generator():
+    assert isinstance(HTMLLoader([html()]).lazy_load(), types.GeneratorType)
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError):
+        HTMLLoader([(BytesIO(b""), "pdf")]).load()
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_utf8_without_a_declared_charset(parser):
+    content = "<html><body><p>Café – naïve résumé 日本</p></body></html>".encode("utf-8")
+    documents = HTMLLoader([html(content)], parser=parser).load()
+    assert documents[0].page_content == "Café – naïve résumé 日本"
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_charset_of_the_content_type_header_is_used(parser):
+    content = "<html><body><p>Crème brûlée, façade</p></body></html>".encode("cp1252")
+    documents = HTMLLoader([(DownloadedHTML(content, charset="windows-1252"), "html")], parser=parser).load()
+    assert documents[0].page_content == "Crème brûlée, façade"
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("content", [b"", b"  \n\t ", b"<!-- nothing here -->"])
+def test_empty_pages_give_no_documents(parser, content):
+    assert HTMLLoader([html(content)], parser=parser).load() == []
+
+def test_charset_from_content_type():
+    assert charset_from_content_type('text/html; charset="ISO-8859-1"') == "iso-8859-1"
+    assert charset_from_content_type("text/html") is None
+    assert charset_from_content_type(None) is None
@@ -0,0 +1,126 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import patch
+
+from langchain_core.language_models.fake import FakeListLLM
+from PIL import Image
+from services.models import StaticModelProvider, override_model_provider
+from features.quizzify import ocr
+from features.quizzify.tools import ImageLoader, URLLoader
+
+def png(width=400, height=300, color="white"):
+    content = BytesIO()
+    Image.new("RGB", (width, height), color).save(content, format="PNG")
+    content.seek(0)
+    return content
+
+def tesseract_output(words, confidence):
+    # Two lines in one paragraph, then a second paragraph
+    count = len(words)
+    return {
+        "text": words,
+        "conf": [confidence] * count,
+        "block_num": [1] * (count - 1) + [2],
+        "par_num": [1] * count,
+        "line_num": [1, 1] + [2] * (count - 3) + [1],
+    }
+
+class CountingLLM(FakeListLLM):
+    prompts: list = []
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(prompt)
+        return super()._call(prompt, stop, run_manager, **kwargs)
+
+class KeyedLLM(CountingLLM):
+    """Answers with the first response whose key is in the prompt, so concurrent calls can come in any order."""
+    answers: list = []
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(prompt)
+        return next(answer for key, answer in self.answers if key in prompt)
+
+def fake_tesseract(confidence=50, first_word=lambda image: "Hello"):
+    seen = []
+
+    def image_to_data(image, output_type=None):
+        seen.append((image.size, image.mode))
+        return tesseract_output([first_word(image), "wrld", "second", "line", "Next"], confidence)
+
+    return patch.object(ocr.pytesseract, "image_to_data", side_effect=image_to_data), seen
+
+def test_ocr_rebuilds_lines_and_preprocesses():
+    tesseract, seen = fake_tesseract()
+    with tesseract:
+        text, confidence = ocr.ocr_image(png(4000, 3000).getvalue(), max_dimension=2000, grayscale=True)
+
+    assert text == "Hello wrld\nsecond line\n\nNext"
+    assert confidence == 50
+    assert seen == [((2000, 1500), "L")]
+
+def test_cleanup_is_one_batched_call():
+    llm = CountingLLM(responses=[json.dumps(["one", "two", "three"])], prompts=[])
+    tesseract, _ = fake_tesseract(confidence=50)
+
+    with tesseract, override_model_provider(StaticModelProvider(llm=llm)):
+        documents = ImageLoader([(png(), "png"), (png(), "jpg"), (png(), "jpeg")], parallel=False).load()
+
+    assert [doc.page_content for doc in documents] == ["one", "two", "three"]
+    assert [doc.metadata for doc in documents] == [{"source": "png", "page_number": 1}, {"source": "jpg", "page_number": 1}, {"source": "jpeg", "page_number": 1}]
+    assert len(llm.prompts) == 1
+    assert "Hello wrld" in llm.prompts[0]
+
+def test_high_confidence_skips_cleanup():
+    llm = CountingLLM(responses=["unused"], prompts=[])
+    tesseract, _ = fake_tesseract(confidence=96)
+
+    with tesseract, override_model_provider(StaticModelProvider(llm=llm)):
+        documents = ImageLoader([(png(), "png")], parallel=False).load()
+
+    assert documents[0].page_content == "Hello wrld\nsecond line\n\nNext"
+    assert llm.prompts == []
+
+def test_falls_back_to_one_cleanup_per_image():
+    # The batched prompt holds the texts as a JSON list, the single prompts hold the bare text
+    llm = KeyedLLM(responses=[""], prompts=[], answers=[
+        ('["', json.dumps(["only one"])), ("in Hello wrld", "first"), ("in Goodbye wrld", "second"),
+    ])
+    tesseract, _ = fake_tesseract(confidence=50, first_word=lambda image: "Hello" if image.size[0] == 400 else "Goodbye")
+
+    with tesseract, override_model_provider(StaticModelProvider(llm=llm)):
+        documents = ImageLoader([(png(), "png"), (png(width=500), "png")], parallel=False).load()
+
+    assert [doc.page_content for doc in documents] == ["first", "second"]
+    assert len(llm.prompts) == 3
+    single_prompts = sorted(llm.prompts[1:])
+    assert single_prompts[0].startswith("I want you to check if there is any missing words in Goodbye wrld\nsecond line\n\nNext.")
+    assert single_prompts[1].startswith("I want you to check if there is any missing words in Hello wrld\nsecond line\n\nNext.")
+    assert not any("{'text'" in prompt for prompt in llm.prompts)
+
+def test_multiple_images_go_through_the_process_pool():
+    tesseract, seen = fake_tesseract(confidence=99)
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    with tesseract, patch.object(ocr, "PROCESS_WORKERS", 2), patch.object(ocr, "get_process_pool", return_value=pool) as get_pool:
+        results = ocr.ocr_images([png().getvalue(), png().getvalue(), png().getvalue()])
+
+    get_pool.assert_called_once()
+    assert len(results) == 3 and len(seen) == 3
+    pool.shutdown()
+
+def test_url_loader_batches_images_of_a_request(file_server):
+    for name, color in (("a.png", "white"), ("b.png", "gray")):
+        file_server.add(f"/{name}", png(color=color).getvalue())
+    llm = CountingLLM(responses=[json.dumps(["a", "b"])], prompts=[])
+    tesseract, _ = fake_tesseract(confidence=50)
+
+    loader = URLLoader()
+    files = [loader.downloader.download(file_server.url(f"/{name}")) for name in ("a.png", "b.png")]
+    with tesseract, override_model_provider(StaticModelProvider(llm=llm)), patch.object(ocr, "PROCESS_WORKERS", 1):
+        parsed = loader.parse_files([(file.content, "png") for file in files])
+        again = loader.parse_files([(file.content, "png") for file in files])
+
+    assert [[doc.page_content for doc in documents] for documents in parsed] == [["a"], ["b"]]
+    assert again == parsed
+    assert len(llm.prompts) == 1
@@ -0,0 +1,85 @@
+from io import BytesIO
+from unittest.mock import patch
+from services.cache import TieredCache, LRUCache, SQLiteCache
+import pytest
+from features.quizzify import tools
+from features.quizzify.tools import URLLoader, BytesFilePDFLoader, parse_cache_key
+
+PDF_PATH = "features/quizzify/tests/test.pdf"
+
+def read_pdf():
+    with open(PDF_PATH, "rb") as f:
+        return f.read()
+
+def make_loader(tmp_path):
+    cache = TieredCache("parsed_documents", LRUCache(), SQLiteCache(str(tmp_path / "parsed.sqlite3")))
+    return URLLoader(parse_cache=cache), cache
+
+def test_repeat_upload_skips_parsing(tmp_path):
+    url_loader, cache = make_loader(tmp_path)
+    pdf = read_pdf()
+
+    with patch.object(BytesFilePDFLoader, "load", autospec=True, side_effect=BytesFilePDFLoader.load) as spy:
+        first = url_loader.parse_file((BytesIO(pdf), "pdf"))
+        second = url_loader.parse_file((BytesIO(pdf), "pdf"))
+
+    assert spy.call_count == 1
+    assert [doc.page_content for doc in second] == [doc.page_content for doc in first]
+    assert [doc.metadata for doc in second] == [doc.metadata for doc in first]
+    assert cache.stats.hits == 1
+
+def test_disk_tier_serves_after_memory_is_cleared(tmp_path):
+    url_loader, cache = make_loader(tmp_path)
+    pdf = read_pdf()
+    url_loader.parse_file((BytesIO(pdf), "pdf"))
+    cache.memory.clear()
+
+    with patch.object(BytesFilePDFLoader, "load") as load:
+        documents = url_loader.parse_file((BytesIO(pdf), "pdf"))
+
+    load.assert_not_called()
+    assert len(documents) > 0
+
+def test_key_depends_on_content_type_and_loader_version():
+    pdf = read_pdf()
+    key = parse_cache_key(BytesIO(pdf), "pdf", BytesFilePDFLoader)
+
+    assert key == parse_cache_key(BytesIO(pdf), "pdf", BytesFilePDFLoader)
+    assert key != parse_cache_key(BytesIO(pdf + b" "), "pdf", BytesFilePDFLoader)
+    with patch.object(BytesFilePDFLoader, "cache_version", BytesFilePDFLoader.cache_version + 1):
+        assert key != parse_cache_key(BytesIO(pdf), "pdf", BytesFilePDFLoader)
+
+@pytest.mark.parametrize("loader, setting, value", [
+    (tools.BytesFileCSVLoader, "TABLE_ROWS_PER_DOCUMENT", 10),
+    (tools.BytesFileXLSXLoader, "TABLE_MAX_ROWS", 10),
+    (tools.DocLoader, "DOCX_CHUNK_CHARS", 10),
+    (tools.PowerPointLoader, "PPTX_GROUP_CHARS", 10),
+    (tools.HTMLLoader, "HTML_CHUNK_CHARS", 10),
+    (tools.HTMLLoader, "HTML_MAX_BYTES", 10),
+    (tools.ImageLoader, "IMAGE_OCR_MAX_DIMENSION", 10),
+    (tools.BytesFilePDFLoader, "PDF_MAX_PAGES", 10),
+])
+def test_key_depends_on_the_loader_settings(monkeypatch, loader, setting, value):
+    key = parse_cache_key(BytesIO(b"content"), "any", loader)
+    monkeypatch.setattr(tools, setting, value)
+    assert parse_cache_key(BytesIO(b"content"), "any", loader) != key
+
+def test_changed_settings_reparse_instead_of_serving_the_old_shape(tmp_path, monkeypatch):
+    url_loader, cache = make_loader(tmp_path)
+    html = b"<html><body>" + b"".join(b"<p>Paragraph %d of the page.</p>" % n for n in range(40)) + b"</body></html>"
+    monkeypatch.setattr(tools, "HTML_CHUNK_CHARS", 1000)
+    first = url_loader.parse_file((BytesIO(html), "html"))
+
+    # A restart with a new HTML_CHUNK_CHARS changes both the default and the key
+    monkeypatch.setattr(tools, "HTML_CHUNK_CHARS", 100)
+    monkeypatch.setattr(tools.HTMLLoader.__init__, "__defaults__", ("html", False, 100, tools.HTML_MAX_BYTES, tools.HTML_PARSER))
+    second = url_loader.parse_file((BytesIO(html), "html"))
+
+    assert len(second) > len(first)
+    assert cache.stats.hits == 0
+
+def test_parse_cache_can_be_disabled():
+    url_loader = URLLoader(use_parse_cache=False)
+    documents = url_loader.parse_file((BytesIO(read_pdf()), "pdf"))
+    assert url_loader.parse_cache is None
+    assert len(documents) > 0
@@ -0,0 +1,81 @@
+import types
+from io import BytesIO
+
+import pymupdf
+import pytest
+from features.quizzify.tools import BytesFilePDFLoader
+from features.quizzify import pdf_extraction, process_pool
+from features.quizzify.downloader import SpooledFile
+
+FIXTURES = ["api/tests/linear_regression.pdf", "api/tests/test.pdf"]
+
+def pdf_file(path):
+    with open(path, "rb") as file:
+        return (BytesIO(file.read()), "pdf")
+
+def synthetic_pdf(pages):
+    document = pymupdf.open()
+    for number in range(pages):
+        document.new_page().insert_text((72, 72), f"Page {number + 1} text")
+    content = BytesIO(document.tobytes())
+    document.close()
+    return (content, "pdf")
+
+@pytest.fixture(scope="module", autouse=True)
+def shared_process_pool():
+    yield
+    process_pool.shutdown_process_pool()
+
+@pytest.mark.parametrize("path", FIXTURES)
+def test_parallel_matches_serial(path):
+    serial = BytesFilePDFLoader([pdf_file(path)], parallel=False).load()
+    parallel = BytesFilePDFLoader([pdf_file(path)], parallel=True).load()
+
+    assert len(serial) == pymupdf.open(path).page_count
+    assert [(doc.page_content, doc.metadata) for doc in parallel] == [(doc.page_content, doc.metadata) for doc in serial]
+    assert [doc.metadata["page_number"] for doc in serial] == list(range(1, len(serial) + 1))
+
+def test_parallel_keeps_page_order_across_ranges():
+    documents = BytesFilePDFLoader([synthetic_pdf(40)], parallel=True).load()
+
+    assert [doc.metadata["page_number"] for doc in documents] == list(range(1, 41))
+    assert all(doc.page_content.strip() == f"Page {n} text" for n, doc in enumerate(documents, start=1))
+
+def test_max_pages_truncates():
+    documents = BytesFilePDFLoader([synthetic_pdf(10)], max_pages=4).load()
+    assert [doc.metadata["page_number"] for doc in documents] == [1, 2, 3, 4]
+
+def test_lazy_load_is_a_generator():
+    pages = BytesFilePDFLoader([pdf_file(FIXTURES[0]), pdf_file(FIXTURES[1])], parallel=False).lazy_load()
+
+    assert isinstance(pages, types.GeneratorType)
+    first = next(pages)
+    assert first.metadata == {"source": "pdf", "page_number": 1}
+    assert len(list(pages)) == 3
+
+def test_stopping_early_releases_shared_memory():
+    pages = BytesFilePDFLoader([synthetic_pdf(40)], parallel=True).lazy_load()
+    assert next(pages).metadata["page_number"] == 1
+    pages.close()
+
+def test_page_ranges_cover_every_page_once():
+    ranges = pdf_extraction.page_ranges(301, workers=4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 301
+    assert all(stop == next_start for (_, stop), (next_start, _) in zip(ranges, ranges[1:]))
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError):
+        BytesFilePDFLoader([(BytesIO(b""), "txt")]).load()
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_loads_from_a_spooled_file_on_disk(parallel):
+    content, _ = synthetic_pdf(20)
+    spooled = SpooledFile(max_memory_bytes=1024)
+    spooled.write(content.getvalue())
+    spooled.seek(0)
+    assert spooled.on_disk
+
+    documents = BytesFilePDFLoader([(spooled, "pdf")], parallel=parallel).load()
+    spooled.close()
+
+    assert [doc.page_content for doc in documents] == [doc.page_content for doc in BytesFilePDFLoader([(content, "pdf")]).load()]
@@ -0,0 +1,57 @@
+import types
+from io import BytesIO
+
+import pytest
+from pptx import Presentation
+from features.quizzify.tools import PowerPointLoader
+
+def deck(slides):
+    presentation = Presentation()
+    for title, lines in slides:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = title
+        body = slide.placeholders[1].text_frame
+        body.text = lines[0] if lines else ""
+        for line in lines[1:]:
+            body.add_paragraph().text = line
+    content = BytesIO()
+    presentation.save(content)
+    content.seek(0)
+    return (content, "pptx")
+
+SLIDES = [("Intro", ["What is regression", "Why it matters"]), ("Least squares", ["Minimize the residuals"]), ("", []), ("Summary", ["Fit, then check"])]
+
+def test_one_document_per_slide_without_earlier_slides():
+    documents = PowerPointLoader([deck(SLIDES)]).load()
+
+    assert [doc.page_content for doc in documents] == [
+        "Intro\nWhat is regression\nWhy it matters",
+        "Least squares\nMinimize the residuals",
+        "Summary\nFit, then check",
+    ]
+    assert [doc.metadata for doc in documents] == [
+        {"source": "pptx", "page_number": 1},
+        {"source": "pptx", "page_number": 2},
+        {"source": "pptx", "page_number": 4},
+    ]
+
+def test_consecutive_slides_are_grouped_within_the_budget():
+    documents = PowerPointLoader([deck(SLIDES)], group_chars=80).load()
+
+    assert len(documents) == 2
+    assert documents[0].page_content == "Intro\nWhat is regression\nWhy it matters\n\nLeast squares\nMinimize the residuals"
+    assert documents[0].metadata == {"source": "pptx", "page_number": 1, "last_page_number": 2}
+    assert documents[1].metadata == {"source": "pptx", "page_number": 4}
+
+def test_slide_longer_than_the_budget_is_kept_whole():
+    documents = PowerPointLoader([deck(SLIDES)], group_chars=10).load()
+    assert len(documents) == 3
+
+def test_lazy_load_is_a_generator():
+    slides = PowerPointLoader([deck(SLIDES)]).lazy_load()
+    assert isinstance(slides, types.GeneratorType)
+    assert next(slides).metadata["page_number"] == 1
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError):
+        PowerPointLoader([(BytesIO(b""), "pdf")]).load()
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import pytest
+
+from features.quizzify.tests.fakes import VALID, FakeVectorstore, LatencyLLM, question
+from features.quizzify.tools import QuizBuilder
+
+def build(llm, max_concurrency):
+    return QuizBuilder(FakeVectorstore(), "math", model=llm, max_concurrency=max_concurrency)
+
+def test_sequential_mode_matches_requested_count():
+    llm = LatencyLLM(latency=0)
+    builder = build(llm, max_concurrency=1)
+    questions = builder.create_questions(3)
+
+    assert len(questions) == 3
+    assert llm.calls == 3
+    assert llm.peak == 1
+    assert questions[0]["choices"] == [{"key": "A", "value": "1"}, {"key": "B", "value": "2"}]
+    assert builder.vectorstore.deleted
+    assert builder.vectorstore.searches == 1
+
+def test_waves_run_concurrently_and_retry_invalid_attempts():
+    llm = LatencyLLM(responses=[VALID, "not json", json.dumps({"question": "missing fields"})])
+    questions = build(llm, max_concurrency=4).create_questions(4)
+
+    assert len(questions) == 4
+    assert all(question["answer"] == "B" for question in questions)
+    assert llm.peak > 1
+    # One wave of 4 gives 2 valid, the next waves only ask for what is still missing
+    assert llm.calls == 10
+
+def test_attempts_are_bounded():
+    llm = LatencyLLM(responses=["not json"], latency=0)
+    questions = build(llm, max_concurrency=4).create_questions(2)
+
+    assert questions == []
+    assert llm.calls == 20
+
+def test_async_generation_keeps_concurrency_and_count():
+    llm = LatencyLLM(responses=[VALID, "not json"])
+    questions = asyncio.run(build(llm, max_concurrency=3).acreate_questions(5))
+
+    assert len(questions) == 5
+    assert 1 < llm.peak <= 3
+
+def test_async_generation_cancels_in_flight_attempts():
+    llm = LatencyLLM()
+
+    async def run():
+        llm.latency = 5
+        task = asyncio.ensure_future(build(llm, max_concurrency=4).acreate_questions(4))
+        while llm.active < 4:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return llm.active
+
+    assert asyncio.run(run()) == 0
+    assert llm.peak == 4
+
+def build_batch(llm, **kwargs):
+    return QuizBuilder(FakeVectorstore(), "math", model=llm, generation_mode="batch", **kwargs)
+
+def test_batch_mode_uses_one_call():
+    llm = LatencyLLM(responses=[json.dumps([question(n) for n in range(5)])], latency=0)
+    questions = build_batch(llm).create_questions(5)
+
+    assert [q["question"] for q in questions] == [f"Question {n}?" for n in range(5)]
+    assert questions[0]["choices"] == [{"key": "A", "value": "1"}, {"key": "B", "value": "2"}]
+    assert llm.calls == 1
+
+def test_batch_mode_rerequests_only_invalid_items():
+    first = [question(0), {"question": "broken"}, question(2)]
+    second = [question(3), question(4), question(5)]
+    llm = LatencyLLM(responses=[json.dumps(first), json.dumps(second)], latency=0)
+    questions = build_batch(llm).create_questions(4)
+
+    assert [q["question"] for q in questions] == ["Question 0?", "Question 2?", "Question 3?", "Question 4?"]
+    assert llm.calls == 2
+
+def test_batch_mode_accepts_wrapped_array():
+    llm = LatencyLLM(responses=[json.dumps({"questions": [question(0), question(1)]})], latency=0)
+    assert len(build_batch(llm).create_questions(2)) == 2
+    assert llm.calls == 1
+
+def test_batch_mode_falls_back_to_per_question_when_parsing_fails():
+    llm = LatencyLLM(responses=["not json", VALID, VALID], latency=0)
+    questions = build_batch(llm, max_concurrency=1).create_questions(2)
+
+    assert len(questions) == 2
+    assert llm.calls == 3
+
+def test_async_batch_mode():
+    llm = LatencyLLM(responses=[json.dumps([question(0)]), json.dumps([question(1), question(2)])], latency=0)
+    questions = asyncio.run(build_batch(llm).acreate_questions(3))
+
+    assert [q["question"] for q in questions] == ["Question 0?", "Question 1?", "Question 2?"]
+    assert llm.calls == 2
+
+def test_unknown_generation_mode_is_rejected():
+    with pytest.raises(ValueError):
+        QuizBuilder(FakeVectorstore(), "math", model=LatencyLLM(), generation_mode="all_at_once")
+
+def test_executor_rejects_unknown_generation_mode():
+    from features.quizzify.core import executor
+    from api.error_utilities import ToolExecutorError
+
+    with pytest.raises(ToolExecutorError):
+        executor([], "math", 3, generation_mode="all_at_once")
+
+def test_each_slot_gets_its_own_context():
+    llm = LatencyLLM(latency=0)
+    builder = build(llm, max_concurrency=1)
+    builder.create_questions(3)
+
+    contexts = [prompt.split("Context:", 1)[1] for prompt in llm.prompts]
+    assert "Chunk 0 " in contexts[0] and "Chunk 4 " in contexts[1] and "Chunk 8 " in contexts[2]
+    assert "Chunk 4 " not in contexts[0]
+    assert builder.vectorstore.searches == 1
+
+def test_near_duplicate_questions_are_rejected():
+    duplicate = json.dumps({**json.loads(VALID), "question": "What is the SUM of 1 and 1?"})
+    rephrased = json.dumps({**json.loads(VALID), "question": "what is the sum of 1 and 1"})
+    llm = LatencyLLM(responses=[duplicate, rephrased, VALID], latency=0)
+    questions = build(llm, max_concurrency=1).create_questions(2)
+
+    assert [q["question"] for q in questions] == ["What is the SUM of 1 and 1?", "What is 2 + 1?"]
+    assert llm.calls == 3
+
+def test_falls_back_to_similarity_search():
+    class PlainVectorstore(FakeVectorstore):
+        def max_marginal_relevance_search(self, query, k=4, fetch_k=20):
+            raise NotImplementedError
+
+        def similarity_search(self, query, k=4):
+            self.searches += 1
+            return self.documents[:k]
+
+    vectorstore = PlainVectorstore()
+    builder = QuizBuilder(vectorstore, "math", model=LatencyLLM(latency=0), max_concurrency=1)
+    assert len(builder.create_questions(2)) == 2
+    assert vectorstore.searches == 1
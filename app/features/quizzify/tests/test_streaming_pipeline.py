@@ -0,0 +1,172 @@
+import threading
+import time
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from api.error_utilities import LoaderError
+from services.tool_registry import ToolFile
+from services import metrics
+from services.tracing import request_trace
+from services.vectorstore import NumpyVectorStore
+from features.quizzify.tools import RAGpipeline, URLLoader
+
+PDF_PATH = "features/quizzify/tests/test.pdf"
+
+def read_pdf():
+    with open(PDF_PATH, "rb") as f:
+        return f.read()
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self):
+        self.batches = []
+        self.embedded = threading.Event()
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        self.embedded.set()
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+class StreamingLoader:
+    """Yields documents and waits, as a slow download would, until the first batch has been embedded."""
+    def __init__(self, embeddings, documents=8, wait_after=4, error=None):
+        self.embeddings = embeddings
+        self.documents = documents
+        self.wait_after = wait_after
+        self.error = error
+        self.overlapped = None
+
+    def lazy_load(self, files):
+        for number in range(self.documents):
+            if number == self.wait_after:
+                self.overlapped = self.embeddings.embedded.wait(timeout=2)
+            yield Document(page_content=f"Document {number} " + "word " * 60, metadata={"page_number": number + 1})
+        if self.error:
+            raise self.error
+
+    def load(self, files):
+        return list(self.lazy_load(files))
+
+def pipeline(loader, embeddings, streaming=True):
+    return RAGpipeline(loader=loader, splitter=RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0),
+                       vectorstore_class=NumpyVectorStore, embedding_model=embeddings, streaming=streaming, batch_size=4, queue_size=2)
+
+def test_embedding_starts_before_loading_ends():
+    embeddings = RecordingEmbeddings()
+    loader = StreamingLoader(embeddings)
+
+    with request_trace("0") as trace:
+        store = pipeline(loader, embeddings)([ToolFile(url="https://example.com/a.pdf")])
+
+    assert loader.overlapped
+    assert all(size <= 4 for size in embeddings.batches)
+    assert len(store) == sum(embeddings.batches)
+    # Splitting runs on its own thread and still records into the request's trace
+    assert trace.stages["split"].items_in == 8
+    assert trace.stages["embed"].items_in == len(store)
+    assert trace.stages["embed"].calls == len(embeddings.batches)
+    assert trace.stages["ingest"].calls == 1
+
+def test_streaming_stores_the_same_chunks():
+    embeddings = RecordingEmbeddings()
+    loader = StreamingLoader(embeddings)
+    streamed = pipeline(loader, embeddings)([])
+    pipe = pipeline(loader, RecordingEmbeddings(), streaming=False)
+    pipe.compile()
+    batched = pipe([ToolFile(url="https://example.com/a.pdf")])
+
+    assert [doc.page_content for doc in streamed.documents] == [doc.page_content for doc in batched.documents]
+    assert [doc.metadata for doc in streamed.documents] == [doc.metadata for doc in batched.documents]
+
+def test_loader_errors_reach_the_caller():
+    embeddings = RecordingEmbeddings()
+    loader = StreamingLoader(embeddings, error=LoaderError("Unable to load any files from URLs"))
+
+    with pytest.raises(LoaderError):
+        pipeline(loader, embeddings)([])
+
+def test_url_loader_yields_documents_while_later_files_download(file_server):
+    first = file_server.add("/first.pdf", read_pdf())
+    second = file_server.add("/second.pdf", read_pdf(), delay=1.0)
+
+    start = time.perf_counter()
+    documents = URLLoader().lazy_load([ToolFile(url=first), ToolFile(url=second)])
+    next(documents)
+    first_document = time.perf_counter() - start
+    rest = list(documents)
+
+    assert first_document < 0.8
+    assert rest and all(doc.metadata["source"] == "pdf" for doc in rest)
+
+def test_url_loader_lazy_load_matches_load(file_server):
+    files = [ToolFile(url=file_server.add(f"/doc-{i}.pdf", read_pdf())) for i in range(2)]
+    files.append(ToolFile(url=file_server.url("/missing.pdf")))
+
+    lazy = list(URLLoader(use_parse_cache=False).lazy_load(files))
+    loaded = URLLoader(use_parse_cache=False).load(files)
+
+    assert [(doc.page_content, doc.metadata) for doc in lazy] == [(doc.page_content, doc.metadata) for doc in loaded]
+
+def test_loaded_bytes_documents_and_chunks_are_counted(file_server):
+    content = read_pdf()
+    url = file_server.add("/counted.pdf", content)
+    documents = len(URLLoader(use_parse_cache=False).load([ToolFile(url=url)]))
+    metrics.registry.clear()
+
+    for streaming in (False, True):
+        pipe = pipeline(URLLoader(use_parse_cache=False), RecordingEmbeddings(), streaming=streaming)
+        pipe.compile()
+        store = pipe([ToolFile(url=url)])
+
+    assert metrics.LOADER_BYTES.labels("pdf").value == 2 * len(content)
+    assert metrics.LOADER_DOCUMENTS.labels("pdf").value == 2 * documents
+    assert metrics.SPLIT_CHUNKS.labels().value == 2 * len(store)
+
+def test_url_loader_lazy_load_fails_without_files(file_server):
+    with pytest.raises(LoaderError):
+        list(URLLoader().lazy_load([ToolFile(url=file_server.url("/missing.pdf"))]))
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_concurrent_pipelines_keep_their_chunks_apart(streaming):
+    from langchain_chroma import Chroma
+
+    class TopicLoader:
+        def __init__(self, topic):
+            self.topic = topic
+
+        def lazy_load(self, files):
+            for number in range(6):
+                yield Document(page_content=f"{self.topic} note {number}")
+
+        def load(self, files):
+            return list(self.lazy_load(files))
+
+    stores = {}
+    start = threading.Barrier(2)
+
+    def run(topic):
+        pipe = RAGpipeline(loader=TopicLoader(topic), vectorstore_class=Chroma, embedding_model=RecordingEmbeddings(),
+                           streaming=streaming, batch_size=2, queue_size=2)
+        pipe.compile()
+        start.wait()
+        stores[topic] = pipe([])
+
+    threads = [threading.Thread(target=run, args=(topic,)) for topic in ("algebra", "biology")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for topic, store in stores.items():
+        found = store.similarity_search("note", k=20)
+        assert len(found) == 6
+        assert all(doc.page_content.startswith(topic) for doc in found)
+
+    # Deleting one request's collection leaves the other one usable
+    stores["algebra"].delete_collection()
+    assert len(stores["biology"].similarity_search("note", k=20)) == 6
+    stores["biology"].delete_collection()
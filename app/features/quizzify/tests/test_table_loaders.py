@@ -0,0 +1,58 @@
+from io import BytesIO
+
+import pandas as pd
+import pytest
+from features.quizzify.tools import BytesFileCSVLoader, BytesFileXLSXLoader, table_documents
+
+def csv_file(rows):
+    frame = pd.DataFrame({"student": [f" s{n} " for n in range(rows)], "score": list(range(rows)), "note": [None] * rows})
+    return (BytesIO(frame.to_csv(index=False).encode()), "csv")
+
+def xlsx_file(rows):
+    content = BytesIO()
+    pd.DataFrame({"student": [f"s{n}" for n in range(rows)], "score": list(range(rows))}).to_excel(content, index=False)
+    content.seek(0)
+    return (content, "xlsx")
+
+def test_csv_rows_are_grouped_with_a_header():
+    documents = BytesFileCSVLoader([csv_file(5)], rows_per_document=2).load()
+
+    assert [doc.page_content for doc in documents] == [
+        "student | score | note\ns0 | 0 | \ns1 | 1 | ",
+        "student | score | note\ns2 | 2 | \ns3 | 3 | ",
+        "student | score | note\ns4 | 4 | ",
+    ]
+    assert [doc.metadata for doc in documents] == [
+        {"page_number": 1, "source": "csv", "first_row": 1, "last_row": 2},
+        {"page_number": 2, "source": "csv", "first_row": 3, "last_row": 4},
+        {"page_number": 3, "source": "csv", "first_row": 5, "last_row": 5},
+    ]
+
+def test_csv_groups_span_read_chunks(monkeypatch):
+    monkeypatch.setattr("features.quizzify.tools.CSV_CHUNK_ROWS", 7)
+    documents = BytesFileCSVLoader([csv_file(25)], rows_per_document=3).load()
+
+    assert len(documents) == 9
+    assert [doc.metadata["first_row"] for doc in documents] == [1, 4, 7, 10, 13, 16, 19, 22, 25]
+    assert documents[-1].page_content.endswith("s24 | 24 | ")
+
+def test_row_cap():
+    documents = BytesFileCSVLoader([csv_file(100)], rows_per_document=10, max_rows=35).load()
+    assert documents[-1].metadata["last_row"] == 35
+    assert len(documents) == 4
+
+def test_byte_cap_stops_early():
+    frame = pd.DataFrame({"a": ["x" * 100] * 10})
+    documents = list(table_documents([frame], "csv", rows_per_document=2, max_bytes=450))
+    assert len(documents) == 2
+
+def test_xlsx_rows_are_grouped():
+    documents = BytesFileXLSXLoader([xlsx_file(7)], rows_per_document=5).load()
+
+    assert len(documents) == 2
+    assert documents[0].page_content.splitlines()[:2] == ["student | score", "s0 | 0"]
+    assert documents[1].metadata == {"page_number": 2, "source": "xlsx", "first_row": 6, "last_row": 7}
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError):
+        BytesFileCSVLoader([(BytesIO(b"a,b"), "xlsx")]).load()
@@ -1,34 +1,47 @@
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterator, Optional
 # from io import BytesIO, StringIO
 # from fastapi import UploadFile
 # from pypdf import PdfReader
-from urllib.parse import urlparse
-from PIL import Image
 # import urllib.request
-import requests
 import os
+import hashlib
+import uuid
 import pymupdf
 import re
+import json
+import asyncio
+import threading
 import pandas as pd
-import pytesseract
 
 from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_google_vertexai import VertexAIEmbeddings, VertexAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables.config import get_executor_for_config
 from langchain_core.output_parsers import JsonOutputParser,StrOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain.document_loaders import YoutubeLoader
 from docx import Document as docu
+from docx.table import Table as DocxTable
 from youtube_transcript_api import YouTubeTranscriptApi
 
 
 from services.logger import setup_logger
 from services.tool_registry import ToolFile
+from services.models import get_llm
+from services.embeddings import get_cached_embeddings
+from services.vectorstore import NumpyVectorStore
+from services.jobs import report_progress
+from services.execution import prefetch
+from services.tracing import trace_stage, measure
+from services.metrics import LOADER_BYTES, LOADER_DOCUMENTS, SPLIT_CHUNKS
 from api.error_utilities import LoaderError
+from features.quizzify.downloader import FileDownloader, file_type_from_url
+from features.quizzify.ocr import ocr_images
+from features.quizzify.pdf_extraction import iter_pages_parallel, PDF_PROCESS_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_MAX_PAGES
+from services.cache import get_cache, MISSING
 from enum import Enum
 
 
@@ -42,6 +55,7 @@ from typing import List
 
 #HTML and XML loaders
 from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
 
 #Extraction of all text from slides in presentation
 
@@ -61,17 +75,28 @@ def read_text_file(file_path):
         return file.read()
 
 class RAGRunnable:
-    def __init__(self, func):
+    """
+    A pipeline stage. Every call is recorded under `name` in the request trace, see services.tracing.
+    Chaining stages with `|` gives a runnable that is not a stage of its own, its parts record themselves.
+    """
+    def __init__(self, func, name: Optional[str] = None, composite: bool = False):
         self.func = func
+        self.name = name or getattr(func, "__name__", "stage")
+        self.composite = composite
     
     def __or__(self, other):
         def chained_func(*args, **kwargs):
             # Result of previous function is passed as first argument to next function
-            return other(self.func(*args, **kwargs))
-        return RAGRunnable(chained_func)
+            return other(self(*args, **kwargs))
+        return RAGRunnable(chained_func, composite=True)
     
     def __call__(self, *args, **kwargs):
-        return self.func(*args, **kwargs)
+        if self.composite:
+            return self.func(*args, **kwargs)
+        with trace_stage(self.name, args[0] if args else None) as stage:
+            result = self.func(*args, **kwargs)
+            stage.output(result)
+        return result
 
 class YouTubeTranscriptLoader(BaseLoader):
     def __init__(self, verbose=False):
@@ -117,199 +142,501 @@ class YouTubeTranscriptLoader(BaseLoader):
 
 
 
+TABLE_ROWS_PER_DOCUMENT = int(os.environ.get("TABLE_ROWS_PER_DOCUMENT", 50))
+TABLE_MAX_ROWS = int(os.environ.get("TABLE_MAX_ROWS", 100_000))
+TABLE_MAX_BYTES = int(os.environ.get("TABLE_MAX_BYTES", 20 * 1024 * 1024))
+CSV_CHUNK_ROWS = 10_000
+
+def rows_to_text(frame: pd.DataFrame) -> pd.Series:
+    # Column-wise string operations instead of a Python loop per row and cell
+    values = frame.fillna("").astype(str)
+    text = values.iloc[:, 0].str.strip()
+    for column in values.columns[1:]:
+        text = text + " | " + values[column].str.strip()
+    return text
+
+def table_documents(frames: Iterator[pd.DataFrame], file_type: str, rows_per_document: int = TABLE_ROWS_PER_DOCUMENT,
+                    max_bytes: int = TABLE_MAX_BYTES) -> Iterator[Document]:
+    """
+    Turns spreadsheet rows into documents of `rows_per_document` rows each, every one starting
+    with the column names. Stops with a warning once `max_bytes` of text have been produced.
+    """
+    rows_per_document = max(1, rows_per_document)
+    first_row = 0
+    produced_bytes = 0
+    page_number = 0
+    for frame in frames:
+        if frame.empty or len(frame.columns) == 0:
+            continue
+        header = " | ".join(str(column).strip() for column in frame.columns)
+        lines = rows_to_text(frame).tolist()
+        for start in range(0, len(lines), rows_per_document):
+            group = lines[start:start + rows_per_document]
+            page_content = header + "\n" + "\n".join(group)
+            produced_bytes += len(page_content)
+            if produced_bytes > max_bytes:
+                logger.warning(f"Stopped reading {file_type} file at row {first_row + start}, the text exceeds {max_bytes} bytes")
+                return
+            page_number += 1
+            metadata = {"page_number": page_number, "source": file_type,
+                        "first_row": first_row + start + 1, "last_row": first_row + start + len(group)}
+            yield Document(page_content=page_content, metadata=metadata)
+        first_row += len(lines)
+
 class BytesFileCSVLoader(BaseLoader):
-    def __init__(self, files: List[Tuple[BytesIO, str]]):
+    """Loads a CSV in chunks of rows, `rows_per_document` rows per document. Only the first `max_rows` rows are read."""
+    # Bump when the loader output changes so cached parses of older versions are ignored
+    cache_version = 2
+
+    def __init__(self, files: List[Tuple[BytesIO, str]], rows_per_document: int = TABLE_ROWS_PER_DOCUMENT, max_rows: int = TABLE_MAX_ROWS):
         self.files = files
+        self.rows_per_document = max(1, rows_per_document)
+        self.max_rows = max_rows
+
+    @classmethod
+    def cache_params(cls) -> Dict[str, Any]:
+        # The settings that shape the documents, part of the parse cache key
+        return {"rows_per_document": TABLE_ROWS_PER_DOCUMENT, "max_rows": TABLE_MAX_ROWS}
     
-    def load(self) -> List[Document]:
-        documents = []
-        
+    def lazy_load(self) -> Iterator[Document]:
         for file, file_type in self.files:
             logger.debug(file_type)
             if file_type.lower() == "csv":
-                # pdf_reader = PdfReader(file) #! PyPDF2.PdfReader is deprecated
                 file.seek(0)
-                df = pd.read_csv(file)
-                for row in df.itertuples():
-                    content = ""
-                    for column in row[1:]:
-                        content+= (str(column).strip() + "\n")
-                    metadata = {"page_number": row[0] + 1, "source": file_type}
-                    doc = Document(page_content=content, metadata=metadata)
-                    documents.append(doc)               
+                # Whole groups per chunk, so no document straddles two chunks
+                chunksize = max(1, CSV_CHUNK_ROWS // self.rows_per_document) * self.rows_per_document
+                with pd.read_csv(file, chunksize=chunksize, nrows=self.max_rows, dtype=str, keep_default_na=False) as chunks:
+                    yield from table_documents(chunks, file_type, self.rows_per_document)
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
-            
-        return documents
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
 
 class BytesFileXLSXLoader(BaseLoader):
+    """Loads the first sheet of a workbook, `rows_per_document` rows per document. Only the first `max_rows` rows are read."""
+    cache_version = 2
 
-    def __init__(self, files: List[Tuple[BytesIO, str]]):
+    def __init__(self, files: List[Tuple[BytesIO, str]], rows_per_document: int = TABLE_ROWS_PER_DOCUMENT, max_rows: int = TABLE_MAX_ROWS):
         self.files = files
-    
-    def load(self) -> List[Document]:
-        documents = []
-        
+        self.rows_per_document = max(1, rows_per_document)
+        self.max_rows = max_rows
+
+    @classmethod
+    def cache_params(cls) -> Dict[str, Any]:
+        return {"rows_per_document": TABLE_ROWS_PER_DOCUMENT, "max_rows": TABLE_MAX_ROWS}
+
+    def lazy_load(self) -> Iterator[Document]:
         for file, file_type in self.files:
             logger.debug(file_type)
             if file_type.lower() == "xlsx":
-                # pdf_reader = PdfReader(file) #! PyPDF2.PdfReader is deprecated
                 file.seek(0)
-                df = pd.read_excel(file)
-                for row in df.itertuples():
-                    content = ""
-                    for column in row[1:]:
-                        content+= (str(column).strip() + "\n")
-                    metadata = {"page_number": row[0] + 1, "source": file_type}
-                    doc = Document(page_content=content, metadata=metadata)
-                    documents.append(doc)               
+                # read_excel cannot stream, nrows at least stops it from building the rows past the cap
+                frame = pd.read_excel(file, nrows=self.max_rows, dtype=str, keep_default_na=False)
+                yield from table_documents([frame], file_type, self.rows_per_document)
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
-            
-        return documents
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
      
+DOCX_CHUNK_CHARS = int(os.environ.get("DOCX_CHUNK_CHARS", 1000))
+
 class DocLoader(BaseLoader):
+    """
+    Loads a DOCX as section-sized documents.
+
+    Paragraphs and tables are read in document order and merged until a document reaches
+    `chunk_chars` characters. Headings always start a new document and are recorded as its
+    section. Empty paragraphs are dropped.
+    """
+    cache_version = 3
 
-    def __init__(self, files: List[Tuple[BytesIO, str]]):
+
+    def __init__(self, files: List[Tuple[BytesIO, str]], chunk_chars: int = DOCX_CHUNK_CHARS):
         self.files = files
-    
-    def load(self) -> List[Document]:
-        documents = []
-        
+        self.chunk_chars = chunk_chars
+
+    @classmethod
+    def cache_params(cls) -> Dict[str, Any]:
+        return {"chunk_chars": DOCX_CHUNK_CHARS}
+
+    @staticmethod
+    def is_heading(paragraph) -> bool:
+        style_name = paragraph.style.name if paragraph.style is not None else ""
+        return style_name.startswith("Heading") or style_name == "Title"
+
+    @staticmethod
+    def table_text(table) -> str:
+        rows = []
+        for row in table.rows:
+            cells, seen = [], set()
+            for cell in row.cells:
+                # Merged cells are returned once per grid column they span
+                if cell._tc in seen:
+                    continue
+                seen.add(cell._tc)
+                cells.append(" ".join(cell.text.split()))
+            if any(cells):
+                rows.append(" | ".join(cells))
+        return "\n".join(rows)
+
+    def lazy_load(self) -> Iterator[Document]:
         for file, file_type in self.files:
             logger.debug(file_type)
-            if file_type.lower() == "docx":
-                # pdf_reader = PdfReader(file) #! PyPDF2.PdfReader is deprecated
-                docs = docu(file)
-                for page_num, page in enumerate(docs.paragraphs):
-                    page_content = ""
-                    for paragraph in page.runs:
-                        page_content += paragraph.text.strip() + "\n"
-                    metadata = {"page_number": page_num + 1, "source": file_type}
-                    doc = Document(page_content=page_content.rstrip(),metadata=metadata)
-                    documents.append(doc)               
-            else:
+            if file_type.lower() != "docx":
                 raise ValueError(f"Unsupported file type: {file_type}")
-            
-        return documents
+
+            docs = docu(file)
+            section, blocks, length, page_num = "", [], 0, 0
+            for block in docs.iter_inner_content():
+                if isinstance(block, DocxTable):
+                    text = self.table_text(block)
+                    heading = False
+                else:
+                    text = block.text.strip()
+                    heading = self.is_heading(block)
+                if not text:
+                    continue
+
+                # Counts the line breaks joining the blocks, so a document stays within `chunk_chars`
+                if blocks and (heading or length + len(text) + 1 > self.chunk_chars):
+                    page_num += 1
+                    yield self.section_document(blocks, file_type, page_num, section)
+                    blocks, length = [], 0
+                if heading:
+                    section = text
+                blocks.append(text)
+                length += len(text) + 1
+
+            if blocks:
+                page_num += 1
+                yield self.section_document(blocks, file_type, page_num, section)
+
+    def section_document(self, blocks: List[str], file_type: str, page_num: int, section: str) -> Document:
+        metadata = {"page_number": page_num, "source": file_type}
+        if section:
+            metadata["section"] = section
+        return Document(page_content="\n".join(blocks), metadata=metadata)
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
     
+
+IMAGE_OCR_MAX_DIMENSION = int(os.environ.get("IMAGE_OCR_MAX_DIMENSION", 2500))
+IMAGE_OCR_GRAYSCALE = os.environ.get("IMAGE_OCR_GRAYSCALE", "true").lower() == "true"
+# Mean Tesseract word confidence (0-100) from which the LLM cleanup is skipped, above 100 always cleans up
+IMAGE_CLEANUP_MIN_CONFIDENCE = float(os.environ.get("IMAGE_CLEANUP_MIN_CONFIDENCE", 90))
+
 class ImageLoader(BaseLoader):
-    def __init__(self,files: List[Tuple[BytesIO,str]]):
+    """
+    OCRs images, in the process pool for multi-image uploads, then corrects the OCR text with the LLM.
+
+    Images are converted to grayscale and downscaled to `max_dimension` before OCR. The cleanup of
+    every image that needs it is done in a single LLM call, and images whose mean OCR word
+    confidence reaches `cleanup_min_confidence` skip the cleanup entirely.
+    Returns exactly one document per image, in order.
+    """
+    cache_version = 3
+    # URLLoader hands all images of a request to one loader so the cleanup can be batched
+    batched = True
+
+    def __init__(self, files: List[Tuple[BytesIO,str]], max_dimension: int = IMAGE_OCR_MAX_DIMENSION, grayscale: bool = IMAGE_OCR_GRAYSCALE,
+                 cleanup_min_confidence: float = IMAGE_CLEANUP_MIN_CONFIDENCE, parallel: bool = True):
         self.files = files
-    
-    def load(self) -> List[Document]:
-        documents = []
-        text_completion_model = VertexAI(model='gemini-1.5-flash-001')
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+        self.cleanup_min_confidence = cleanup_min_confidence
+        self.parallel = parallel
+
+    @classmethod
+    def cache_params(cls) -> Dict[str, Any]:
+        return {"max_dimension": IMAGE_OCR_MAX_DIMENSION, "grayscale": IMAGE_OCR_GRAYSCALE,
+                "cleanup_min_confidence": IMAGE_CLEANUP_MIN_CONFIDENCE}
+
+    def cleanup_chain(self):
+        prompt = PromptTemplate.from_template(read_text_file("prompt/image-cleanup-prompt.txt"))
+        return prompt | get_llm('gemini-1.5-flash-001') | JsonOutputParser()
+
+    def single_cleanup_chain(self):
         prompt= PromptTemplate.from_template("I want you to check if there is any missing words in {text}. If there are any, I want to to autocomplete them with the most relevant word possible and make the whole thing grammatically correct. The output should be a string.")
-        text_chain = (
+        return (
                 {"text": RunnablePassthrough()} 
                 | prompt 
-                | text_completion_model 
+                | get_llm('gemini-1.5-flash-001') 
                 | StrOutputParser()
             )
 
+    def cleanup(self, texts: List[str]) -> List[str]:
+        if not texts:
+            return []
+        try:
+            cleaned = self.cleanup_chain().invoke({"count": len(texts), "texts": json.dumps(texts)})
+            if isinstance(cleaned, list) and len(cleaned) == len(texts) and all(isinstance(text, str) for text in cleaned):
+                return cleaned
+            logger.warning(f"Batched OCR cleanup returned {type(cleaned).__name__} instead of {len(texts)} strings")
+        except Exception as e:
+            logger.warning(f"Batched OCR cleanup failed: {e}")
+        # Fall back to one cleanup call per image, the chain maps each text into the prompt itself
+        return self.single_cleanup_chain().batch(texts)
+
+    def load(self) -> List[Document]:
         for file, file_type in self.files:
             logger.debug(file_type)
-            if file_type.lower() in ['jpeg', 'jpg', 'png']:
-                image = Image.open(file)
-                text = pytesseract.image_to_string(image)
-                result = text_chain.invoke({"text" : text})
-                metadata = {"source":file_type,"page_number":1}
-                document = Document(page_content=result,metadata=metadata)
-                documents.append(document)
-                    
-            else:
+            if file_type.lower() not in ['jpeg', 'jpg', 'png']:
                 raise ValueError(f"Unsupported file type: {file_type}")
-            
-        return documents
+
+        results = ocr_images([file.getvalue() for file, _ in self.files], self.max_dimension, self.grayscale, self.parallel)
+        texts = [text for text, _ in results]
+
+        needs_cleanup = [index for index, (_, confidence) in enumerate(results) if confidence < self.cleanup_min_confidence]
+        if len(needs_cleanup) < len(results):
+            logger.info(f"Skipping OCR cleanup for {len(results) - len(needs_cleanup)} high confidence images")
+        for index, text in zip(needs_cleanup, self.cleanup([texts[index] for index in needs_cleanup])):
+            texts[index] = text
+
+        return [
+            Document(page_content=text, metadata={"source": file_type, "page_number": 1})
+            for text, (_, file_type) in zip(texts, self.files)
+        ]
     
 
 class BytesFilePDFLoader(BaseLoader):
+    """
+    Loads one Document per PDF page.
+
+    Documents with at least PDF_PARALLEL_MIN_PAGES pages are extracted in a process pool, page
+    ranges in parallel, and still come back in page order. `parallel` forces either mode.
+    Only the first `max_pages` pages are read.
+    """
+    cache_version = 2
+
     # Original def __init__(self, files: List[Tuple[BytesIO, str]])
-    def __init__(self, files: List[Tuple[BytesIO, str]]):
+    def __init__(self, files: List[Tuple[BytesIO, str]], parallel: Optional[bool] = None, max_pages: int = PDF_MAX_PAGES):
         self.files = files
+        self.parallel = parallel
+        self.max_pages = max_pages
+
+    @classmethod
+    def cache_params(cls) -> Dict[str, Any]:
+        # Parallel and sequential extraction give the same pages, only the page cap changes the output
+        return {"max_pages": PDF_MAX_PAGES}
     
-    def load(self) -> List[Document]:
-        documents = []
-        
+    def use_process_pool(self, page_count: int) -> bool:
+        if self.parallel is not None:
+            return self.parallel
+        return PDF_PROCESS_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES
+
+    def lazy_load(self) -> Iterator[Document]:
         for file, file_type in self.files:
             logger.debug(file_type)
-            if file_type.lower() == "pdf":
-                pdf_reader = pymupdf.open(stream=file)
-                for pages in range(pdf_reader.page_count):
-                    page = pdf_reader.load_page(page_id=pages)
-                    metadata = {"source" : file_type, "page_number" : pages + 1}
-                    doc = Document(page_content=page.get_text(), metadata= metadata)
-                    documents.append(doc)
-                    
-            else:
+            if file_type.lower() != "pdf":
                 raise ValueError(f"Unsupported file type: {file_type}")
-            
-        return documents
 
+            # Opened on a view of the buffer, or of the memory-mapped spool file, instead of a copy
+            with file.getbuffer() as buffer, pymupdf.open(stream=buffer, filetype="pdf") as pdf_reader:
+                page_count = pdf_reader.page_count
+                if page_count > self.max_pages:
+                    logger.warning(f"PDF has {page_count} pages, only the first {self.max_pages} are loaded")
+                    page_count = self.max_pages
+
+                if self.use_process_pool(page_count):
+                    pages = iter_pages_parallel(buffer, page_count)
+                else:
+                    pages = ((page_id, pdf_reader.load_page(page_id=page_id).get_text()) for page_id in range(page_count))
+
+                for page_id, text in pages:
+                    metadata = {"source" : file_type, "page_number" : page_id + 1}
+                    yield Document(page_content=text, metadata= metadata)
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
+
+PPTX_GROUP_CHARS = int(os.environ.get("PPTX_GROUP_CHARS", 0))
 
 class PowerPointLoader(BaseLoader):
-    def __init__(self,files: List[Tuple[BytesIO, str]], loader = None, verbose=False, expected_file_type="pptx", ):
+    """
+    Loads one document per slide, holding only that slide's title and text.
+
+    With `group_chars` set, consecutive slides are merged into one document for as long as the
+    merged text stays within that many characters. Slides without any text are skipped.
+    """
+    cache_version = 2
+
+    def __init__(self,files: List[Tuple[BytesIO, str]], loader = None, verbose=False, expected_file_type="pptx", group_chars: int = PPTX_GROUP_CHARS):
         self.loader = loader
         self.expected_file_type = expected_file_type
         self.verbose = verbose
         self.files = files
+        self.group_chars = group_chars
+
+    @classmethod
+    def cache_params(cls) -> Dict[str, Any]:
+        return {"group_chars": PPTX_GROUP_CHARS}
     
+    @staticmethod
     def get_slide_text(slides):
-        text_concepts = ""
-        # Iterate over each shape in the slides collection
+        # Get the title of the slide
+        title_shape = slides.shapes.title
+        title = title_shape.text.strip() if title_shape is not None else ""
+        paragraphs = []
+        # Iterate over each shape in the slides collection, the title is already taken
         for shape in slides.shapes:
-            # Get the title of the slide
-            title = ""
-            if slides.shapes.title:
-                title = slides.shapes.title.text
-            texts = ""
-            if shape.has_text_frame:
-                # Extract text from each paragraph in the text frame
-                for paragraph in shape.text_frame.paragraphs:
-                    # Extract text from each run in the paragraph
-                    for run in paragraph.runs:
-                        texts += run.text
-            text_concepts += texts
-        return title, text_concepts
+            if not shape.has_text_frame or (title_shape is not None and shape.shape_id == title_shape.shape_id):
+                continue
+            # Extract text from each paragraph in the text frame
+            for paragraph in shape.text_frame.paragraphs:
+                text = "".join(run.text for run in paragraph.runs).strip()
+                if text:
+                    paragraphs.append(text)
+        return title, "\n".join(paragraphs)
 
-    def load(self) -> List[Document]:
-        documents: List[Document] = []
+    def lazy_load(self) -> Iterator[Document]:
         for file,file_type in self.files:
             if file_type not in ('pptx', 'ppt'):
                     raise ValueError(f"Unsupported file type: {file_type}")
-            else:
-                prs = Presentation(file)
-                page_content = ""
-                for slide_num, slide in enumerate(prs.slides, start = 1):
-                    title, text_concepts = PowerPointLoader.get_slide_text(slide)
-                    page_content += (title + text_concepts)
-                    metadata = {"source": file_type, "page_number": slide_num}
-                    doc = Document(page_content=page_content, metadata=metadata)
-                    documents.append(doc)
-        return documents
+            prs = Presentation(file)
+            group, group_length, first_slide = [], 0, None
+            for slide_num, slide in enumerate(prs.slides, start = 1):
+                title, text_concepts = PowerPointLoader.get_slide_text(slide)
+                slide_text = "\n".join(part for part in (title, text_concepts) if part)
+                if not slide_text:
+                    continue
+                if group and group_length + len(slide_text) > self.group_chars:
+                    yield self.slide_document(group, file_type, first_slide, last_slide)
+                    group, group_length = [], 0
+                if not group:
+                    first_slide = slide_num
+                group.append(slide_text)
+                group_length += len(slide_text)
+                last_slide = slide_num
+            if group:
+                yield self.slide_document(group, file_type, first_slide, last_slide)
+
+    def slide_document(self, texts: List[str], file_type: str, first_slide: int, last_slide: int) -> Document:
+        metadata = {"source": file_type, "page_number": first_slide}
+        if last_slide != first_slide:
+            metadata["last_page_number"] = last_slide
+        return Document(page_content="\n\n".join(texts), metadata=metadata)
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
     
+try:
+    import lxml.html
+    from lxml import etree
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+HTML_MAX_BYTES = int(os.environ.get("HTML_MAX_BYTES", 10 * 1024 * 1024))
+HTML_CHUNK_CHARS = int(os.environ.get("HTML_CHUNK_CHARS", 1000))
+# Page chrome and non-text content, dropped before extracting the text
+HTML_BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "canvas", "iframe", "nav", "header", "footer", "aside", "form", "head"]
+HTML_BLOCK_TAGS = ["p", "div", "section", "article", "main", "li", "dt", "dd", "tr", "table", "pre", "blockquote",
+                   "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "figcaption", "br", "hr"]
+
 class HTMLLoader(BaseLoader):
-    def __init__(self, files: List[Tuple[BytesIO, str]], expected_file_type="html", verbose=False):
+    """
+    Extracts the readable text of an HTML page, with lxml when it is installed.
+
+    Scripts, styles and navigation are removed, and the text is split at block elements and
+    packed into documents of up to `chunk_chars` characters. Only the first `max_bytes` bytes
+    of a page are parsed.
+    """
+    cache_version = 3
+
+    def __init__(self, files: List[Tuple[BytesIO, str]], expected_file_type="html", verbose=False,
+                 chunk_chars: int = HTML_CHUNK_CHARS, max_bytes: int = HTML_MAX_BYTES, parser: str = HTML_PARSER):
         self.verbose = verbose
         self.expected_file_type = expected_file_type
         self.files = files
+        self.chunk_chars = chunk_chars
+        self.max_bytes = max_bytes
+        self.parser = parser
 
-    def load(self) -> List[Document]:
-        documents = []
-        
-        # Ensure file paths is a list
+    @classmethod
+    def cache_params(cls) -> Dict[str, Any]:
+        # The parsers differ in details of whitespace, so the one in use is part of the key
+        return {"chunk_chars": HTML_CHUNK_CHARS, "max_bytes": HTML_MAX_BYTES, "parser": HTML_PARSER}
+
+    @staticmethod
+    def detect_encoding(markup: bytes, charset: Optional[str] = None) -> Optional[str]:
+        """The charset from the Content-Type header when the download had one, else what the BOM, <meta> or content give away."""
+        known = [charset] if charset else []
+        return UnicodeDammit(markup, known_definite_encodings=known, is_html=True).original_encoding
+
+    @staticmethod
+    def lxml_text(markup: bytes, encoding: Optional[str] = None) -> Tuple[str, str]:
+        # Works on lxml's C tree directly, building a BeautifulSoup tree costs more than the extraction.
+        # Without an encoding lxml reads pages that lack a <meta charset> as Latin-1.
+        try:
+            parser = lxml.html.HTMLParser(encoding=encoding)
+        except LookupError:
+            # An encoding Python knows and libxml2 does not, decoded here instead
+            markup = markup.decode(encoding, "replace").encode("utf-8")
+            parser = lxml.html.HTMLParser(encoding="utf-8")
+        try:
+            tree = lxml.html.document_fromstring(markup, parser=parser)
+        except etree.ParserError:  # nothing but whitespace or comments
+            return "", ""
+        title = tree.findtext(".//title") or ""
+        etree.strip_elements(tree, etree.Comment, etree.ProcessingInstruction, *HTML_BOILERPLATE_TAGS, with_tail=False)
+        # A line break after every block element, inline elements stay on the line of their block
+        for element in tree.iter(*HTML_BLOCK_TAGS):
+            element.tail = "\n" + (element.tail or "")
+        return title, "".join(tree.itertext())
+
+    def soup_text(self, markup: bytes, encoding: Optional[str] = None) -> Tuple[str, str]:
+        soup = BeautifulSoup(markup, self.parser, from_encoding=encoding)
+        title = soup.title.get_text() if soup.title else ""
+        for tag in soup.find_all(HTML_BOILERPLATE_TAGS):
+            tag.decompose()
+        for tag in soup.find_all(HTML_BLOCK_TAGS):
+            tag.insert_after("\n")
+        return title, soup.get_text()
+
+    def text_blocks(self, markup: bytes, charset: Optional[str] = None) -> Tuple[str, List[str]]:
+        if not markup.strip():
+            return "", []
+        encoding = self.detect_encoding(markup, charset)
+        title, text = self.lxml_text(markup, encoding) if self.parser == "lxml" else self.soup_text(markup, encoding)
+        lines = (" ".join(line.split()) for line in text.splitlines())
+        return " ".join(title.split()), [line for line in lines if line]
+
+    def lazy_load(self) -> Iterator[Document]:
         for file, file_type in self.files:
             if file_type != "html":
                 raise ValueError(f"Unsupported file type: {file_type}")
-            else:
-                byte_str = file.getvalue()
-                # text_obj = byte_str.decode("utf-8")
-                soup = BeautifulSoup(byte_str)
-                text = soup.get_text()
-                documents.append(Document(page_content=text, metadata={"source":file_type,"page_number":1}))
 
-        return documents
+            with file.getbuffer() as buffer:
+                if buffer.nbytes > self.max_bytes:
+                    logger.warning(f"HTML page is {buffer.nbytes} bytes, only the first {self.max_bytes} are parsed")
+                markup = bytes(buffer[:self.max_bytes])
+
+            title, lines = self.text_blocks(markup, getattr(file, "charset", None))
+            blocks, length, page_num = [], 0, 0
+            for line in lines:
+                # Counts the line breaks joining the blocks, so a document stays within one splitter chunk
+                if blocks and length + len(line) + 1 > self.chunk_chars:
+                    page_num += 1
+                    yield self.page_document(blocks, file_type, page_num, title)
+                    blocks, length = [], 0
+                blocks.append(line)
+                length += len(line) + 1
+            if blocks:
+                page_num += 1
+                yield self.page_document(blocks, file_type, page_num, title)
+
+    def page_document(self, blocks: List[str], file_type: str, page_num: int, title: str) -> Document:
+        metadata = {"source": file_type, "page_number": page_num}
+        if title:
+            metadata["title"] = title
+        return Document(page_content="\n".join(blocks), metadata=metadata)
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
 
 class LocalFileLoader(BaseLoader):
     def __init__(self, file_paths: list[str], file_loader=None):
@@ -351,94 +678,200 @@ class FileTypes(Enum):
     JPG = 'jpg'
     PNG = 'png'  
     
+# Short-lived per-request collections: "numpy" skips Chroma's setup and teardown
+VECTORSTORE_CLASSES = {"chroma": Chroma, "numpy": NumpyVectorStore}
+QUIZ_VECTORSTORE = os.environ.get("QUIZ_VECTORSTORE", "chroma")
+_VECTORSTORE_SETUP_LOCK = threading.Lock()
+_READY_VECTORSTORES = set()
+
+# Streaming ingestion overlaps downloading, parsing, splitting and embedding, with bounded queues between the stages
+RAG_STREAMING = os.environ.get("RAG_STREAMING", "false").lower() in ("1", "true", "yes")
+RAG_STREAM_QUEUE_SIZE = int(os.environ.get("RAG_STREAM_QUEUE_SIZE", 64))
+RAG_STREAM_BATCH_SIZE = int(os.environ.get("RAG_STREAM_BATCH_SIZE", 64))
+
+QUIZ_MAX_CONCURRENCY = int(os.environ.get("QUIZ_MAX_CONCURRENCY", 4))
+# "per_question" asks the model for one question per call, "batch" for the whole quiz as a JSON array
+QUIZ_GENERATION_MODES = ("per_question", "batch")
+QUIZ_GENERATION_MODE = os.environ.get("QUIZ_GENERATION_MODE", "per_question")
+QUIZ_BATCH_ROUNDS = int(os.environ.get("QUIZ_BATCH_ROUNDS", 2))
+# Chunks retrieved once per quiz, and how many of them each question slot sees
+QUIZ_RETRIEVAL_K = int(os.environ.get("QUIZ_RETRIEVAL_K", 12))
+QUIZ_CONTEXT_CHUNKS = int(os.environ.get("QUIZ_CONTEXT_CHUNKS", 4))
+QUIZ_DUPLICATE_THRESHOLD = float(os.environ.get("QUIZ_DUPLICATE_THRESHOLD", 0.8))
+
+PARSE_CACHE = "parsed_documents"
+PARSE_CACHE_MAX_BYTES = int(os.environ.get("PARSE_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+def parse_cache_key(file_content: BytesIO, file_type: str, loader) -> str:
+    # Content addressed: the same bytes parsed by the same loader version and settings always give the same documents
+    with file_content.getbuffer() as buffer:
+        digest = hashlib.sha256(buffer).hexdigest()
+    # The declared charset changes how text is decoded, so it is part of the content
+    charset = getattr(file_content, "charset", None)
+    if charset:
+        digest = f"{digest}:{charset}"
+    key = f"{digest}:{file_type}:{loader.__name__}:{getattr(loader, 'cache_version', 1)}"
+    if hasattr(loader, "cache_params"):
+        params = json.dumps(loader.cache_params(), sort_keys=True)
+        key = f"{key}:{hashlib.sha256(params.encode('utf-8')).hexdigest()[:16]}"
+    return key
+
 class URLLoader():
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, downloader=None, parse_cache=None, use_parse_cache=True):
         # self.expected_file_types = ["xlsx", "pdf", "pptx", "csv", "docx","jpeg",'jpg',"png", "ppt", "html"]
         self.verbose = verbose
+        self.parse_cache = (parse_cache or get_cache(PARSE_CACHE, max_items=64, max_bytes=PARSE_CACHE_MAX_BYTES)) if use_parse_cache else None
         self.loader_dict = {"xlsx":BytesFileXLSXLoader, "pdf":BytesFilePDFLoader, "pptx": PowerPointLoader, 
                         "csv": BytesFileCSVLoader, "docx": DocLoader,"jpeg": ImageLoader,
                         'jpg': ImageLoader,"png": ImageLoader, "ppt": PowerPointLoader, "html": HTMLLoader}
+        # Files no loader handles are rejected by the pre-flight check, before their body is downloaded
+        self.downloader = downloader or FileDownloader(file_types=self.loader_dict)
         
     
     def download_from_drive(self,file_id : str):
-        download_url = "https://docs.google.com/uc?export=download&id=" + file_id
-
-        response = requests.get(download_url, stream=True)
-
-        # Check for confirmation prompt
-        if response.status_code == 302:  # Found a redirect, likely confirmation needed
-            logger.info("Google Drive requires confirmation to download the file.")
-            logger.info("Please visit the provided URL in your browser and allow access.")
-            logger.info(response.headers['Location'])  # Print the redirection URL
+        result = self.downloader.download_drive_file(file_id)
+        
+        if result.status_code == 302:
             return None  # Indicate download not completed
         
-        # Download logic (assuming confirmation was successful)
-        file_type = ''
-        content_disposition = response.headers.get('Content-Disposition')
-        if content_disposition:
-            filename_part = content_disposition.split('=')[-1]
-            if '.' in filename_part:
-                file_type = filename_part.split('.')[-1].lower()[:len(filename_part.split('.')[-1]) - 1]
+        return (result, result.file_type)
+    
+    def cached_documents(self, file: Tuple[BytesIO, str]):
+        """Returns the parse cache key of a file and its cached documents, or MISSING."""
+        if self.parse_cache is None:
+            return None, MISSING
+        file_content, file_type = file
+        cache_key = parse_cache_key(file_content, file_type, self.loader_dict[file_type])
+        cached = self.parse_cache.get(cache_key)
+        if cached is MISSING:
+            return cache_key, MISSING
+        if self.verbose: logger.info(f"Parse cache hit for {file_type} file {cache_key[:12]}")
+        return cache_key, [Document(page_content=page_content, metadata=metadata) for page_content, metadata in cached]
+
+    def cache_documents(self, cache_key, documents: List[Document]):
+        if cache_key is not None:
+            # Stored as plain tuples, which serialize much smaller than Document objects
+            self.parse_cache.set(cache_key, [(document.page_content, document.metadata) for document in documents])
+
+    def parse_file(self, file: Tuple[BytesIO, str]) -> List[Document]:
+        """Parses a downloaded file, reusing the documents of an earlier upload with identical bytes."""
+        cache_key, documents = self.cached_documents(file)
+        if documents is MISSING:
+            documents = self.loader_dict[file[1]]([file]).load()
+            self.cache_documents(cache_key, documents)
+        return documents
+
+    def parse_files(self, files: List[Tuple[BytesIO, str]]) -> List[List[Document]]:
+        """
+        Parses every file, returning its documents in the same order. A file that fails to parse gets an empty list.
+        Files of a `batched` loader that miss the parse cache are handed to one loader instance together.
+        """
+        parsed: List[List[Document]] = [[] for _ in files]
+        batches: Dict[Any, List[Tuple[int, Any]]] = {}
+
+        for index, file in enumerate(files):
+            try:
+                loader = self.loader_dict[file[1]]
+                if not getattr(loader, "batched", False):
+                    parsed[index] = self.parse_file(file)
+                    continue
+                cache_key, documents = self.cached_documents(file)
+                if documents is MISSING:
+                    batches.setdefault(loader, []).append((index, cache_key))
+                else:
+                    parsed[index] = documents
+            except Exception as e: # some error
+                logger.error(f"Failed to parse {file[1]} file: {e}")
 
-        return (response,file_type)
+        for loader, entries in batches.items():
+            try:
+                # Batched loaders return exactly one document per file, in order
+                documents = loader([files[index] for index, _ in entries]).load()
+            except Exception as e:
+                logger.error(f"Failed to parse {len(entries)} files with {loader.__name__}: {e}")
+                continue
+            for (index, cache_key), document in zip(entries, documents):
+                parsed[index] = [document]
+                self.cache_documents(cache_key, [document])
+
+        return parsed
     
-    def load(self, tool_files: List[ToolFile]) -> List[Document]:
-        queued_files = []
-        documents = []
+    def download_targets(self, tool_files: List[ToolFile]) -> Tuple[List[Tuple[str, Optional[str]]], List[ToolFile]]:
+        """Splits the files into (url, drive_file_id) download targets and YouTube videos."""
         youtube_files = []
-        # any_success = False
-        response = None
-
-        def check_file_type(file_type):
-            return any(file_type == member.value for member in FileTypes)
+        download_targets = []
+        regex = r"/d/([^?]+)/"
 
         for tool_file in tool_files:
             url = tool_file.url
-            file_type = None
-            regex = r"/d/([^?]+)/"
             
             if url.lower().startswith("https://youtu.be/"):
                 youtube_files.append(tool_file)
-                                           
-            try:
-                match = re.search(regex,url)
-                if not match:
-                    response = requests.get(url, verify=False, stream=True)
-                    parsed_url = urlparse(url)
-                    path = parsed_url.path
-                else:
-                    
-                    file_id = match.group(1)
-                    response,file_type = self.download_from_drive(file_id)
-                if response.status_code == 200:
-                    # Read file
-                    file_content = BytesIO(response.content)
-                    # Check file type
-                    # file_type = path.rsplit(".")[-1]
-                    if not file_type:
-                        file_type = url.rsplit('.')[-1]
-                    # if file_type not in self.expected_file_types:
-                    if not check_file_type(file_type):
-                        # string = self.expected_file_types.join(", ")
-                        filelist = [str(member.value) for member in FileTypes]
-                        string = ''.join(filelist)
-                        raise LoaderError(f"Expected file types: {string}, but got: {file_type}")
-
-                    # Append to Queue
-                    queued_files.append((file_content, file_type))
-                    if self.verbose:
-                        logger.info(f"Successfully loaded file from {url}")
-                    
-                else:
-                    logger.error(f"Request failed to load file from {url} and got status code {response.status_code}")
-
-            except Exception as e:
-                logger.error(f"Failed to load file from {url}")
-                logger.error(e)
                 continue
+            
+            match = re.search(regex,url)
+            download_targets.append((url, match.group(1) if match else None))
+        return download_targets, youtube_files
+
+    def downloaded_file(self, url: str, result) -> Optional[Tuple[Any, str]]:
+        """Checks a download result and returns the (content, file_type) to parse, or None when it failed."""
+        def check_file_type(file_type):
+            return any(file_type == member.value for member in FileTypes)
+
+        try:
+            if isinstance(result, Exception):
+                raise result
+            
+            if result.status_code == 200:
+                file_content = result.content
+                # Check file type
+                file_type = result.file_type
+                if not file_type:
+                    file_type = file_type_from_url(url)
+                # if file_type not in self.expected_file_types:
+                if not check_file_type(file_type):
+                    # string = self.expected_file_types.join(", ")
+                    filelist = [str(member.value) for member in FileTypes]
+                    string = ''.join(filelist)
+                    raise LoaderError(f"Expected file types: {string}, but got: {file_type}")
+
+                if self.verbose:
+                    logger.info(f"Successfully loaded file from {url}")
+                return (file_content, file_type)
+                
+            else:
+                logger.error(f"Request failed to load file from {url} and got status code {result.status_code}")
+
+        except Exception as e:
+            logger.error(f"Failed to load file from {url}")
+            logger.error(e)
+        return None
+
+    def record_loaded(self, file: Tuple[Any, str], documents: int):
+        # Called before the download is closed, its size is no longer known afterwards
+        LOADER_BYTES.labels(file[1]).inc(measure(file[0])[1])
+        LOADER_DOCUMENTS.labels(file[1]).inc(documents)
+
+    def load(self, tool_files: List[ToolFile]) -> List[Document]:
+        queued_files = []
+        documents = []
+        download_targets, youtube_files = self.download_targets(tool_files)
+        
+        # All files of the request are downloaded concurrently over the shared session
+        with trace_stage("download", download_targets) as stage:
+            results = self.downloader.download_all(download_targets)
+            stage.output(results)
+        
+        for (url, _), result in zip(download_targets, results):
+            file = self.downloaded_file(url, result)
+            if file is not None:
+                # Append to Queue
+                queued_files.append(file)
+        report_progress("downloaded", files=len(queued_files))
         if youtube_files:
             yt_loader = YouTubeTranscriptLoader(verbose=self.verbose)
             docs = yt_loader.load(youtube_files)
+            LOADER_DOCUMENTS.labels("youtube").inc(len(docs))
             if self.verbose:
                 print(f"Documents from YouTube loader: {len(docs)}")
                 documents.extend(docs)
@@ -449,34 +882,102 @@ class URLLoader():
         # Pass Queue to the file loader if there are any successful loads
         if len(queued_files) > 0:
             documents = []
-            for file in queued_files: # run each file one by one
-                loader = self.loader_dict[file[1]]
-                # loader = self.loader_dict[FileTypes.file[1]]
-                file_loader = loader([file])
-                try:
-                    documents.extend(file_loader.load())
-                    if self.verbose:
-                        logger.info(f"Loaded {len(documents)} documents")
-                except: # some error
-                    continue
+            try:
+                with trace_stage("parse", queued_files) as stage:
+                    for file, file_documents in zip(queued_files, self.parse_files(queued_files)):
+                        self.record_loaded(file, len(file_documents))
+                        documents.extend(file_documents)
+                    stage.output(documents)
+            finally:
+                # Drops the spooled downloads, memory and temporary files, as soon as they are parsed
+                for file_content, _ in queued_files:
+                    file_content.close()
+            if self.verbose:
+                logger.info(f"Loaded {len(documents)} documents")
+            report_progress("parsed", documents=len(documents))
         else:
             raise LoaderError("Unable to load any files from URLs")
 
         return documents
+
+    def iter_parse_file(self, file: Tuple[Any, str]) -> Iterator[Document]:
+        """Like `parse_file`, but yields the documents as the loader produces them."""
+        cache_key, documents = self.cached_documents(file)
+        if documents is not MISSING:
+            yield from documents
+            return
+        documents = []
+        for document in self.loader_dict[file[1]]([file]).lazy_load():
+            documents.append(document)
+            yield document
+        self.cache_documents(cache_key, documents)
+
+    def lazy_load(self, tool_files: List[ToolFile]) -> Iterator[Document]:
+        """
+        Yields the documents of every file as soon as the file is downloaded and parsed, while the files
+        after it are still downloading. Files of a `batched` loader are parsed together after the last
+        download, and YouTube transcripts come last.
+
+        Unlike `load`, which drops a file that fails to parse, a file that fails partway keeps the documents
+        it yielded before the error, they may already be embedded. Those partial documents are not cached.
+        """
+        download_targets, youtube_files = self.download_targets(tool_files)
+        loaded_files = 0
+        documents = 0
+        batched_files = []
+        try:
+            for (url, _), result in zip(download_targets, self.downloader.iter_downloads(download_targets)):
+                file = self.downloaded_file(url, result)
+                if file is None:
+                    continue
+                loaded_files += 1
+                if getattr(self.loader_dict[file[1]], "batched", False):
+                    batched_files.append(file)
+                    continue
+                file_documents = 0
+                try:
+                    for document in self.iter_parse_file(file):
+                        file_documents += 1
+                        yield document
+                except Exception as e:
+                    logger.error(f"Failed to parse {file[1]} file: {e}")
+                finally:
+                    documents += file_documents
+                    self.record_loaded(file, file_documents)
+                    file[0].close()
+            report_progress("downloaded", files=loaded_files)
+
+            for file, file_documents in zip(batched_files, self.parse_files(batched_files)):
+                self.record_loaded(file, len(file_documents))
+                documents += len(file_documents)
+                yield from file_documents
+
+            if youtube_files:
+                youtube_documents = YouTubeTranscriptLoader(verbose=self.verbose).load(youtube_files)
+                LOADER_DOCUMENTS.labels("youtube").inc(len(youtube_documents))
+                for document in youtube_documents:
+                    documents += 1
+                    yield document
+        finally:
+            for file_content, _ in batched_files:
+                file_content.close()
+
+        if not loaded_files and not youtube_files:
+            raise LoaderError("Unable to load any files from URLs")
+        report_progress("parsed", documents=documents)
   
 class RAGpipeline:
-    def __init__(self, loader=None, splitter=None, vectorstore_class=None, embedding_model=None, verbose=False):
-        default_config = {
-            "loader": URLLoader(verbose = verbose),
-            "splitter": RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100),
-            "vectorstore_class": Chroma,
-            "embedding_model": VertexAIEmbeddings(model='textembedding-gecko')
-        }
-        self.loader = loader or default_config["loader"]
-        self.splitter = splitter or default_config["splitter"]
-        self.vectorstore_class = vectorstore_class or default_config["vectorstore_class"]
-        self.embedding_model = embedding_model or default_config["embedding_model"]
+    def __init__(self, loader=None, splitter=None, vectorstore_class=None, embedding_model=None, verbose=False,
+                 streaming: bool = RAG_STREAMING, queue_size: int = RAG_STREAM_QUEUE_SIZE, batch_size: int = RAG_STREAM_BATCH_SIZE):
+        # Defaults are only built when the caller does not provide its own, model clients come from the shared registry
+        self.loader = loader or URLLoader(verbose = verbose)
+        self.splitter = splitter or RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        self.vectorstore_class = vectorstore_class or VECTORSTORE_CLASSES[QUIZ_VECTORSTORE]
+        self.embedding_model = embedding_model or get_cached_embeddings('textembedding-gecko')
         self.verbose = verbose
+        self.streaming = streaming
+        self.queue_size = queue_size
+        self.batch_size = batch_size
 
     def load_PDFs(self, files) -> List[Document]:
         if self.verbose:
@@ -501,19 +1002,35 @@ class RAGpipeline:
         total_chunks = []
         chunks = self.splitter.split_documents(loaded_documents)
         total_chunks.extend(chunks)
+        SPLIT_CHUNKS.inc(len(chunks))
         
         if self.verbose: logger.info(f"Split {len(loaded_documents)} documents into {len(total_chunks)} chunks")
         
         return total_chunks
 
+    def new_vectorstore(self, documents: List[Document]):
+        # A collection of its own per request, concurrent quizzes share Chroma's in-process client
+        # and would otherwise retrieve, and delete, each other's chunks
+        def create():
+            return self.vectorstore_class.from_documents(documents, self.embedding_model, collection_name=f"quiz-{uuid.uuid4().hex}")
+
+        if self.vectorstore_class in _READY_VECTORSTORES:
+            return create()
+        # Chroma sets up its shared in-process system with the first client, which fails when two requests race to it
+        with _VECTORSTORE_SETUP_LOCK:
+            store = create()
+            _READY_VECTORSTORES.add(self.vectorstore_class)
+        return store
+
     def create_vectorstore(self, documents: List[Document]):
         if self.verbose:
             logger.info(f"Creating vectorstore from {len(documents)} documents")
             for document in documents:
                 logger.info(document)
         try:
-            self.vectorstore = self.vectorstore_class.from_documents(documents, self.embedding_model)
+            self.vectorstore = self.new_vectorstore(documents)
             logger.info(f"Vectorstore created")
+            report_progress("embedded", chunks=len(documents))
         except Exception as e:
             logger.error(f"Error creating vectorstore: {e}")
             raise  # Rethrow the exception to handle it further
@@ -523,13 +1040,71 @@ class RAGpipeline:
         
         return self.vectorstore
     
+    def stream_vectorstore(self, files):
+        """
+        Builds the vectorstore while the files are still loading: documents are split as the loader yields
+        them and the chunks are embedded in batches of `batch_size`. Loading and splitting run on their own
+        threads, at most `queue_size` documents and chunks ahead of the embedding. These are two threads per
+        request on top of the ExecutionPool worker running it, they are not counted against its limits.
+        """
+        # Set when the embedding ends, so the split stage stops waiting for the loader's next document
+        stop = threading.Event()
+        documents = prefetch(self.loader.lazy_load(files), self.queue_size, name="rag-load", stop=stop)
+        chunks = prefetch(
+            (chunk for document in documents for chunk in self.split_document(document)),
+            self.queue_size, name="rag-split", stop=stop
+        )
+        self.vectorstore = None
+        embedded = 0
+        try:
+            batch = []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) == self.batch_size:
+                    self.add_to_vectorstore(batch)
+                    embedded += len(batch)
+                    batch = []
+            if batch or self.vectorstore is None:
+                self.add_to_vectorstore(batch)
+                embedded += len(batch)
+        except LoaderError as e:
+            logger.error(f"Loader experienced error: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error creating vectorstore: {e}")
+            raise
+        finally:
+            stop.set()
+            chunks.close()
+            documents.close()
+
+        logger.info(f"Vectorstore created")
+        if self.verbose: logger.info(f"Embedded {embedded} chunks while loading")
+        report_progress("embedded", chunks=embedded)
+        return self.vectorstore
+
+    def split_document(self, document: Document) -> List[Document]:
+        with trace_stage("split", document) as stage:
+            chunks = self.splitter.split_documents([document])
+            stage.output(chunks)
+        SPLIT_CHUNKS.inc(len(chunks))
+        return chunks
+
+    def add_to_vectorstore(self, chunks: List[Document]):
+        # Summed over the batches into one "embed" stage of the trace
+        with trace_stage("embed", chunks):
+            if self.vectorstore is None:
+                self.vectorstore = self.new_vectorstore(chunks)
+            else:
+                self.vectorstore.add_documents(chunks)
+
     def compile(self):
         # Compile the pipeline
-        self.load_PDFs = RAGRunnable(self.load_PDFs)
+        self.load_PDFs = RAGRunnable(self.load_PDFs, name="load")
         logger.info("Completed loading PDFs")
-        self.split_loaded_documents = RAGRunnable(self.split_loaded_documents)
+        self.split_loaded_documents = RAGRunnable(self.split_loaded_documents, name="split")
         logger.info("Completed splitting loaded documents")
-        self.create_vectorstore = RAGRunnable(self.create_vectorstore)
+        self.create_vectorstore = RAGRunnable(self.create_vectorstore, name="embed")
         if self.verbose: logger.info(f"Completed pipeline compilation")
     
     def __call__(self, documents):
@@ -539,48 +1114,139 @@ class RAGpipeline:
             logger.info(f"Executing pipeline")
             logger.info(f"Start of Pipeline received: {len(documents)} documents of type {type(documents[0])}")
         
+        if self.streaming:
+            with trace_stage("ingest", documents) as stage:
+                vectorstore = self.stream_vectorstore(documents)
+                stage.output(vectorstore)
+            return vectorstore
+
         pipeline = self.load_PDFs | self.split_loaded_documents | self.create_vectorstore
         return pipeline(documents)
 
 class QuizBuilder:
-    def __init__(self, vectorstore, topic, prompt=None, model=None, parser=None, verbose=False):
-        default_config = {
-            "model": VertexAI(model="gemini-1.0-pro"), 
-            "parser": JsonOutputParser(pydantic_object=QuizQuestion),
-            "prompt": read_text_file("prompt/quizzify-prompt.txt")
-        }
-        
-        self.prompt = prompt or default_config["prompt"]
-        self.model = model or default_config["model"]
-        self.parser = parser or default_config["parser"]
+    """
+    Generates quiz questions about a topic from the documents in a vectorstore.
+
+    With `max_concurrency` above 1 the attempts are issued in parallel waves instead of one
+    after another, so a quiz takes roughly num_questions / max_concurrency LLM round trips.
+
+    The vectorstore is searched once per quiz for `retrieval_k` diverse (MMR) chunks and every
+    question slot is prompted with its own window of `context_chunks` of them. Questions whose
+    normalized words overlap an accepted question by `duplicate_threshold` or more are rejected.
+    """
+    def __init__(self, vectorstore, topic, prompt=None, model=None, parser=None, verbose=False, max_concurrency=QUIZ_MAX_CONCURRENCY,
+                 generation_mode=None, batch_prompt=None, batch_rounds=QUIZ_BATCH_ROUNDS, retrieval_k=QUIZ_RETRIEVAL_K,
+                 context_chunks=QUIZ_CONTEXT_CHUNKS, duplicate_threshold=QUIZ_DUPLICATE_THRESHOLD):
+        self.prompt = prompt or read_text_file("prompt/quizzify-prompt.txt")
+        self.batch_prompt = batch_prompt or read_text_file("prompt/quizzify-batch-prompt.txt")
+        self.model = model or get_llm("gemini-1.0-pro")
+        self.parser = parser or JsonOutputParser(pydantic_object=QuizQuestion)
         
         self.vectorstore = vectorstore
         self.topic = topic
         self.verbose = verbose
+        self.max_concurrency = max(1, max_concurrency)
+        self.generation_mode = generation_mode or QUIZ_GENERATION_MODE
+        self.batch_rounds = batch_rounds
+        self.retrieval_k = retrieval_k
+        self.context_chunks = max(1, context_chunks)
+        self.duplicate_threshold = duplicate_threshold
+        self.context_documents = None
         
         if vectorstore is None: raise ValueError("Vectorstore must be provided")
         if topic is None: raise ValueError("Topic must be provided")
+        if self.generation_mode not in QUIZ_GENERATION_MODES:
+            raise ValueError(f"Generation mode must be one of {', '.join(QUIZ_GENERATION_MODES)}")
     
     def compile(self):
         # Return the chain
+        # The context is retrieved once per quiz and passed in with the topic, see question_inputs
         prompt = PromptTemplate(
             template=self.prompt,
-            input_variables=["topic"],
+            input_variables=["topic", "context"],
             partial_variables={"format_instructions": self.parser.get_format_instructions()}
         )
         
-        retriever = self.vectorstore.as_retriever()
+        chain = prompt | self.model | self.parser
         
-        runner = RunnableParallel(
-            {"context": retriever, "topic": RunnablePassthrough()}
+        if self.verbose: logger.info(f"Chain compilation complete")
+        
+        return chain
+
+    def compile_batch(self):
+        # One call asks for several questions, the retrieved context is sent once for all of them
+        prompt = PromptTemplate(
+            template=self.batch_prompt,
+            input_variables=["topic", "num_questions", "existing_questions", "context"]
         )
         
-        chain = runner | prompt | self.model | self.parser
+        chain = prompt | self.model | JsonOutputParser()
         
-        if self.verbose: logger.info(f"Chain compilation complete")
+        if self.verbose: logger.info(f"Batch chain compilation complete")
         
         return chain
 
+    def retrieve_context(self) -> List[Document]:
+        """Searches the vectorstore once per quiz, preferring diverse chunks (MMR) over the plain top-k."""
+        if self.context_documents is None:
+            try:
+                self.context_documents = self.vectorstore.max_marginal_relevance_search(
+                    self.topic, k=self.retrieval_k, fetch_k=self.retrieval_k * 3
+                )
+            except (AttributeError, NotImplementedError):
+                self.context_documents = self.vectorstore.similarity_search(self.topic, k=self.retrieval_k)
+            if self.verbose: logger.info(f"Retrieved {len(self.context_documents)} chunks for the quiz")
+        return self.context_documents
+
+    def context_for_slot(self, slot: int, num_slots: int) -> str:
+        # Slots start at evenly spaced chunks, so neighbouring questions are grounded in different parts of the documents
+        documents = self.retrieve_context()
+        if not documents:
+            return ""
+        size = min(self.context_chunks, len(documents))
+        start = slot % num_slots * len(documents) // num_slots
+        window = [documents[(start + offset) % len(documents)] for offset in range(size)]
+        return "\n\n".join(document.page_content for document in window)
+
+    def question_inputs(self, attempt: int, num_questions: int) -> Dict[str, Any]:
+        return {"topic": self.topic, "context": self.context_for_slot(attempt, num_questions)}
+
+    def batch_inputs(self, num_questions: int, generated_questions: List[Dict]) -> Dict[str, Any]:
+        existing_questions = json.dumps([question["question"] for question in generated_questions]) if generated_questions else "none"
+        context = "\n\n".join(document.page_content for document in self.retrieve_context())
+        return {"topic": self.topic, "num_questions": num_questions, "existing_questions": existing_questions, "context": context}
+
+    @staticmethod
+    def question_words(question: str) -> set:
+        return set(re.sub(r"[^a-z0-9]+", " ", question.lower()).split())
+
+    def is_duplicate(self, response: Dict, generated_questions: List[Dict]) -> bool:
+        words = self.question_words(str(response["question"]))
+        for question in generated_questions:
+            other = self.question_words(str(question["question"]))
+            union = words | other
+            if not union or len(words & other) / len(union) >= self.duplicate_threshold:
+                return True
+        return False
+
+    def add_batch(self, response, generated_questions: List[Dict], num_questions: int, batch_round: int) -> bool:
+        """
+        Validates every item of a batch response and keeps the valid ones, up to `num_questions` in total.
+        Returns False when the response is not a JSON array of questions at all.
+        """
+        if isinstance(response, dict):
+            # Models sometimes wrap the array, e.g. {"questions": [...]}
+            response = next((value for value in response.values() if isinstance(value, list)), response)
+        if not isinstance(response, list):
+            logger.warning(f"Batch response {batch_round} is not a JSON array: {response}")
+            return False
+
+        for attempt, item in enumerate(response, start=1):
+            if len(generated_questions) >= num_questions:
+                break
+            self.add_question(item, generated_questions, attempt, len(response), num_questions)
+        return True
+
     def validate_response(self, response: Dict) -> bool:
         try:
             # Assuming the response is already a dictionary
@@ -600,6 +1266,96 @@ class QuizBuilder:
 
     def format_choices(self, choices: Dict[str, str]) -> List[Dict[str, str]]:
         return [{"key": k, "value": v} for k, v in choices.items()]
+
+    def add_question(self, response, generated_questions: List[Dict], attempt: int, max_attempts: int, num_questions: int) -> bool:
+        """Validates one attempt and appends it to `generated_questions`. A failed chain call counts as an invalid attempt."""
+        if isinstance(response, Exception):
+            logger.warning(f"Question generation failed on attempt {attempt} of {max_attempts}: {response}")
+            return False
+
+        if self.verbose:
+            logger.info(f"Generated response attempt {attempt}: {response}")
+        
+        # Directly check if the response format is valid
+        if not self.validate_response(response):
+            if self.verbose:
+                logger.warning(f"Invalid response format. Attempt {attempt} of {max_attempts}")
+            return False
+
+        if self.is_duplicate(response, generated_questions):
+            if self.verbose:
+                logger.warning(f"Duplicate question rejected. Attempt {attempt} of {max_attempts}")
+            return False
+
+        response["choices"] = self.format_choices(response["choices"])
+        generated_questions.append(response)
+        report_progress("question", current=len(generated_questions), total=num_questions)
+        if self.verbose:
+            logger.info(f"Valid question added: {response}")
+            logger.info(f"Total generated questions: {len(generated_questions)}")
+        return True
+
+    def invoke_safely(self, chain, inputs):
+        try:
+            return chain.invoke(inputs)
+        except Exception as e:
+            return e
+
+    def finish(self, generated_questions: List[Dict], num_questions: int) -> List[Dict]:
+        # Log if fewer questions are generated
+        if len(generated_questions) < num_questions:
+            logger.warning(f"Only generated {len(generated_questions)} out of {num_questions} requested questions")
+        
+        if self.verbose: logger.info(f"Deleting vectorstore")
+        self.vectorstore.delete_collection()
+        
+        # Return the list of questions
+        return generated_questions[:num_questions]
+    
+    def generate_per_question(self, num_questions: int, generated_questions: List[Dict]) -> List[Dict]:
+        chain = self.compile()
+        
+        attempts = 0
+        max_attempts = num_questions * 10  # Allow for more attempts to generate questions
+
+        while len(generated_questions) < num_questions and attempts < max_attempts:
+            # Each wave only asks for the questions still missing, so no attempt is started once the quiz is complete
+            wave_size = min(num_questions - len(generated_questions), self.max_concurrency, max_attempts - attempts)
+            wave_inputs = [self.question_inputs(attempts + offset, num_questions) for offset in range(wave_size)]
+            if wave_size == 1:
+                responses = [self.invoke_safely(chain, wave_inputs[0])]
+            else:
+                # chain.batch would hand the whole wave to a single LLM generate call, which most
+                # providers run prompt by prompt, so each attempt is invoked on its own thread instead
+                with get_executor_for_config({"max_concurrency": wave_size}) as pool:
+                    responses = list(pool.map(lambda inputs: self.invoke_safely(chain, inputs), wave_inputs))
+
+            for response in responses:
+                # Move to the next attempt regardless of success to ensure progress
+                attempts += 1
+                self.add_question(response, generated_questions, attempts, max_attempts, num_questions)
+
+        return generated_questions
+
+    def generate_batch(self, num_questions: int, generated_questions: List[Dict]) -> List[Dict]:
+        chain = self.compile_batch()
+
+        for batch_round in range(1, self.batch_rounds + 1):
+            missing = num_questions - len(generated_questions)
+            if missing <= 0:
+                break
+            # Follow-up rounds only ask for the items that were invalid or missing
+            response = self.invoke_safely(chain, self.batch_inputs(missing, generated_questions))
+            if isinstance(response, Exception):
+                logger.warning(f"Batch generation failed on round {batch_round}: {response}")
+                break
+            if not self.add_batch(response, generated_questions, num_questions, batch_round):
+                break
+
+        if len(generated_questions) < num_questions:
+            logger.info(f"Falling back to per question generation for {num_questions - len(generated_questions)} questions")
+            self.generate_per_question(num_questions, generated_questions)
+        return generated_questions
     
     def create_questions(self, num_questions: int = 5) -> List[Dict]:
         if self.verbose: logger.info(f"Creating {num_questions} questions")
@@ -607,40 +1363,83 @@ class QuizBuilder:
         if num_questions > 10:
             return {"message": "error", "data": "Number of questions cannot exceed 10"}
         
+        generated_questions = []
+        if self.generation_mode == "batch":
+            self.generate_batch(num_questions, generated_questions)
+        else:
+            self.generate_per_question(num_questions, generated_questions)
+
+        return self.finish(generated_questions, num_questions)
+
+    async def agenerate_per_question(self, num_questions: int, generated_questions: List[Dict]) -> List[Dict]:
+        """
+        Keeps up to `max_concurrency` attempts in flight and cancels the ones still running
+        as soon as enough valid questions exist.
+        """
         chain = self.compile()
         
-        generated_questions = []
         attempts = 0
-        max_attempts = num_questions * 10  # Allow for more attempts to generate questions
+        issued = 0
+        max_attempts = num_questions * 10
+        in_flight = set()
+        await asyncio.to_thread(self.retrieve_context)
 
-        while len(generated_questions) < num_questions and attempts < max_attempts:
-            response = chain.invoke(self.topic)
-            if self.verbose:
-                logger.info(f"Generated response attempt {attempts + 1}: {response}")
-            
-            # Directly check if the response format is valid
-            if self.validate_response(response):
-                response["choices"] = self.format_choices(response["choices"])
-                generated_questions.append(response)
-                if self.verbose:
-                    logger.info(f"Valid question added: {response}")
-                    logger.info(f"Total generated questions: {len(generated_questions)}")
-            else:
-                if self.verbose:
-                    logger.warning(f"Invalid response format. Attempt {attempts + 1} of {max_attempts}")
-            
-            # Move to the next attempt regardless of success to ensure progress
-            attempts += 1
+        try:
+            while len(generated_questions) < num_questions and (in_flight or attempts < max_attempts):
+                # Top up until the in-flight attempts could complete the quiz, within the concurrency limit
+                while (attempts + len(in_flight) < max_attempts and len(in_flight) < self.max_concurrency
+                       and len(in_flight) < num_questions - len(generated_questions)):
+                    in_flight.add(asyncio.ensure_future(chain.ainvoke(self.question_inputs(issued, num_questions))))
+                    issued += 1
+
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempts += 1
+                    response = task.exception() or task.result()
+                    self.add_question(response, generated_questions, attempts, max_attempts, num_questions)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+        return generated_questions
+
+    async def agenerate_batch(self, num_questions: int, generated_questions: List[Dict]) -> List[Dict]:
+        chain = self.compile_batch()
+
+        for batch_round in range(1, self.batch_rounds + 1):
+            missing = num_questions - len(generated_questions)
+            if missing <= 0:
+                break
+            inputs = await asyncio.to_thread(self.batch_inputs, missing, generated_questions)
+            try:
+                response = await chain.ainvoke(inputs)
+            except Exception as e:
+                logger.warning(f"Batch generation failed on round {batch_round}: {e}")
+                break
+            if not self.add_batch(response, generated_questions, num_questions, batch_round):
+                break
 
-        # Log if fewer questions are generated
         if len(generated_questions) < num_questions:
-            logger.warning(f"Only generated {len(generated_questions)} out of {num_questions} requested questions")
+            logger.info(f"Falling back to per question generation for {num_questions - len(generated_questions)} questions")
+            await self.agenerate_per_question(num_questions, generated_questions)
+        return generated_questions
+
+    async def acreate_questions(self, num_questions: int = 5) -> List[Dict]:
+        """Async version of create_questions."""
+        if self.verbose: logger.info(f"Creating {num_questions} questions")
         
-        if self.verbose: logger.info(f"Deleting vectorstore")
-        self.vectorstore.delete_collection()
+        if num_questions > 10:
+            return {"message": "error", "data": "Number of questions cannot exceed 10"}
         
-        # Return the list of questions
-        return generated_questions[:num_questions]
+        generated_questions = []
+        if self.generation_mode == "batch":
+            await self.agenerate_batch(num_questions, generated_questions)
+        else:
+            await self.agenerate_per_question(num_questions, generated_questions)
+
+        return self.finish(generated_questions, num_questions)
 
 class QuestionChoice(BaseModel):
     key: str = Field(description="A unique identifier for the choice using letters A, B, C, D, etc.")
@@ -1,10 +1,18 @@
-from fastapi import FastAPI, Request, Depends
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from api.router import router
+from api.tool_utilities import tools_config, execute_tool_async
+from services.execution import ExecutionPool
+from services.jobs import JobQueue
+from services.tool_registry import ToolRegistry
+from features.quizzify.process_pool import shutdown_process_pool
 from services.logger import setup_logger
+from services.tracing import request_trace
+from services.metrics import MetricsMiddleware
 from api.error_utilities import ErrorResponse
 
 logger = setup_logger(__name__)
@@ -12,10 +20,23 @@ logger = setup_logger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info(f"Initializing Application Startup")
+    app.state.tool_registry = ToolRegistry.from_environment(tools_config)
+    app.state.execution_pool = ExecutionPool.from_tools_config(tools_config)
+    
+    async def run_tool_job(tool_id, inputs):
+        with request_trace(tool_id):
+            result = await execute_tool_async(tool_id, inputs, app.state.execution_pool, app.state.tool_registry)
+        return jsonable_encoder(result)
+    
+    app.state.job_queue = JobQueue.from_environment(run_tool_job)
+    app.state.job_queue.start()
     logger.info(f"Successfully Completed Application Startup")
     
     yield
     logger.info("Application shutdown")
+    await app.state.job_queue.stop()
+    app.state.execution_pool.shutdown()
+    shutdown_process_pool()
 
 app = FastAPI(lifespan = lifespan)
 app.add_middleware(
@@ -25,6 +46,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it is the outermost middleware and times everything below it
+app.add_middleware(MetricsMiddleware)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -0,0 +1,327 @@
+import base64
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from langchain_core.documents import Document
+from services.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MISSING = object()
+
+# The disk tiers are opt-in: unset, every cache stays in memory. On App Engine /tmp is memory-backed anyway.
+CACHE_DIR = os.environ.get("CACHE_DIR", "")
+
+def make_private_dir(path: str):
+    """Creates the cache directory readable by this user only, and refuses one that others can write to."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.stat(path).st_mode & 0o022:
+        raise PermissionError(f"Cache directory {path} is writable by other users")
+
+# Tags of the values JSON has no type for. A dict that uses one of them as its only key is wrapped in "__dict__".
+_TAGS = ("__tuple__", "__bytes__", "__document__", "__dict__")
+
+def to_json(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    if isinstance(value, tuple):
+        return {"__tuple__": [to_json(item) for item in value]}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, Document):
+        return {"__document__": [value.page_content, to_json(value.metadata)]}
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError("Only dicts with string keys can be cached")
+        encoded = {key: to_json(item) for key, item in value.items()}
+        return {"__dict__": encoded} if len(value) == 1 and next(iter(value)) in _TAGS else encoded
+    raise TypeError(f"Values of type {type(value).__name__} cannot be cached")
+
+def from_json(value: Any) -> Any:
+    if isinstance(value, list):
+        return [from_json(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        tag, content = next(iter(value.items()))
+        if tag == "__tuple__":
+            return tuple(from_json(item) for item in content)
+        if tag == "__bytes__":
+            return base64.b64decode(content)
+        if tag == "__document__":
+            return Document(page_content=content[0], metadata=from_json(content[1]))
+        if tag == "__dict__":
+            return {key: from_json(item) for key, item in content.items()}
+    return {key: from_json(item) for key, item in value.items()}
+
+def value_size(value: Any) -> int:
+    """Approximate memory held by a cached value, counting the strings, bytes and containers it is made of."""
+    if isinstance(value, Document):
+        return sys.getsizeof(value.page_content) + value_size(value.metadata)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(value_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(key) + value_size(item) for key, item in value.items())
+    return sys.getsizeof(value)
+
+class CacheStats:
+    """Hit and miss counters for a cache tier."""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "hit_ratio": self.hit_ratio}
+
+class LRUCache:
+    """
+    In-memory cache with least-recently-used eviction and an optional TTL.
+
+    Parameters:
+    max_items (int): Maximum number of entries kept.
+    ttl (float): Seconds an entry stays valid, None to keep entries until evicted.
+    max_bytes (int): Upper bound on the total `value_size` of the entries, None for no bound.
+    """
+    def __init__(self, max_items: int = 256, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.stats.misses += 1
+            return default
+
+    def set(self, key: str, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        size = value_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                logger.warning(f"Not caching {key}, {size} bytes exceeds the cache budget")
+                return
+            self._entries[key] = (value, expires_at, size)
+            self.total_bytes += size
+            while len(self._entries) > self.max_items or (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def _remove(self, key: str):
+        self.total_bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCache:
+    """
+    Disk-backed cache stored in a single SQLite file.
+
+    Values are stored as zlib-compressed JSON, never pickled, so whoever can write the file cannot
+    make the server run code. Besides JSON's types, tuples, bytes and Documents can be stored. When the stored bytes exceed `max_bytes` the least
+    recently accessed entries are removed first.
+
+    Parameters:
+    path (str): Location of the SQLite database.
+    max_bytes (int): Upper bound on the total size of the stored values.
+    ttl (float): Seconds an entry stays valid, None to keep entries until evicted.
+    """
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        make_private_dir(os.path.dirname(path) or ".")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, size INTEGER, "
+                "created_at REAL, accessed_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        return zlib.compress(json.dumps(to_json(value), separators=(",", ":")).encode("utf-8"))
+
+    @staticmethod
+    def loads(blob: bytes) -> Any:
+        return from_json(json.loads(zlib.decompress(blob)))
+
+    def get(self, key: str, default=MISSING):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and row[1] + self.ttl <= now:
+                with self._conn:
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.stats.misses += 1
+                return default
+            with self._conn:
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+        try:
+            return self.loads(row[0])
+        except Exception as e:
+            logger.error(f"Dropping unreadable cache entry {key}: {e}")
+            self.delete(key)
+            return default
+
+    def set(self, key: str, value: Any):
+        blob = self.dumps(value)
+        if len(blob) > self.max_bytes:
+            logger.warning(f"Not caching {key}, {len(blob)} bytes exceeds the cache budget")
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.stats.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class TieredCache:
+    """
+    An LRU+TTL memory tier in front of a SQLite tier. Disk hits are promoted to memory.
+
+    Parameters:
+    name (str): Name reported in the cache statistics.
+    memory (LRUCache): The in-memory front tier.
+    disk (SQLiteCache): The persistent tier, optional.
+    """
+    def __init__(self, name: str, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+        self.stats = CacheStats()
+
+    def get(self, key: str, default=MISSING):
+        value = self.memory.get(key)
+        if value is MISSING and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not MISSING:
+                self.memory.set(key, value)
+        if value is MISSING:
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except Exception as e:
+                logger.error(f"Failed to write {key} to the {self.name} disk cache: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats_dict(self) -> Dict[str, Any]:
+        stats = {"name": self.name, **self.stats.as_dict(), "memory": {**self.memory.stats.as_dict(), "bytes": self.memory.total_bytes}}
+        if self.disk is not None:
+            stats["disk"] = {**self.disk.stats.as_dict(), "bytes": self.disk.total_bytes()}
+        return stats
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+_stats_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+def register_stats(name: str, provider: Callable[[], Dict[str, Any]]):
+    """Adds a cache that is not a TieredCache, such as the embedding cache, to cache_stats()."""
+    _stats_providers[name] = provider
+
+def get_cache(name: str, max_items: int = 256, memory_ttl: Optional[float] = 3600, disk_ttl: Optional[float] = None, max_bytes: Optional[int] = None) -> TieredCache:
+    """
+    Returns the named process-wide tiered cache, creating it on first use.
+
+    The SQLite tier lives in CACHE_DIR and is sized by CACHE_MAX_BYTES unless `max_bytes` is given.
+    Without CACHE_DIR every cache is kept in memory only, and `max_bytes` bounds the memory tier instead.
+    """
+    cache = _caches.get(name)
+    if cache is not None:
+        return cache
+    with _caches_lock:
+        if name not in _caches:
+            disk = None
+            if CACHE_DIR:
+                try:
+                    disk = SQLiteCache(
+                        os.path.join(CACHE_DIR, f"{name}.sqlite3"),
+                        max_bytes=max_bytes or int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+                        ttl=disk_ttl
+                    )
+                except PermissionError as e:
+                    logger.error(f"Keeping the {name} cache in memory: {e}")
+            memory = LRUCache(max_items=max_items, ttl=memory_ttl, max_bytes=max_bytes if disk is None else None)
+            _caches[name] = TieredCache(name, memory, disk)
+        return _caches[name]
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics of every named cache, keyed by cache name."""
+    stats = {name: cache.stats_dict() for name, cache in list(_caches.items())}
+    stats.update({name: provider() for name, provider in list(_stats_providers.items())})
+    return stats
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from services import cache as cache_module
+from services.cache import CacheStats, register_stats
+from services.logger import setup_logger
+from services.metrics import EMBEDDED_TEXTS, record_model_call
+from services.models import get_embeddings
+
+logger = setup_logger(__name__)
+
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+EMBEDDING_CACHE_DTYPE = os.environ.get("EMBEDDING_CACHE_DTYPE", "float32")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+
+class EmbeddingStore:
+    """
+    Stores embedding vectors as raw float32 or float16 blobs in SQLite.
+
+    Entries are evicted least recently used first once the stored bytes exceed `max_bytes`.
+    A path of ":memory:" keeps the store in memory.
+    """
+    def __init__(self, path: str, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES, dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            cache_module.make_private_dir(os.path.dirname(path) or ".")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB, dtype TEXT, size INTEGER, accessed_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_accessed ON vectors (accessed_at)")
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM vectors").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        now = time.time()
+        with self._lock, self._conn:
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob, dtype in self._conn.execute(
+                    f"SELECT key, vector, dtype FROM vectors WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=dtype)
+                if found:
+                    self._conn.execute(
+                        f"UPDATE vectors SET accessed_at = ? WHERE key IN ({placeholders})", (now, *batch)
+                    )
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]):
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=self.dtype).tobytes()
+            rows.append((key, blob, self.dtype.str, len(blob), now))
+        with self._lock, self._conn:
+            for key, *_ in rows:
+                existing = self._conn.execute("SELECT size FROM vectors WHERE key = ?", (key,)).fetchone()
+                if existing:
+                    self._total_bytes -= existing[0]
+            self._conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?, ?)", rows)
+            self._total_bytes += sum(row[3] for row in rows)
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM vectors ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM vectors WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self.evictions += 1
+            if self._total_bytes <= self.max_bytes:
+                break
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model and caches vectors by (model name, chunk text hash).
+
+    Only the texts missing from the cache are sent to the backend, deduplicated and in batches
+    of `batch_size`, so re-uploading a document re-embeds nothing.
+
+    Parameters:
+    model_name (str): Part of the cache key, so different models never share vectors.
+    store (EmbeddingStore): Where vectors are kept.
+    embeddings (Embeddings): The backend embedding model, by default the model registry's client for `model_name`.
+    batch_size (int): Maximum number of texts per backend call.
+    """
+    def __init__(self, model_name: str, store: EmbeddingStore, embeddings: Optional[Embeddings] = None, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name
+        self.store = store
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.stats = CacheStats()
+
+    @property
+    def backend(self) -> Embeddings:
+        # Resolved per call so a swapped model provider is picked up
+        return self.embeddings or get_embeddings(self.model_name)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def call_backend(self, method: str, texts):
+        # Only cache misses reach the model, so these are the calls that cost time and quota
+        start = time.perf_counter()
+        try:
+            result = getattr(self.backend, method)(texts)
+        except Exception:
+            record_model_call("embeddings", self.model_name, time.perf_counter() - start, error=True)
+            raise
+        record_model_call("embeddings", self.model_name, time.perf_counter() - start)
+        EMBEDDED_TEXTS.labels(self.model_name).inc(len(texts) if isinstance(texts, list) else 1)
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(text) for text in texts]
+        found = self.store.get_many(list(set(keys)))
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+                missing.setdefault(key, text)
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            vectors = self.call_backend("embed_documents", [missing[key] for key in batch_keys])
+            computed = dict(zip(batch_keys, vectors))
+            self.store.set_many(computed)
+            found.update(computed)
+
+        return [np.asarray(found[key], dtype=np.float32).tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.key(text)
+        found = self.store.get_many([key])
+        if key in found:
+            self.stats.hits += 1
+            return np.asarray(found[key], dtype=np.float32).tolist()
+        self.stats.misses += 1
+        vector = self.call_backend("embed_query", text)
+        self.store.set_many({key: vector})
+        return vector
+
+    def stats_dict(self):
+        return {"name": f"embeddings:{self.model_name}", **self.stats.as_dict(),
+                "evictions": self.store.evictions, "bytes": self.store.total_bytes}
+
+_cached_embeddings: Dict[str, CachedEmbeddings] = {}
+_cached_embeddings_lock = threading.Lock()
+
+def get_cached_embeddings(model_name: str = "textembedding-gecko", store: Optional[EmbeddingStore] = None) -> CachedEmbeddings:
+    """
+    Returns the process-wide cached wrapper around the registry's embedding client for `model_name`.
+    Vectors are kept in CACHE_DIR, in memory when it is not set, sized by EMBEDDING_CACHE_MAX_BYTES and stored as EMBEDDING_CACHE_DTYPE.
+    """
+    cached = _cached_embeddings.get(model_name)
+    if cached is not None:
+        return cached
+    with _cached_embeddings_lock:
+        if model_name not in _cached_embeddings:
+            if store is None:
+                path = os.path.join(cache_module.CACHE_DIR, "embeddings.sqlite3") if cache_module.CACHE_DIR else ":memory:"
+                try:
+                    store = EmbeddingStore(path)
+                except PermissionError as e:
+                    logger.error(f"Keeping the embedding cache in memory: {e}")
+                    store = EmbeddingStore(":memory:")
+            cached = CachedEmbeddings(model_name, store)
+            register_stats(f"embeddings:{model_name}", cached.stats_dict)
+            _cached_embeddings[model_name] = cached
+        return _cached_embeddings[model_name]
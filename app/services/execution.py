@@ -0,0 +1,154 @@
+import asyncio
+import contextvars
+import functools
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+from services.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_TOOL_CONCURRENCY = 2
+DEFAULT_CHAT_CONCURRENCY = 8
+# How long closing a prefetch waits for its producer, one blocked in a download or parse is left to finish alone
+PREFETCH_JOIN_TIMEOUT = 1.0
+
+class ExecutionPool:
+    """
+    Runs tool and chat executors without blocking the event loop.
+
+    Coroutine functions (async executors built on `ainvoke`) are awaited directly, while
+    synchronous executors are dispatched to a bounded thread pool. Every call is made under
+    a per-key semaphore so a slow tool can only ever occupy its own share of the workers.
+
+    Parameters:
+    limits (Dict[str, int]): Maximum number of concurrent executions per key (tool id or "chat").
+    default_limit (int): Limit used for keys that are not listed in `limits`.
+    max_workers (int): Size of the shared thread pool. Defaults to the sum of all limits.
+    """
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default_limit: int = DEFAULT_TOOL_CONCURRENCY, max_workers: Optional[int] = None):
+        self.limits = {str(key): max(1, int(value)) for key, value in (limits or {}).items()}
+        self.default_limit = max(1, int(default_limit))
+        self.max_workers = max_workers or max(1, sum(self.limits.values()) or self.default_limit)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool-executor")
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_tools_config(cls, tools_config: Dict[str, Dict[str, Any]]):
+        """Builds a pool using the `max_concurrency` of every entry in tools_config.json."""
+        limits = {
+            tool_id: tool_config.get("max_concurrency", DEFAULT_TOOL_CONCURRENCY)
+            for tool_id, tool_config in tools_config.items()
+        }
+        limits["chat"] = int(os.environ.get("CHAT_MAX_CONCURRENCY", DEFAULT_CHAT_CONCURRENCY))
+        return cls(limits=limits)
+
+    def limit_for(self, key: str) -> int:
+        return self.limits.get(str(key), self.default_limit)
+
+    def _semaphore(self, key: str) -> asyncio.Semaphore:
+        key = str(key)
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.limit_for(key))
+        return self._semaphores[key]
+
+    def limiter(self, key: str) -> asyncio.Semaphore:
+        """Returns the semaphore for `key`, for work that is not a single call such as a token stream."""
+        return self._semaphore(key)
+
+    async def run(self, key: str, func: Callable, *args, **kwargs):
+        async with self._semaphore(key):
+            if asyncio.iscoroutinefunction(func):
+                return await func(*args, **kwargs)
+
+            # Copy the request context so context variables stay visible inside the worker thread
+            context = contextvars.copy_context()
+            call = functools.partial(context.run, func, *args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, call)
+
+    def shutdown(self, wait: bool = False):
+        logger.info("Shutting down execution pool")
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+class _End:
+    # Marks the end of a prefetched iterable, carrying the producer's exception if it failed
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+def prefetch(iterable: Iterable[T], maxsize: int, name: str = "prefetch", stop: Optional[threading.Event] = None) -> Iterator[T]:
+    """
+    Iterates `iterable` on a background thread and yields its items through a queue of `maxsize` items.
+
+    The producer runs ahead of the consumer by at most `maxsize` items, so chained calls form a
+    pipeline whose stages overlap while memory stays bounded. An exception of the producer is raised
+    to the consumer, and a consumer that stops early stops and closes the producer.
+
+    Every call starts one thread of its own, outside of the ExecutionPool, which ends with the iterable.
+    Closing waits at most PREFETCH_JOIN_TIMEOUT seconds for it, a producer blocked in its iterable
+    finishes that item in the background and then stops.
+
+    Parameters:
+    stop (threading.Event): Stops the stage once set, like closing it but from any thread. Pass the same
+    event to chained stages and set it before closing the last one, so that the stages before it stop
+    reading instead of waiting for their next item.
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+    closed = threading.Event()
+
+    def stopped() -> bool:
+        return closed.is_set() or (stop is not None and stop.is_set())
+
+    def put(item) -> bool:
+        while not stopped():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get():
+        while True:
+            try:
+                return items.get(timeout=0.1)
+            except queue.Empty:
+                if stopped():
+                    return _End()
+
+    def produce():
+        iterator = None
+        try:
+            iterator = iter(iterable)
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_End())
+        except BaseException as e:
+            put(_End(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    # Copy the caller's context so context variables, such as the job of report_progress, stay visible
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(produce,), name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = get()
+            if isinstance(item, _End):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        closed.set()
+        thread.join(PREFETCH_JOIN_TIMEOUT)
+        if thread.is_alive():
+            logger.warning(f"{name} is still producing, leaving it to stop in the background")
@@ -0,0 +1,272 @@
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from services.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+_current_job_id = contextvars.ContextVar("current_job_id", default=None)
+_current_job_store = contextvars.ContextVar("current_job_store", default=None)
+
+def report_progress(stage: str, **details):
+    """
+    Records a pipeline stage for the job running in the current context.
+
+    Safe to call from anywhere in a tool, including executor threads; it does nothing
+    when the tool was not started through the job queue.
+    """
+    job_id = _current_job_id.get()
+    if job_id is None:
+        return
+    try:
+        _current_job_store.get().append_event(job_id, {"stage": stage, **details})
+    except Exception as e:
+        logger.error(f"Failed to record progress for job {job_id}: {e}")
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job."""
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+class JobStore:
+    """Base class for job backends. Jobs are plain dictionaries so every backend can serialize them."""
+    def create(self, job_id: str, tool_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def append_event(self, job_id: str, event: Dict[str, Any]):
+        raise NotImplementedError
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class InMemoryJobStore(JobStore):
+    """Keeps jobs in process memory, dropping the oldest finished jobs above `max_jobs`."""
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, tool_id):
+        now = time.time()
+        job = {"job_id": job_id, "tool_id": tool_id, "status": QUEUED, "result": None, "error": None,
+               "created_at": now, "updated_at": now}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._events[job_id] = []
+            self._evict()
+        return dict(job)
+
+    def _evict(self):
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED_STATUSES]:
+            del self._jobs[job_id]
+            del self._events[job_id]
+            if len(self._jobs) <= self.max_jobs:
+                break
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def append_event(self, job_id, event):
+        with self._lock:
+            if job_id not in self._events:
+                return
+            events = self._events[job_id]
+            events.append({"seq": len(events) + 1, "timestamp": time.time(), **event})
+
+    def events(self, job_id, after=0):
+        with self._lock:
+            return list(self._events.get(job_id, [])[after:])
+
+class SQLiteJobStore(JobStore):
+    """Stores jobs and their progress events in a local SQLite database, so no outside service is needed."""
+    def __init__(self, path: str, max_jobs: int = 1000):
+        self.path = path
+        self.max_jobs = max_jobs
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, tool_id TEXT, status TEXT, "
+                "result TEXT, error TEXT, created_at REAL, updated_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_events (job_id TEXT, seq INTEGER, event TEXT, PRIMARY KEY (job_id, seq))"
+            )
+
+    def create(self, job_id, tool_id):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, NULL, NULL, ?, ?)", (job_id, tool_id, QUEUED, now, now)
+            )
+            stale = [row[0] for row in self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at DESC LIMIT -1 OFFSET ?",
+                (*FINISHED_STATUSES, self.max_jobs)
+            )]
+            for stale_id in stale:
+                self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (stale_id,))
+                self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (stale_id,))
+        return self.get(job_id)
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, tool_id, status, result, error, created_at, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("job_id", "tool_id", "status", "result", "error", "created_at", "updated_at"), row))
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def append_event(self, job_id, event):
+        with self._lock, self._conn:
+            seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)).fetchone()[0]
+            event = {"seq": seq, "timestamp": time.time(), **event}
+            self._conn.execute("INSERT INTO job_events VALUES (?, ?, ?)", (job_id, seq, json.dumps(event)))
+
+    def events(self, job_id, after=0):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_job_store() -> JobStore:
+    """Selects the job backend from JOB_BACKEND (`memory` or `sqlite`)."""
+    backend = os.environ.get("JOB_BACKEND", "memory").lower()
+    max_jobs = int(os.environ.get("JOB_MAX_RETAINED", 1000))
+    if backend == "sqlite":
+        return SQLiteJobStore(os.environ.get("JOB_DB_PATH", "jobs.sqlite3"), max_jobs=max_jobs)
+    return InMemoryJobStore(max_jobs=max_jobs)
+
+class JobQueue:
+    """
+    Bounded in-process queue of tool jobs served by a fixed number of worker tasks.
+
+    Parameters:
+    store (JobStore): Where job state and progress events are kept.
+    runner (Callable): Coroutine function `runner(tool_id, inputs)` that executes a tool.
+    maxsize (int): Maximum number of queued jobs before submissions are rejected.
+    workers (int): Number of jobs processed at the same time.
+    """
+    def __init__(self, store: JobStore, runner: Callable[[str, Dict[str, Any]], Awaitable[Any]], maxsize: int = 32, workers: int = 4):
+        self.store = store
+        self.runner = runner
+        self.maxsize = maxsize
+        self.num_workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @classmethod
+    def from_environment(cls, runner):
+        return cls(
+            create_job_store(),
+            runner,
+            maxsize=int(os.environ.get("JOB_QUEUE_MAXSIZE", 32)),
+            workers=int(os.environ.get("JOB_WORKERS", 4))
+        )
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.num_workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.store.close()
+
+    def submit(self, tool_id: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        if self._queue.full():
+            raise QueueFullError("Job queue is full, please retry later")
+        job_id = uuid.uuid4().hex
+        job = self.store.create(job_id, str(tool_id))
+        self.store.append_event(job_id, {"stage": QUEUED})
+        self._queue.put_nowait((job_id, str(tool_id), inputs))
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id, tool_id, inputs = await self._queue.get()
+            try:
+                await self._run_job(job_id, tool_id, inputs)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id, tool_id, inputs):
+        job_token = _current_job_id.set(job_id)
+        store_token = _current_job_store.set(self.store)
+        try:
+            self.store.update(job_id, status=RUNNING)
+            self.store.append_event(job_id, {"stage": RUNNING})
+            result = await self.runner(tool_id, inputs)
+            self.store.update(job_id, status=SUCCEEDED, result=result)
+            self.store.append_event(job_id, {"stage": SUCCEEDED})
+        except Exception as e:
+            error_message = str(getattr(e, "detail", e))
+            logger.error(f"Job {job_id} failed: {error_message}")
+            self.store.update(job_id, status=FAILED, error=error_message)
+            self.store.append_event(job_id, {"stage": FAILED, "error": error_message})
+        finally:
+            _current_job_id.reset(job_token)
+            _current_job_store.reset(store_token)
+
+    async def stream_events(self, job_id: str, poll_interval: float = 0.25) -> AsyncIterator[Dict[str, Any]]:
+        """Yields progress events of a job as they are recorded, until the job has finished."""
+        seen = 0
+        while self.store.get(job_id) is not None:
+            events = self.store.events(job_id, after=seen)
+            for event in events:
+                yield event
+                if event["stage"] in FINISHED_STATUSES:
+                    return
+            seen += len(events)
+            await asyncio.sleep(poll_interval)
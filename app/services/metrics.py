@@ -0,0 +1,429 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from services.cache import cache_stats
+from services.logger import setup_logger
+from services.tracing import stage_stats
+
+logger = setup_logger(__name__)
+
+PREFIX = "kai"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Tools and model calls take from milliseconds (cache hits) to minutes (large quizzes)
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _sample(name: str, labelnames: Iterable[str], labelvalues: Iterable[str], value: float) -> str:
+    labels = ",".join(f'{label}="{_escape(str(v))}"' for label, v in zip(labelnames, labelvalues))
+    return f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}"
+
+class _Value:
+    """One labelled time series. The lock is only ever contended by two threads updating the same series."""
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * len(upper_bounds)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        # Per-bucket counts, made cumulative when rendered
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+class Metric:
+    """
+    A metric family with a fixed set of label names, one time series per combination of label values.
+
+    Looking up an existing series is a dictionary read without a lock, only the first use of a label
+    combination takes the family's lock. Updates lock the series alone, so requests for different
+    tools or routes never wait on each other.
+
+    Parameters:
+    name (str): Metric name, without the `kai_` prefix.
+    documentation (str): The HELP text.
+    labelnames (tuple): Names of the labels, passed positionally to `labels()`.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self):
+        return _Value()
+
+    def labels(self, *labelvalues: str):
+        series = self._series.get(labelvalues)
+        if series is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+            with self._lock:
+                series = self._series.get(labelvalues)
+                if series is None:
+                    series = self._series[labelvalues] = self._new_series()
+        return series
+
+    def samples(self) -> List[str]:
+        return [_sample(self.name, self.labelnames, labelvalues, series.value)
+                for labelvalues, series in list(self._series.items())]
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets)) + (float("inf"),)
+
+    def _new_series(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        labelnames = self.labelnames + ("le",)
+        for labelvalues, series in list(self._series.items()):
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds, counts):
+                cumulative += count
+                lines.append(_sample(f"{self.name}_bucket", labelnames, labelvalues + (_format_value(bound),), cumulative))
+            lines.append(_sample(f"{self.name}_sum", self.labelnames, labelvalues, total))
+            lines.append(_sample(f"{self.name}_count", self.labelnames, labelvalues, cumulative))
+        return lines
+
+class MetricFamily:
+    """Samples computed at scrape time by a collector, e.g. from cache or trace statistics."""
+    def __init__(self, name: str, type: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.type = type
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._samples: List[str] = []
+
+    def add(self, labelvalues: Iterable[str], value: float):
+        self._samples.append(_sample(self.name, self.labelnames, labelvalues, value))
+
+    def samples(self) -> List[str]:
+        return self._samples
+
+class MetricsRegistry:
+    """The metrics and scrape-time collectors rendered by the /metrics endpoint."""
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> Iterable[Any]:
+        yield from list(self._metrics.values())
+        for collector in list(self._collectors):
+            try:
+                yield from collector()
+            except Exception as e:
+                logger.error(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for family in self.collect():
+            samples = family.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Drops the recorded series, for tests."""
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+registry = MetricsRegistry()
+
+def render() -> str:
+    return registry.render()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "request_duration_seconds", "Time from receiving a request to sending the last byte of the response.",
+    ("route", "tool_id", "status")
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "requests_in_flight", "Requests being handled.", ("route",)
+))
+LOADER_BYTES = registry.register(Counter(
+    "loader_bytes_total", "Bytes of downloaded files handed to the loaders.", ("file_type",)
+))
+LOADER_DOCUMENTS = registry.register(Counter(
+    "loader_documents_total", "Documents produced by the loaders.", ("file_type",)
+))
+SPLIT_CHUNKS = registry.register(Counter(
+    "chunks_total", "Chunks produced by splitting the loaded documents."
+))
+MODEL_CALLS = registry.register(Counter(
+    "model_calls_total", "LLM and embedding calls.", ("kind", "model", "status")
+))
+MODEL_LATENCY = registry.register(Histogram(
+    "model_call_duration_seconds", "Duration of LLM and embedding calls.", ("kind", "model")
+))
+MODEL_TOKENS = registry.register(Counter(
+    "model_tokens_total", "Tokens reported by the model, when it reports usage.", ("kind", "model", "direction")
+))
+EMBEDDED_TEXTS = registry.register(Counter(
+    "embedded_texts_total", "Texts sent to the embedding model.", ("model",)
+))
+
+def record_model_call(kind: str, model: str, seconds: float, error: bool = False, prompt_tokens: int = 0, completion_tokens: int = 0):
+    MODEL_CALLS.labels(kind, model, "error" if error else "ok").inc()
+    MODEL_LATENCY.labels(kind, model).observe(seconds)
+    if prompt_tokens:
+        MODEL_TOKENS.labels(kind, model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        MODEL_TOKENS.labels(kind, model, "completion").inc(completion_tokens)
+
+# Usage key names of the token counts, by provider: OpenAI style, Vertex AI, and LangChain's usage_metadata
+_PROMPT_TOKEN_KEYS = ("prompt_tokens", "prompt_token_count", "input_tokens")
+_COMPLETION_TOKEN_KEYS = ("completion_tokens", "candidates_token_count", "output_tokens")
+
+def _usage_tokens(usage: Any) -> Tuple[int, int]:
+    if not isinstance(usage, dict):
+        return 0, 0
+    prompt = next((usage[key] for key in _PROMPT_TOKEN_KEYS if isinstance(usage.get(key), int)), 0)
+    completion = next((usage[key] for key in _COMPLETION_TOKEN_KEYS if isinstance(usage.get(key), int)), 0)
+    return prompt, completion
+
+def token_usage(response: Any) -> Tuple[int, int]:
+    """Prompt and completion tokens of an LLMResult, from whichever place the provider reports them."""
+    llm_output = getattr(response, "llm_output", None) or {}
+    for key in ("token_usage", "usage_metadata", "usage"):
+        if key in llm_output:
+            return _usage_tokens(llm_output[key])
+    prompt = completion = 0
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None) or (generation.generation_info or {}).get("usage_metadata")
+            tokens = _usage_tokens(usage)
+            prompt += tokens[0]
+            completion += tokens[1]
+    return prompt, completion
+
+class ModelCallMetrics(BaseCallbackHandler):
+    """
+    Records the count, latency and token usage of every call of the LLM client it is attached to.
+
+    Parameters:
+    model_name (str): The `model` label of the recorded calls.
+    """
+    # Called on the event loop for async calls instead of being handed to an executor thread
+    run_inline = True
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._started: Dict[UUID, float] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            record_model_call("llm", self.model_name, time.perf_counter() - started, False, *token_usage(response))
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            record_model_call("llm", self.model_name, time.perf_counter() - started, error=True)
+
+def instrument_llm(client: Any, model_name: str) -> Any:
+    """Attaches a ModelCallMetrics handler to a LangChain model client, once."""
+    callbacks = getattr(client, "callbacks", None)
+    if callbacks is None:
+        callbacks = []
+    if isinstance(callbacks, list):
+        if not any(isinstance(handler, ModelCallMetrics) for handler in callbacks):
+            try:
+                client.callbacks = [*callbacks, ModelCallMetrics(model_name)]
+            except (AttributeError, TypeError, ValueError) as e:
+                logger.warning(f"Not recording metrics for {model_name}: {e}")
+    elif not any(isinstance(handler, ModelCallMetrics) for handler in callbacks.handlers):
+        callbacks.add_handler(ModelCallMetrics(model_name))
+    return client
+
+def collect_cache_stats() -> Iterable[MetricFamily]:
+    hits = MetricFamily("cache_hits_total", "counter", "Cache hits.", ("cache", "tier"))
+    misses = MetricFamily("cache_misses_total", "counter", "Cache misses.", ("cache", "tier"))
+    evictions = MetricFamily("cache_evictions_total", "counter", "Cache entries evicted.", ("cache", "tier"))
+    ratio = MetricFamily("cache_hit_ratio", "gauge", "Hits over lookups since the process started.", ("cache", "tier"))
+    for name, stats in cache_stats().items():
+        tiers = [("all", stats)] + [(tier, stats[tier]) for tier in ("memory", "disk") if isinstance(stats.get(tier), dict)]
+        for tier, tier_stats in tiers:
+            hits.add((name, tier), tier_stats.get("hits", 0))
+            misses.add((name, tier), tier_stats.get("misses", 0))
+            evictions.add((name, tier), tier_stats.get("evictions", 0))
+            ratio.add((name, tier), tier_stats.get("hit_ratio", 0.0))
+    return [hits, misses, evictions, ratio]
+
+def collect_stage_stats() -> Iterable[MetricFamily]:
+    requests = MetricFamily("traced_requests_total", "counter", "Finished traced requests.", ("trace",))
+    calls = MetricFamily("stage_calls_total", "counter", "Times a pipeline stage ran.", ("trace", "stage"))
+    wall = MetricFamily("stage_seconds_total", "counter", "Wall time spent in a pipeline stage.", ("trace", "stage"))
+    cpu = MetricFamily("stage_cpu_seconds_total", "counter", "CPU time of the thread running a pipeline stage, stages that await do not report it.", ("trace", "stage"))
+    items = MetricFamily("stage_items_total", "counter", "Items into and out of a pipeline stage.", ("trace", "stage", "direction"))
+    size = MetricFamily("stage_bytes_total", "counter", "Bytes into and out of a pipeline stage.", ("trace", "stage", "direction"))
+    for trace, totals in stage_stats().items():
+        requests.add((trace,), totals["requests"])
+        for stage, stats in totals["stages"].items():
+            calls.add((trace, stage), stats["calls"])
+            wall.add((trace, stage), stats["wall_time"])
+            if stats["cpu_time"] is not None:
+                cpu.add((trace, stage), stats["cpu_time"])
+            items.add((trace, stage, "in"), stats["items_in"])
+            items.add((trace, stage, "out"), stats["items_out"])
+            size.add((trace, stage, "in"), stats["bytes_in"])
+            size.add((trace, stage, "out"), stats["bytes_out"])
+    return [requests, calls, wall, cpu, items, size]
+
+registry.register_collector(collect_cache_stats)
+registry.register_collector(collect_stage_stats)
+
+UNMATCHED_ROUTE = "unmatched"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and in-flight count of every HTTP request by route template,
+    so /jobs/{job_id} is one series. The latency runs until the last body chunk is sent, which covers
+    streamed responses. Endpoints add the `tool_id` label by setting `request.state.tool_id`.
+    """
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[List[Any]] = None
+        self._static_routes: Dict[str, str] = {}
+
+    def route_template(self, scope) -> str:
+        if self._routes is None:
+            router = getattr(scope.get("app"), "router", None)
+            routes = [route for route in getattr(router, "routes", []) if hasattr(route, "path_regex")]
+            self._static_routes = {route.path: route.path for route in routes if "{" not in route.path}
+            self._routes = [route for route in routes if "{" in route.path]
+        path = scope["path"]
+        template = self._static_routes.get(path)
+        if template is not None:
+            return template
+        for route in self._routes:
+            if route.path_regex.match(path):
+                return route.path
+        return UNMATCHED_ROUTE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self.route_template(scope)
+        in_flight = REQUESTS_IN_FLIGHT.labels(route)
+        status = "500"
+        finished = False
+        start = time.perf_counter()
+
+        def finish():
+            nonlocal finished
+            if not finished:
+                finished = True
+                in_flight.dec()
+                tool_id = scope.get("state", {}).get("tool_id", "")
+                REQUEST_LATENCY.labels(route, tool_id, status).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
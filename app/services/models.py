@@ -0,0 +1,98 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+from services.logger import setup_logger
+from services.metrics import instrument_llm
+
+logger = setup_logger(__name__)
+
+DEFAULT_LLM = os.environ.get("DEFAULT_LLM_MODEL", "gemini-1.0-pro")
+DEFAULT_EMBEDDING_MODEL = os.environ.get("DEFAULT_EMBEDDING_MODEL", "textembedding-gecko")
+
+class ModelProvider:
+    """Builds model clients. Swap the provider on the registry to use other backends or fakes."""
+    def create_llm(self, model_name: str, **kwargs):
+        raise NotImplementedError
+
+    def create_embeddings(self, model_name: str, **kwargs):
+        raise NotImplementedError
+
+class VertexAIProvider(ModelProvider):
+    def create_llm(self, model_name: str, **kwargs):
+        from langchain_google_vertexai import VertexAI
+        return VertexAI(model_name=model_name, **kwargs)
+
+    def create_embeddings(self, model_name: str, **kwargs):
+        from langchain_google_vertexai import VertexAIEmbeddings
+        return VertexAIEmbeddings(model_name=model_name, **kwargs)
+
+class StaticModelProvider(ModelProvider):
+    """Hands out the same pre-built clients for every model name, e.g. fake models in tests."""
+    def __init__(self, llm=None, embeddings=None):
+        self.llm = llm
+        self.embeddings = embeddings
+
+    def create_llm(self, model_name: str, **kwargs):
+        return self.llm
+
+    def create_embeddings(self, model_name: str, **kwargs):
+        return self.embeddings
+
+class ModelRegistry:
+    """
+    Process-wide cache of model clients.
+
+    Each (kind, model name, options) combination is built lazily on first use and then shared
+    by every request, so client construction and credential setup happen once per process.
+    """
+    def __init__(self, provider: Optional[ModelProvider] = None):
+        self.provider = provider or VertexAIProvider()
+        self._clients: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, model_name: str, **kwargs):
+        key = (kind, model_name, tuple(sorted(kwargs.items())))
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    logger.info(f"Creating {kind} client for model {model_name}")
+                    create = self.provider.create_llm if kind == "llm" else self.provider.create_embeddings
+                    client = create(model_name, **kwargs)
+                    if kind == "llm":
+                        instrument_llm(client, model_name)
+                    self._clients[key] = client
+        return client
+
+    def get_llm(self, model_name: str = DEFAULT_LLM, **kwargs):
+        return self._get("llm", model_name, **kwargs)
+
+    def get_embeddings(self, model_name: str = DEFAULT_EMBEDDING_MODEL, **kwargs):
+        return self._get("embeddings", model_name, **kwargs)
+
+    def set_provider(self, provider: ModelProvider) -> ModelProvider:
+        """Replaces the provider and drops every cached client. Returns the previous provider."""
+        with self._lock:
+            previous = self.provider
+            self.provider = provider
+            self._clients.clear()
+        return previous
+
+model_registry = ModelRegistry()
+
+def get_llm(model_name: str = DEFAULT_LLM, **kwargs):
+    return model_registry.get_llm(model_name, **kwargs)
+
+def get_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL, **kwargs):
+    return model_registry.get_embeddings(model_name, **kwargs)
+
+@contextmanager
+def override_model_provider(provider: ModelProvider):
+    """Temporarily swaps the provider of the shared registry, restoring it afterwards."""
+    previous = model_registry.set_provider(provider)
+    try:
+        yield model_registry
+    finally:
+        model_registry.set_provider(previous)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 from enum import Enum
 from services.tool_registry import BaseTool
 
@@ -48,9 +48,27 @@ class ChatResponse(BaseModel):
 
 class ToolResponse(BaseModel):
     data: Any
+    # Per-stage timings and sizes of the request, see services.tracing
+    trace: Optional[Dict[str, Any]] = None
     
 class ChatMessage(BaseModel):
     role: str
     type: str
     text: str
 
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class JobResponse(BaseModel):
+    job_id: str
+    tool_id: str
+    status: JobStatus
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
+    created_at: float
+    updated_at: float
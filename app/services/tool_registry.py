@@ -1,7 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from services.logger import setup_logger
-from typing import List, Any, Optional, Dict
+from typing import List, Any, Optional, Dict, Callable
 from api.error_utilities import InputValidationError
+from fastapi import HTTPException
+import importlib
+import json
+import os
+import threading
 
 logger = setup_logger(__name__)
 
@@ -10,7 +15,7 @@ class ToolInput(BaseModel):
     name: str
     value: Any
     # When passing "files", the value field is an object with file details as properties
-    
+
 # Base model for all tools
 class BaseTool(BaseModel):
     tool_id: int  # Unique identifier for each tool,
@@ -20,3 +25,155 @@ class ToolFile(BaseModel):
     filePath: Optional[str] = None
     url: str
     filename: Optional[str] = None
+
+def _check_text(input_name, input_value):
+    if not isinstance(input_value, str):
+        return f"Input `{input_name}` must be a string but got {type(input_value)}"
+
+def _check_number(input_name, input_value):
+    if not isinstance(input_value, (int, float)):
+        return f"Input `{input_name}` must be a number but got {type(input_value)}"
+
+def _check_file(input_name, input_value):
+    if not isinstance(input_value, list):
+        return f"Input `{input_name}` must be a list of file dictionaries but got {type(input_value)}"
+    for file_obj in input_value:
+        if not isinstance(file_obj, dict):
+            return f"Each item in the input `{input_name}` must be a dictionary representing a file but got {type(file_obj)}"
+        try:
+            ToolFile.model_validate(file_obj, from_attributes=True)  # This will raise a validation error if the structure is incorrect
+        except ValidationError:
+            return f"Each item in the input `{input_name}` must be a valid ToolFile where a url is provided"
+
+INPUT_TYPE_CHECKS = {
+    "text": _check_text,
+    "number": _check_number,
+    "file": _check_file
+}
+
+def compile_validator(validate_data: List[Dict[str, str]]) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Builds an input validator from a tool's metadata inputs once, so validating a request
+    is a walk over a precomputed list of checks.
+
+    The returned callable raises InputValidationError on the first invalid input and returns True otherwise.
+    """
+    required_inputs = [input_item['name'] for input_item in validate_data]
+    checks = [
+        (input_item['name'], INPUT_TYPE_CHECKS[input_item['type']])
+        for input_item in validate_data
+        if input_item['type'] in INPUT_TYPE_CHECKS
+    ]
+
+    def validator(request_data: Dict[str, Any]) -> bool:
+        # Check for missing inputs
+        for validate_input_name in required_inputs:
+            if validate_input_name not in request_data:
+                error_message = f"Missing input: `{validate_input_name}`"
+                logger.error(error_message)
+                raise InputValidationError(error_message)
+
+        # Extra inputs not defined in the metadata are not validated
+        for input_name, check in checks:
+            error_message = check(input_name, request_data[input_name])
+            if error_message:
+                logger.error(error_message)
+                raise InputValidationError(error_message)
+
+        return True
+
+    return validator
+
+class RegisteredTool:
+    """A tool resolved at startup: its configuration, parsed metadata, executors and validator."""
+    def __init__(self, tool_id: str, config: Dict[str, Any], module, metadata_path: str, metadata: Dict[str, Any]):
+        self.tool_id = tool_id
+        self.config = config
+        self.module = module
+        self.metadata_path = metadata_path
+        self.metadata = metadata
+        self.executor = getattr(module, 'executor')
+        # Tools may optionally provide an `aexecutor` coroutine built on async chain calls
+        self.async_executor = getattr(module, 'aexecutor', None)
+        self.validator = compile_validator(metadata['inputs'])
+        self.mtimes = RegisteredTool.source_mtimes(module, metadata_path)
+
+    @property
+    def preferred_executor(self) -> Callable:
+        return self.async_executor or self.executor
+
+    @staticmethod
+    def source_mtimes(module, metadata_path):
+        return (os.path.getmtime(module.__file__), os.path.getmtime(metadata_path))
+
+    def is_stale(self) -> bool:
+        try:
+            return RegisteredTool.source_mtimes(self.module, self.metadata_path) != self.mtimes
+        except OSError:
+            return True
+
+class ToolRegistry:
+    """
+    Holds every tool from tools_config.json, resolved once at application startup.
+
+    Parameters:
+    tools_config (Dict): The parsed tools_config.json.
+    auto_reload (bool): When enabled, a tool is re-imported and its metadata re-parsed whenever
+    the executor module or metadata file has a newer mtime. Meant for local development only.
+    """
+    def __init__(self, tools_config: Dict[str, Dict[str, Any]], auto_reload: bool = False):
+        self.tools_config = tools_config
+        self.auto_reload = auto_reload
+        self.tools: Dict[str, RegisteredTool] = {}
+        self.errors: Dict[str, Exception] = {}
+        self._reload_lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, tools_config: Dict[str, Dict[str, Any]]):
+        auto_reload = os.environ.get('TOOL_REGISTRY_AUTO_RELOAD', 'false').lower() in ('1', 'true', 'yes')
+        return cls(tools_config, auto_reload=auto_reload).load()
+
+    def load(self):
+        for tool_id in self.tools_config:
+            self._load_tool(str(tool_id))
+        logger.info(f"Registered {len(self.tools)} tools")
+        return self
+
+    def _load_tool(self, tool_id: str, reload_module: bool = False):
+        tool_config = self.tools_config[tool_id]
+        try:
+            module = importlib.import_module(tool_config['path'])
+            if reload_module:
+                module = importlib.reload(module)
+            metadata_path = os.path.join(os.path.dirname(module.__file__), tool_config['metadata_file'])
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            self.tools[tool_id] = RegisteredTool(tool_id, tool_config, module, metadata_path, metadata)
+            self.errors.pop(tool_id, None)
+        except Exception as e:
+            # Keep serving the other tools, the failure is reported when this tool is requested
+            logger.error(f"Failed to register tool {tool_id} from {tool_config['path']}: {str(e)}")
+            self.tools.pop(tool_id, None)
+            self.errors[tool_id] = e
+
+    def get(self, tool_id) -> RegisteredTool:
+        tool_id = str(tool_id)
+
+        if tool_id not in self.tools_config:
+            logger.error(f"No tool configuration found for tool_id: {tool_id}")
+            raise HTTPException(status_code=404, detail="Tool configuration not found")
+
+        if self.auto_reload:
+            tool = self.tools.get(tool_id)
+            if tool is None or tool.is_stale():
+                with self._reload_lock:
+                    logger.info(f"Reloading tool {tool_id}")
+                    self._load_tool(tool_id, reload_module=tool is not None)
+
+        if tool_id in self.errors:
+            error = self.errors[tool_id]
+            if isinstance(error, (OSError, json.JSONDecodeError)):
+                raise HTTPException(status_code=404, detail="Tool metadata not found")
+            raise HTTPException(status_code=500, detail=f"Failed to load tool {tool_id}: {str(error)}")
+
+        return self.tools[tool_id]
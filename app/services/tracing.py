@@ -0,0 +1,258 @@
+import contextvars
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+from services.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+class StageStats:
+    """
+    Measurements of one pipeline stage, summed over every time it ran.
+
+    `cpu_time` is the CPU time of the thread that ran the stage, work the stage hands to other
+    threads or processes is not included. It sums the calls that could measure it and is None when
+    none could, a stage that awaits shares its thread with other coroutines. `peak_memory` is the
+    highest traced memory above the start of the stage when tracemalloc is running, otherwise how much
+    the stage raised the process's peak RSS. It is process-wide, so concurrent requests can show up in
+    each other's numbers.
+    """
+    __slots__ = ("name", "calls", "wall_time", "cpu_time", "items_in", "items_out", "bytes_in", "bytes_out", "peak_memory")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time: Optional[float] = None
+        self.items_in = 0
+        self.items_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_memory = 0
+
+    def merge(self, other: "StageStats"):
+        self.calls += other.calls
+        self.wall_time += other.wall_time
+        if other.cpu_time is not None:
+            self.cpu_time = (self.cpu_time or 0.0) + other.cpu_time
+        self.items_in += other.items_in
+        self.items_out += other.items_out
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.peak_memory = max(self.peak_memory, other.peak_memory)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class RequestTrace:
+    """
+    The stages of one request, in the order they first ran. Stages that run more than once,
+    such as the embedding batches of a streaming pipeline, are summed.
+
+    Parameters:
+    name (str): What is traced, e.g. the tool id.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.wall_time = None
+        self.stages: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stats: StageStats):
+        with self._lock:
+            stage = self.stages.get(stats.name)
+            if stage is None:
+                self.stages[stats.name] = stage = StageStats(stats.name)
+            stage.merge(stats)
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = [stage.as_dict() for stage in self.stages.values()]
+        wall_time = self.wall_time if self.wall_time is not None else time.perf_counter() - self.started
+        return {"name": self.name, "wall_time": wall_time, "stages": stages}
+
+class StageAggregate:
+    """Per (trace name, stage) totals of every finished request in this process, for the metrics endpoint."""
+    def __init__(self):
+        self._stages: Dict[Tuple[str, str], StageStats] = {}
+        self._requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_trace(self, trace: RequestTrace):
+        with self._lock:
+            self._requests[trace.name] = self._requests.get(trace.name, 0) + 1
+            for stats in trace.stages.values():
+                self._add(trace.name, stats)
+
+    def add_stage(self, name: str, stats: StageStats):
+        with self._lock:
+            self._add(name, stats)
+
+    def _add(self, name: str, stats: StageStats):
+        key = (name, stats.name)
+        if key not in self._stages:
+            self._stages[key] = StageStats(stats.name)
+        self._stages[key].merge(stats)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {name: {"requests": count, "stages": {}} for name, count in self._requests.items()}
+            for (name, stage), stats in self._stages.items():
+                snapshot.setdefault(name, {"requests": 0, "stages": {}})["stages"][stage] = stats.as_dict()
+        return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+            self._requests.clear()
+
+_aggregate = StageAggregate()
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+# Stages that run outside of a request are aggregated under this name
+UNTRACED = "untraced"
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+def stage_stats() -> Dict[str, Dict[str, Any]]:
+    """Totals per trace name and stage of every request finished in this process."""
+    return _aggregate.snapshot()
+
+@contextmanager
+def request_trace(name: str) -> Iterator[RequestTrace]:
+    """
+    Traces the stages run in this context, including threads started with a copy of it, and adds
+    the trace to the process totals when the block exits. Nested calls share the outer trace.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        yield trace
+        return
+    trace = RequestTrace(str(name))
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        _aggregate.add_trace(trace)
+
+def _size(value: Any) -> int:
+    if isinstance(value, Document):
+        return len(value.page_content.encode("utf-8"))
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, memoryview):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(_size(item) for item in value)
+    if hasattr(value, "getbuffer"):
+        try:
+            with value.getbuffer() as buffer:
+                return buffer.nbytes
+        except ValueError:  # already closed
+            return 0
+    content = getattr(value, "content", None)
+    if content is not None and hasattr(content, "getbuffer"):
+        return _size(content)
+    return 0
+
+def measure(value: Any) -> Tuple[int, int]:
+    """Item count and size in bytes of a stage's input or output: documents, text, buffers, downloads or lists of them."""
+    if value is None:
+        return 0, 0
+    if isinstance(value, list):
+        return len(value), sum(_size(item) for item in value)
+    return 1, _size(value)
+
+class StageRecorder:
+    def __init__(self, stats: StageStats):
+        self.stats = stats
+
+    def output(self, value: Any):
+        self.stats.items_out, self.stats.bytes_out = measure(value)
+
+def _max_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+class _MemoryWindow:
+    # The traced peak is process-wide, so a stage resetting it first hands the peak so far to every
+    # stage still open, nested or on another thread, which keeps their peaks from being lost
+    _open: "set[_MemoryWindow]" = set()
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.traced = tracemalloc.is_tracing()
+        if not self.traced:
+            self.mark = _max_rss()
+            return
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            for window in self._open:
+                window.peak = max(window.peak, peak)
+            tracemalloc.reset_peak()
+            self.mark = self.peak = current
+            self._open.add(self)
+
+    def close(self) -> int:
+        if not self.traced:
+            return max(0, _max_rss() - self.mark)
+        with self._lock:
+            self._open.discard(self)
+            if not tracemalloc.is_tracing():
+                return 0
+            return max(0, max(self.peak, tracemalloc.get_traced_memory()[1]) - self.mark)
+
+@contextmanager
+def trace_stage(name: str, inputs: Any = None, cpu: bool = True) -> Iterator[StageRecorder]:
+    """
+    Records wall time, CPU time, input and output counts and bytes, and peak memory of the block
+    as stage `name` of the current request trace. Call `output()` on the recorder with the result.
+
+    Parameters:
+    cpu (bool): Whether the CPU time of the thread is the stage's own. Pass False for a block that
+    awaits, the event loop runs other coroutines on the same thread in the meantime.
+    """
+    stats = StageStats(name)
+    stats.calls = 1
+    stats.items_in, stats.bytes_in = measure(inputs)
+    recorder = StageRecorder(stats)
+    memory = _MemoryWindow()
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield recorder
+    finally:
+        stats.wall_time = time.perf_counter() - wall_start
+        if cpu:
+            stats.cpu_time = time.thread_time() - cpu_start
+        stats.peak_memory = memory.close()
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stats)
+        else:
+            _aggregate.add_stage(UNTRACED, stats)
+
+def format_trace(trace: Dict[str, Any]) -> List[str]:
+    """One log line per stage of a trace from `RequestTrace.as_dict()`."""
+    return [
+        f"{stage['name']}: {stage['wall_time']:.3f}s wall, "
+        f"{'n/a' if stage['cpu_time'] is None else format(stage['cpu_time'], '.3f') + 's'} cpu, "
+        f"{stage['items_in']} -> {stage['items_out']} items, {stage['bytes_in']} -> {stage['bytes_out']} bytes, "
+        f"peak {stage['peak_memory']} bytes"
+        for stage in trace["stages"]
+    ]
@@ -0,0 +1,132 @@
+import uuid
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from services.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    # Zero vectors stay zero instead of turning into NaNs
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-memory vector store for short-lived, per-request collections.
+
+    Embeddings are kept L2-normalized in one contiguous float32 matrix, so a similarity search is
+    a single matrix-vector product followed by a partial sort. There is no persistence, building and
+    dropping a collection is just allocating and releasing the matrix.
+
+    Parameters:
+    embedding (Embeddings): Model used to embed the added texts and the queries.
+    """
+    def __init__(self, embedding: Embeddings):
+        self.embedding = embedding
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.documents: List[Document] = []
+        self.ids: List[str] = []
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+
+        vectors = normalize_rows(np.asarray(self.embedding.embed_documents(texts), dtype=np.float32))
+        self.matrix = vectors if len(self.documents) == 0 else np.concatenate([self.matrix, vectors])
+        self.documents.extend(Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas))
+        self.ids.extend(ids)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            self.delete_collection()
+            return True
+        drop = set(ids)
+        keep = [index for index, doc_id in enumerate(self.ids) if doc_id not in drop]
+        self.matrix = self.matrix[keep]
+        self.documents = [self.documents[index] for index in keep]
+        self.ids = [self.ids[index] for index in keep]
+        return True
+
+    def delete_collection(self):
+        # Same name as Chroma's so QuizBuilder can release either store
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.documents = []
+        self.ids = []
+
+    def _query_vector(self, embedding: List[float]) -> np.ndarray:
+        return normalize_rows(np.asarray(embedding, dtype=np.float32))
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        if not self.documents:
+            return []
+        scores = self.matrix @ self._query_vector(embedding)
+        return [(self.documents[index], float(scores[index])) for index in self._top_k(scores, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities in [-1, 1], relevance scores are expected in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        if not self.documents:
+            return []
+        query = self._query_vector(embedding)
+        candidates = self._top_k(self.matrix @ query, max(fetch_k, k))
+        vectors = self.matrix[candidates]
+        relevance = vectors @ query
+
+        selected = [0]
+        # Highest similarity of every candidate to anything selected so far, updated incrementally
+        redundancy = vectors @ vectors[0]
+        while len(selected) < min(k, len(candidates)):
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+
+        return [self.documents[candidates[index]] for index in selected]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self.embedding.embed_query(query), k, fetch_k, lambda_mult)
@@ -1,25 +1,53 @@
 from fastapi import HTTPException, Header
-from google.cloud import secretmanager
+from utils.secrets import CachedSecret, SecretProvider, SecretManagerProvider, FileSecretProvider, StaticSecretProvider
+import hmac
 import os
+import threading
+
+API_KEY_SECRET_ID = "backend-access"
+
+_api_key_secret = None
+_api_key_lock = threading.Lock()
 
 def access_secret_file(secret_id, version_id="latest"):
     """
     Access a secret file in Google Cloud Secret Manager and parse it.
     """
-    project_id = os.environ.get('PROJECT_ID')
-    client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
-    response = client.access_secret_version(name=name)
-    return response.payload.data.decode("UTF-8")
+    return SecretManagerProvider(version_id=version_id).get_secret(secret_id)
+
+def default_secret_provider() -> SecretProvider:
+    """
+    Selects the secret provider from the environment.
+
+    Production reads from Secret Manager, API_KEY_SECRETS_DIR points to a directory of
+    secret files for local testing, and everything else uses the static 'dev' key.
+    """
+    if os.environ.get('ENV_TYPE') == "production":
+        return SecretManagerProvider()
+    if os.environ.get('API_KEY_SECRETS_DIR'):
+        return FileSecretProvider(os.environ['API_KEY_SECRETS_DIR'])
+    return StaticSecretProvider("dev")
+
+def configure_api_key(provider: SecretProvider = None, ttl: float = None):
+    """Replaces the cached API key, e.g. to swap in a FileSecretProvider during tests."""
+    global _api_key_secret
+    with _api_key_lock:
+        _api_key_secret = CachedSecret(
+            provider or default_secret_provider(),
+            API_KEY_SECRET_ID,
+            ttl=ttl if ttl is not None else float(os.environ.get('API_KEY_CACHE_TTL', 300))
+        )
+    return _api_key_secret
+
+def get_api_key_secret() -> CachedSecret:
+    if _api_key_secret is None:
+        return configure_api_key()
+    return _api_key_secret
 
 # Function to ensure incoming request is from controller with key
 def key_check(api_key: str = Header(None)):
-  
-  if os.environ.get('ENV_TYPE') == "production":
-    set_key = access_secret_file("backend-access")
-  else:
-    set_key = "dev"
-  
-  if api_key is None or api_key != set_key:
-    print(api_key)
-    raise HTTPException(status_code=401, detail="Invalid API Request Key")
\ No newline at end of file
+
+  set_key = get_api_key_secret().get()
+
+  if api_key is None or not hmac.compare_digest(api_key.encode("UTF-8"), set_key.encode("UTF-8")):
+    raise HTTPException(status_code=401, detail="Invalid API Request Key")
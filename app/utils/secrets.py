@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from typing import Optional
+from services.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class SecretProvider:
+    """Base class for anything that can resolve a secret id to its value."""
+    def get_secret(self, secret_id: str) -> str:
+        raise NotImplementedError
+
+class SecretManagerProvider(SecretProvider):
+    """
+    Reads secrets from Google Cloud Secret Manager.
+
+    The client is created once per provider instead of once per lookup.
+    """
+    def __init__(self, project_id: Optional[str] = None, version_id: str = "latest"):
+        self.project_id = project_id or os.environ.get('PROJECT_ID')
+        self.version_id = version_id
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google.cloud import secretmanager
+                    self._client = secretmanager.SecretManagerServiceClient()
+        return self._client
+
+    def get_secret(self, secret_id: str) -> str:
+        name = f"projects/{self.project_id}/secrets/{secret_id}/versions/{self.version_id}"
+        response = self.client.access_secret_version(name=name)
+        return response.payload.data.decode("UTF-8")
+
+class FileSecretProvider(SecretProvider):
+    """
+    Reads secrets from plain files, where each secret is stored in `<directory>/<secret_id>`.
+    Stands in for Secret Manager in local development and tests.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def get_secret(self, secret_id: str) -> str:
+        with open(os.path.join(self.directory, secret_id), 'r') as f:
+            return f.read().strip()
+
+class StaticSecretProvider(SecretProvider):
+    """Always returns the same value, used for the `dev` key outside of production."""
+    def __init__(self, value: str):
+        self.value = value
+
+    def get_secret(self, secret_id: str) -> str:
+        return self.value
+
+class CachedSecret:
+    """
+    Keeps a secret in memory and refreshes it in the background once the TTL has passed.
+
+    Only the very first lookup blocks on the provider. After that the cached value is
+    always served immediately; an expired value triggers a single background refresh, and
+    if that refresh fails the last good value keeps being served until a retry succeeds.
+
+    Parameters:
+    provider (SecretProvider): Where the secret is read from.
+    secret_id (str): The id of the secret to read.
+    ttl (float): Seconds a value is considered fresh.
+    retry_interval (float): Seconds to wait before retrying after a failed refresh.
+    """
+    def __init__(self, provider: SecretProvider, secret_id: str, ttl: float = 300, retry_interval: float = 30):
+        self.provider = provider
+        self.secret_id = secret_id
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._value: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self):
+        value = self.provider.get_secret(self.secret_id)
+        self._value = value
+        self._expires_at = time.monotonic() + self.ttl
+        return value
+
+    def _background_refresh(self):
+        try:
+            self._fetch()
+            logger.debug(f"Refreshed secret {self.secret_id}")
+        except Exception as e:
+            logger.error(f"Failed to refresh secret {self.secret_id}, serving last known value: {e}")
+            self._expires_at = time.monotonic() + self.retry_interval
+        finally:
+            self._refreshing = False
+
+    def get(self) -> str:
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    return self._fetch()
+
+        value = self._value
+        if time.monotonic() >= self._expires_at and not self._refreshing:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._background_refresh, name=f"secret-refresh-{self.secret_id}", daemon=True).start()
+
+        return value
+
+    def invalidate(self):
+        """Forces the next lookup to refresh the value."""
+        self._expires_at = 0.0
@@ -0,0 +1,83 @@
+import time
+import pytest
+from fastapi import HTTPException
+from utils.secrets import CachedSecret, FileSecretProvider, SecretProvider
+from utils.auth import configure_api_key, key_check
+
+class CountingProvider(SecretProvider):
+    def __init__(self, values):
+        self.values = list(values)
+        self.calls = 0
+
+    def get_secret(self, secret_id):
+        self.calls += 1
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+def wait_for(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+@pytest.fixture
+def secrets_dir(tmp_path):
+    (tmp_path / "backend-access").write_text("file-key\n")
+    return tmp_path
+
+@pytest.fixture(autouse=True)
+def reset_api_key():
+    yield
+    configure_api_key()
+
+def test_file_provider_reads_secret(secrets_dir):
+    provider = FileSecretProvider(str(secrets_dir))
+    assert provider.get_secret("backend-access") == "file-key"
+
+def test_key_check_with_file_provider(secrets_dir):
+    configure_api_key(FileSecretProvider(str(secrets_dir)))
+
+    key_check(api_key="file-key")
+    with pytest.raises(HTTPException) as exc_info:
+        key_check(api_key="wrong-key")
+    assert exc_info.value.status_code == 401
+    with pytest.raises(HTTPException):
+        key_check(api_key=None)
+
+def test_cached_secret_hits_provider_once_within_ttl():
+    provider = CountingProvider(["key"])
+    secret = CachedSecret(provider, "backend-access", ttl=60)
+
+    for _ in range(100):
+        assert secret.get() == "key"
+    assert provider.calls == 1
+
+def test_cached_secret_refreshes_in_background():
+    provider = CountingProvider(["old-key", "new-key"])
+    secret = CachedSecret(provider, "backend-access", ttl=60)
+
+    assert secret.get() == "old-key"
+    secret.invalidate()
+    # The expired value is served while the refresh runs
+    assert secret.get() == "old-key"
+    wait_for(lambda: secret.get() == "new-key")
+    assert secret.get() == "new-key"
+    assert provider.calls == 2
+
+def test_cached_secret_serves_last_good_value_when_refresh_fails():
+    provider = CountingProvider(["key", RuntimeError("secret manager unavailable"), "rotated-key"])
+    secret = CachedSecret(provider, "backend-access", ttl=60, retry_interval=0)
+
+    assert secret.get() == "key"
+    secret.invalidate()
+    assert secret.get() == "key"
+    wait_for(lambda: provider.calls == 2 and not secret._refreshing)
+    assert secret.get() == "key"
+    wait_for(lambda: secret.get() == "rotated-key")
+    assert secret.get() == "rotated-key"
+
+def test_cached_secret_raises_when_first_fetch_fails():
+    secret = CachedSecret(CountingProvider([RuntimeError("unavailable")]), "backend-access")
+    with pytest.raises(RuntimeError):
+        secret.get()